@@ -0,0 +1,499 @@
+"""
+Benchmarks of the load, offset, enclosure and export steps on fixed fixtures.
+
+The checked-in STEP files in tests/fixtures stand in for exported boards, so the
+benchmarks run without kicad-cli and without touching the real caches.
+Run `python benchmark.py --save-baseline` once, later runs are compared against it.
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+from unittest import mock
+
+import cadquery as cq
+import loader
+import mesh_cache
+import pipeline
+import serializer
+import shape_cache
+from build_graph import NodeParameters
+from component_store import LazyShapesDict
+from pcb import (
+    _get_outline_face,
+    get_hole_table,
+    get_wire_data_list,
+    make_offset_shape,
+    make_offset_shapes,
+)
+from profiling import get_peak_rss_mb
+
+_path_to_script = os.path.dirname(os.path.abspath(__file__))
+_fixtures_folder = os.path.abspath(
+    os.path.join(_path_to_script, "..", "tests", "fixtures")
+)
+_default_baseline_file = os.path.abspath(
+    os.path.join(_path_to_script, "..", "output", "benchmark_baseline.json")
+)
+
+FIXTURES = {
+    "PogoConnector": os.path.join(_fixtures_folder, "PogoConnector.step"),
+    "ShieldHallSensor": os.path.join(_fixtures_folder, "ShieldHallSensor.step"),
+}
+"""STEP files used in place of boards exported by kicad-cli, by board name."""
+PCB_PART_NAME = "PCB"
+FULL_PCB_NAME = "FullBoard"
+PCB_TOLERANCE = cq.Vector(0.1, 0.1, 0.1)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[Any], Any]
+    """Timed function, called with the result of setup."""
+    setup: Callable[[], Any] = lambda: None
+    """Called before every repetition, not timed."""
+    repeat: int | None = None
+    """Overrides the number of repetitions, for slow benchmarks."""
+
+
+def _get_rss_mb() -> float | None:
+    """
+    Returns the current resident memory of this process in MB, None if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+class Fixtures:
+    """
+    Redirects the loader and all caches to a temporary folder and replaces the kicad-cli
+    export by copying the fixture STEP files.
+    """
+
+    def __init__(self):
+        self.folder = tempfile.mkdtemp(prefix="smartcube-benchmark-")
+        self._exit_stack = ExitStack()
+
+    def __enter__(self) -> "Fixtures":
+        patches = [
+            mock.patch.object(loader, "_output_folder", self._get_folder("models")),
+            mock.patch.object(loader, "_convert_kicad_pcb", self._convert_fixture),
+            mock.patch.object(
+                loader, "get_kicad_pcb_cache_key", self._get_fixture_cache_key
+            ),
+            mock.patch.object(
+                shape_cache, "_shape_cache_folder", self._get_folder("shape_cache")
+            ),
+            mock.patch.object(
+                mesh_cache, "_mesh_cache_folder", self._get_folder("mesh_cache")
+            ),
+        ]
+        for patch in patches:
+            self._exit_stack.enter_context(patch)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._exit_stack.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _get_folder(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def _convert_fixture(self, kicad_pcb_file: str, step_file: str) -> str:
+        name = os.path.splitext(os.path.basename(step_file))[0]
+        os.makedirs(os.path.dirname(step_file), exist_ok=True)
+        shutil.copyfile(FIXTURES[name], step_file)
+        return ""
+
+    def _get_fixture_cache_key(self, kicad_pcb_name: str) -> dict[str, str | None]:
+        with open(FIXTURES[kicad_pcb_name], "rb") as f:
+            return {"content": hashlib.sha256(f.read()).hexdigest()}
+
+    def clear_stores(self):
+        shutil.rmtree(self._get_folder("models"), ignore_errors=True)
+
+    def clear_geometry_caches(self):
+        for func in (
+            get_wire_data_list,
+            _get_outline_face,
+            make_offset_shapes,
+            get_hole_table,
+        ):
+            func.cache.clear()  # type: ignore
+        shutil.rmtree(self._get_folder("shape_cache"), ignore_errors=True)
+
+    def clear_mesh_caches(self):
+        mesh_cache._meshes.clear()
+        shutil.rmtree(self._get_folder("mesh_cache"), ignore_errors=True)
+
+
+def _load_fixtures() -> dict[str, LazyShapesDict]:
+    return loader.get_kicad_pcbs_as_shapes_dicts(
+        list(FIXTURES), PCB_PART_NAME, FULL_PCB_NAME, parallel=False
+    )
+
+
+def _load_all_components(shapes_dicts: dict[str, LazyShapesDict]):
+    for shapes_dict in shapes_dicts.values():
+        for name in shapes_dict:
+            shapes_dict[name]
+
+
+def _get_node_parameters(name: str) -> NodeParameters:
+    node = pipeline.graph.nodes[name]
+    return NodeParameters(
+        name, {param: pipeline.graph.parameters[param] for param in node.params}
+    )
+
+
+def _call_node(name: str, **deps: Any) -> Any:
+    """
+    Calls the function of a pipeline node directly, bypassing the build caches.
+    """
+    return pipeline.graph.nodes[name].func(_get_node_parameters(name), **deps)
+
+
+def _get_module_box_inputs(
+    module_shapes: dict[str, cq.Shape], pogo_connector_shapes: LazyShapesDict
+) -> dict[str, Any]:
+    """
+    Builds the inputs of the module_box node, with the ShieldHallSensor fixture as
+    module and the PogoConnector fixture as pogo connector.
+    """
+    module_bounds = module_shapes[PCB_PART_NAME].BoundingBox()
+    pogo_connector_bounds = pogo_connector_shapes.bounding_box(PCB_PART_NAME)
+    full_bounds = pogo_connector_shapes.bounding_box(FULL_PCB_NAME)
+    pcb_bounds = {
+        "module_length": module_bounds.xlen,
+        "power_supply_length": module_bounds.xlen,
+        "module_max_z": max(
+            shape.BoundingBox().zmax for shape in module_shapes.values()
+        ),
+        "power_supply_max_z": module_bounds.zmax,
+        "pogo_connector_size": (
+            pogo_connector_bounds.xlen,
+            pogo_connector_bounds.ylen,
+            pogo_connector_bounds.zlen,
+        ),
+        "esp32_size": (full_bounds.xlen, full_bounds.ylen, full_bounds.zlen),
+        "esp32_center": full_bounds.center.toTuple(),
+    }
+    box_dimensions = _call_node("box_dimensions", pcb_bounds=pcb_bounds)
+    box_shells = _call_node("box_shells", box_dimensions=box_dimensions)
+    return {
+        "box": _call_node(
+            "box",
+            box_shells=box_shells,
+            box_dimensions=box_dimensions,
+            pcb_bounds=pcb_bounds,
+        ),
+        "box_shells": box_shells,
+        "box_dimensions": box_dimensions,
+        "pogo_pin_holes": _call_node(
+            "pogo_pin_holes", pcb_bounds=pcb_bounds, box_dimensions=box_dimensions
+        ),
+        "pogo_connector_holes": _call_node(
+            "pogo_connector_holes", pcb_bounds=pcb_bounds, box_dimensions=box_dimensions
+        ),
+        "magnet_holes": _call_node("magnet_holes", box_dimensions=box_dimensions),
+        "module_pcb_slot": make_offset_shape(
+            cq.Workplane(module_shapes[PCB_PART_NAME]), PCB_TOLERANCE
+        ),
+    }
+
+
+def _round_trip(shapes: dict[str, cq.Shape], file: str) -> Any:
+    with open(file, "wb") as f:
+        serializer.dump(shapes, f)
+    return serializer.load(file)
+
+
+class _SharedInputs:
+    """
+    Inputs shared by several benchmarks, built on first use so that benchmarks
+    selected with --only do not pay for the inputs of the others.
+    """
+
+    @cached_property
+    def shapes_dicts(self) -> dict[str, LazyShapesDict]:
+        shapes_dicts = _load_fixtures()
+        _load_all_components(shapes_dicts)
+        return shapes_dicts
+
+    @cached_property
+    def module_shapes(self) -> dict[str, cq.Shape]:
+        return dict(self.shapes_dicts["ShieldHallSensor"])
+
+    @cached_property
+    def pcb(self) -> cq.Workplane:
+        return cq.Workplane(self.module_shapes[PCB_PART_NAME])
+
+    @cached_property
+    def module_box_inputs(self) -> dict[str, Any]:
+        return _get_module_box_inputs(
+            self.module_shapes, self.shapes_dicts["PogoConnector"]
+        )
+
+    @cached_property
+    def module_box(self) -> dict[str, cq.Workplane]:
+        return _call_node("module_box", **self.module_box_inputs)
+
+
+def get_benchmarks(fixtures: Fixtures) -> list[Benchmark]:
+    """
+    Returns the benchmarks, the shared inputs are built by the setup of the first
+    benchmark that needs them.
+    """
+    inputs = _SharedInputs()
+    round_trip_file = os.path.join(fixtures.folder, "round_trip.pkl")
+    stl_file = os.path.join(fixtures.folder, "Box_Top.stl")
+
+    def set_encoding(
+        binary: bool, compression_level: int | None
+    ) -> Callable[[], dict[str, cq.Shape]]:
+        def setup() -> dict[str, cq.Shape]:
+            serializer.set_encoding(binary, compression_level)
+            return inputs.module_shapes
+
+        return setup
+
+    def clear_geometry_caches() -> cq.Workplane:
+        fixtures.clear_geometry_caches()
+        return inputs.pcb
+
+    def clear_mesh_caches() -> dict[str, cq.Workplane]:
+        fixtures.clear_mesh_caches()
+        return inputs.module_box
+
+    # Run once untimed, so warm benchmarks selected on their own start warm as well
+    def fill_geometry_caches() -> cq.Workplane:
+        make_offset_shape(inputs.pcb, PCB_TOLERANCE)
+        return inputs.pcb
+
+    def fill_mesh_caches() -> dict[str, cq.Workplane]:
+        mesh_cache.export_stl(inputs.module_box["top"], stl_file)
+        return inputs.module_box
+
+    benchmarks = [
+        Benchmark(
+            "load_pcbs_cold",
+            lambda _: _load_all_components(_load_fixtures()),
+            setup=fixtures.clear_stores,
+        ),
+        Benchmark(
+            "load_pcbs_warm",
+            lambda _: _load_all_components(_load_fixtures()),
+            setup=lambda: inputs.shapes_dicts,
+        ),
+        Benchmark(
+            "load_pcbs_warm_index_only",
+            lambda _: _load_fixtures(),
+            setup=lambda: inputs.shapes_dicts,
+        ),
+        *[
+            Benchmark(
+                f"step_to_shapes_dict[{name}]",
+                lambda _, step_file=step_file: loader._step_to_shapes_dict(
+                    step_file, PCB_PART_NAME, FULL_PCB_NAME
+                ),
+            )
+            for name, step_file in FIXTURES.items()
+        ],
+        *[
+            Benchmark(
+                f"serializer_round_trip[{encoding}]",
+                lambda module_shapes: _round_trip(module_shapes, round_trip_file),
+                setup=set_encoding(binary, compression_level),
+            )
+            for encoding, binary, compression_level in [
+                ("text", False, None),
+                ("binary", True, None),
+                ("binary_zlib", True, 1),
+            ]
+        ],
+        Benchmark(
+            "get_wire_data_list",
+            lambda pcb: inspect.unwrap(get_wire_data_list)(pcb),
+            setup=lambda: inputs.pcb,
+        ),
+        Benchmark(
+            "make_offset_shape_cold",
+            lambda pcb: make_offset_shape(pcb, PCB_TOLERANCE),
+            setup=clear_geometry_caches,
+        ),
+        Benchmark(
+            "make_offset_shape_warm",
+            lambda pcb: make_offset_shape(pcb, PCB_TOLERANCE),
+            setup=fill_geometry_caches,
+        ),
+        Benchmark(
+            "finish_box",
+            lambda module_box_inputs: _call_node("module_box", **module_box_inputs),
+            setup=lambda: inputs.module_box_inputs,
+            repeat=3,
+        ),
+        Benchmark(
+            "check_clearances",
+            lambda module_box: _call_node(
+                "module_clearances",
+                pcbs={"Module": inputs.module_shapes},
+                module_box=module_box,
+            ),
+            setup=lambda: inputs.module_box,
+        ),
+        Benchmark(
+            "export_stl_cold",
+            lambda module_box: mesh_cache.export_stl(module_box["top"], stl_file),
+            setup=clear_mesh_caches,
+        ),
+        Benchmark(
+            "export_stl_warm",
+            lambda module_box: mesh_cache.export_stl(module_box["top"], stl_file),
+            setup=fill_mesh_caches,
+        ),
+    ]
+    return benchmarks
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> dict[str, Any]:
+    """
+    Runs a benchmark and returns the median, minimum and maximum wall time in seconds
+    and the memory used.
+    """
+    times: list[float] = []
+    rss_before = _get_rss_mb()
+    for _ in range(benchmark.repeat or repeat):
+        state = benchmark.setup()
+        start = time.perf_counter()
+        benchmark.run(state)
+        times.append(time.perf_counter() - start)
+    rss_after = _get_rss_mb()
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "max": max(times),
+        "repeat": len(times),
+        "rss_increase_mb": (
+            None if rss_before is None or rss_after is None else rss_after - rss_before
+        ),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    threshold: float,
+) -> list[str]:
+    """
+    Prints the results next to the baseline.
+
+    :param threshold: Ratio of the medians above which a benchmark counts as slower.
+
+    :return: Names of the benchmarks that got slower than the threshold.
+    """
+    regressions: list[str] = []
+    print(
+        f"{'benchmark':<40} {'median':>10} {'baseline':>10} {'ratio':>7} {'rss MB':>8}"
+    )
+    for name, result in results.items():
+        baseline_median = baseline.get(name, {}).get("median")
+        ratio = None if not baseline_median else result["median"] / baseline_median
+        rss = result["rss_increase_mb"]
+        print(
+            f"{name:<40} {result['median'] * 1e3:>8.1f}ms "
+            + (
+                f"{baseline_median * 1e3:>8.1f}ms "
+                if baseline_median
+                else f"{'-':>10} "
+            )
+            + (f"{ratio:>7.2f}" if ratio is not None else f"{'-':>7}")
+            + (f" {rss:>8.1f}" if rss is not None else f" {'-':>8}")
+            + (" slower" if ratio is not None and ratio > threshold else "")
+        )
+        if ratio is not None and ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(args: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        metavar="NAME",
+        help="Only run benchmarks starting with NAME.",
+    )
+    parser.add_argument("--baseline", default=_default_baseline_file)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the new baseline.",
+    )
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Ratio to the baseline median above which a benchmark counts as slower.",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit with code 1 if a benchmark got slower than the threshold.",
+    )
+    arguments = parser.parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+
+    results: dict[str, dict[str, Any]] = {}
+    with Fixtures() as fixtures:
+        try:
+            for benchmark in get_benchmarks(fixtures):
+                if arguments.only and not any(
+                    benchmark.name.startswith(prefix) for prefix in arguments.only
+                ):
+                    continue
+                print(f"Running {benchmark.name}")
+                results[benchmark.name] = run_benchmark(benchmark, arguments.repeat)
+        finally:
+            serializer.set_encoding()
+
+    baseline: dict[str, dict[str, Any]] = {}
+    if os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, arguments.threshold)
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if arguments.save_baseline:
+        os.makedirs(os.path.dirname(arguments.baseline), exist_ok=True)
+        with open(arguments.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {arguments.baseline}")
+    if regressions and arguments.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
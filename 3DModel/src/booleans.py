@@ -0,0 +1,105 @@
+import logging
+import time
+from collections.abc import Iterable
+
+import cadquery as cq
+from OCP.BRepAlgoAPI import (
+    BRepAlgoAPI_BooleanOperation,
+    BRepAlgoAPI_Cut,
+    BRepAlgoAPI_Fuse,
+)
+from OCP.TopTools import TopTools_ListOfShape
+from profiling import stage
+
+
+def _to_shape_list(
+    cq_objects: Iterable[cq.Workplane | cq.Shape],
+) -> TopTools_ListOfShape:
+    shape_list = TopTools_ListOfShape()
+    for cq_object in cq_objects:
+        shapes = [cq_object] if isinstance(cq_object, cq.Shape) else cq_object.vals()
+        for shape in shapes:
+            if isinstance(shape, cq.Shape):
+                shape_list.Append(shape.wrapped)
+    return shape_list
+
+
+# cq.Shape.cut and cq.Shape.fuse already take many tools in one operation, but they
+# only accept a fuzzy value through the tol argument of newer CadQuery releases and
+# return whatever OCCT built without checking IsDone. This drives the OCCT operation
+# directly, so the fuzzy value can be set and failures raise.
+def _run_boolean(
+    operation: BRepAlgoAPI_BooleanOperation,
+    name: str,
+    cq_object: cq.Workplane,
+    tools: list[cq.Workplane | cq.Shape],
+    clean: bool,
+    fuzzy_value: float,
+    label: str | None,
+) -> cq.Workplane:
+    if not tools:
+        return cq_object
+    operation.SetArguments(_to_shape_list([cq_object.findSolid()]))
+    operation.SetTools(_to_shape_list(tools))
+    operation.SetRunParallel(True)
+    if fuzzy_value > 0:
+        operation.SetFuzzyValue(fuzzy_value)
+
+    start = time.perf_counter()
+    with stage(f"{name} {label or ''}".strip(), "boolean"):
+        operation.Build()
+    seconds = time.perf_counter() - start
+    logging.debug(f"{name} {label or ''} with {len(tools)} tools took {seconds:.3f}s")
+    if not operation.IsDone():
+        raise Exception(f"Boolean {name} {label or ''} with {len(tools)} tools failed")
+
+    result = cq.Shape.cast(operation.Shape())
+    if clean:
+        result = result.clean()
+    return cq_object.newObject([result])
+
+
+def cut_all(
+    cq_object: cq.Workplane,
+    tools: Iterable[cq.Workplane | cq.Shape],
+    clean: bool = True,
+    fuzzy_value: float = 0.0,
+    label: str | None = None,
+) -> cq.Workplane:
+    """
+    Cuts all tools out of the solid of a cq object in a single boolean operation,
+    instead of one cut per tool.
+
+    :param cq_object: The object to cut from, like cq.Workplane.cut.
+    :param tools: The shapes to cut out.
+    :param clean: Merge coplanar faces of the result, like cq.Workplane.cut.
+    :param fuzzy_value: Distance below which OCCT treats shapes as touching, helps
+    with coplanar faces of tools. 0 uses the OCCT default.
+    :param label: Name of the operation in the profile, see profiling.stage.
+    """
+    return _run_boolean(
+        BRepAlgoAPI_Cut(), "cut", cq_object, list(tools), clean, fuzzy_value, label
+    )
+
+
+def union_all(
+    cq_object: cq.Workplane,
+    tools: Iterable[cq.Workplane | cq.Shape],
+    clean: bool = True,
+    fuzzy_value: float = 0.0,
+    label: str | None = None,
+) -> cq.Workplane:
+    """
+    Fuses all tools with the solid of a cq object in a single boolean operation,
+    instead of one union per tool.
+
+    :param cq_object: The object to fuse with, like cq.Workplane.union.
+    :param tools: The shapes to add.
+    :param clean: Merge coplanar faces of the result, like cq.Workplane.union.
+    :param fuzzy_value: Distance below which OCCT treats shapes as touching, helps
+    with coplanar faces of tools. 0 uses the OCCT default.
+    :param label: Name of the operation in the profile, see profiling.stage.
+    """
+    return _run_boolean(
+        BRepAlgoAPI_Fuse(), "union", cq_object, list(tools), clean, fuzzy_value, label
+    )
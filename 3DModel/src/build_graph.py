@@ -0,0 +1,384 @@
+import functools
+import hashlib
+import inspect
+import logging
+import os
+from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Any
+
+from fingerprint import get_value_fingerprint
+from profiling import stage
+from shape_cache import ShapeCache, freeze_value, thaw_value
+from shape_transport import SharedShapeStore
+
+_BUILD_GRAPH_VERSION = "3"
+"""Bump this when changing how node keys are computed."""
+
+_project_folder = os.path.dirname(os.path.abspath(__file__))
+_module_fingerprints: dict[str, str] = {}
+"""Hashes of the source files of project modules by module name."""
+
+
+def _get_project_module(obj: Any) -> ModuleType | None:
+    """
+    Returns the module an object is defined in, if it is a module of this project.
+    """
+    module = obj if isinstance(obj, ModuleType) else inspect.getmodule(obj)
+    file = getattr(module, "__file__", None)
+    if file is None or os.path.dirname(os.path.abspath(file)) != _project_folder:
+        return None
+    return module
+
+
+def _get_code_names(code: Any) -> set[str]:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _get_code_names(const)
+    return names
+
+
+def get_called_modules(
+    func: Callable[..., Any], helpers: Iterable[Callable[..., Any]] = ()
+) -> list[ModuleType]:
+    """
+    Returns the project modules a function and its helpers use, directly or through
+    other project modules, e.g. pcb.py and booleans.py for a node calling
+    make_offset_shape. The module of the function itself is left out, only the
+    source of the function and its helpers matters there.
+    """
+    own_module = inspect.getmodule(func)
+    pending: list[ModuleType] = []
+    for used_func in (func, *helpers):
+        used_func = inspect.unwrap(used_func)
+        pending.append(used_func)
+        for name in _get_code_names(used_func.__code__):
+            pending.append(used_func.__globals__.get(name))
+    modules: dict[str, ModuleType] = {}
+    while pending:
+        module = _get_project_module(pending.pop())
+        if module is None or module is own_module or module.__name__ in modules:
+            continue
+        modules[module.__name__] = module
+        pending.extend(vars(module).values())
+    return [modules[name] for name in sorted(modules)]
+
+
+def _get_module_fingerprint(module: ModuleType) -> str:
+    if module.__name__ not in _module_fingerprints:
+        with open(module.__file__, "rb") as f:  # type: ignore
+            _module_fingerprints[module.__name__] = hashlib.sha256(f.read()).hexdigest()
+    return _module_fingerprints[module.__name__]
+
+
+class NodeParameters:
+    """
+    Read-only view of the parameters a build node declared.\n
+    Reading a parameter that was not declared raises, as it would not be part of the
+    node's cache key.
+    """
+
+    def __init__(self, node_name: str, parameters: Mapping[str, Any]):
+        self._node_name = node_name
+        self._parameters = parameters
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._parameters:
+            raise AttributeError(
+                f"Build node {self._node_name} reads parameter {name} without declaring it"
+            )
+        return self._parameters[name]
+
+    def __reduce__(self):
+        return NodeParameters, (self._node_name, dict(self._parameters))
+
+
+@dataclass
+class BuildNode:
+    name: str
+    func: Callable[..., Any]
+    params: tuple[str, ...]
+    """Names of the parameters the node reads."""
+    deps: tuple[str, ...]
+    """Names of the nodes whose results are passed as keyword arguments."""
+    lazy_deps: tuple[str, ...]
+    """Like deps, but passed as functions, so they are only built when called."""
+    inputs: Callable[[NodeParameters], Any] | None
+    """Returns a fingerprint of inputs outside the graph, e.g. files on disk."""
+    helpers: tuple[Callable[..., Any], ...]
+    """Functions called by the node, their source is part of the cache key."""
+    cache: ShapeCache
+    _code_fingerprint: str | None = field(default=None, repr=False)
+
+    def get_code_fingerprint(self) -> str:
+        """
+        Returns a hash of the source of the node function and its helpers, plus the
+        source files of the project modules they use, see get_called_modules.
+        Editing e.g. pcb.py rebuilds the nodes calling into it.
+        """
+        if self._code_fingerprint is None:
+            hasher = hashlib.sha256()
+            for func in (self.func, *self.helpers):
+                try:
+                    hasher.update(inspect.getsource(func).encode())
+                except (OSError, TypeError):
+                    hasher.update(func.__code__.co_code)
+            for module in get_called_modules(self.func, self.helpers):
+                hasher.update(
+                    f"{module.__name__}={_get_module_fingerprint(module)}".encode()
+                )
+            self._code_fingerprint = hasher.hexdigest()
+        return self._code_fingerprint
+
+
+def _build_node_in_worker(
+    func: Callable[..., Any], parameters: NodeParameters, frozen_kwargs: dict[str, Any]
+) -> Any:
+    return freeze_value(func(parameters, **thaw_value(frozen_kwargs)))
+
+
+class BuildGraph:
+    """
+    Named build steps with declared parameter and node dependencies.\n
+    Every result is cached under a hash of the node's code, the values of its declared
+    parameters and the keys of its dependencies, so changing a parameter only rebuilds
+    the nodes that depend on it.
+    """
+
+    def __init__(
+        self,
+        parameters: Mapping[str, Any],
+        derived_parameters: Mapping[str, Callable[[dict[str, Any]], Any]] | None = None,
+    ):
+        """
+        :param parameters: Values of all parameters.
+        :param derived_parameters: Parameters computed from the others, in order.
+        Overriding a parameter recomputes the derived parameters, unless they are
+        overridden as well.
+        """
+        self._base_parameters = dict(parameters)
+        self._derived_parameters = dict(derived_parameters or {})
+        self._nodes: dict[str, BuildNode] = {}
+        self._keys: dict[str, str] = {}
+        self._inputs: dict[tuple[str, str], str] = {}
+        """Fingerprints of node inputs by node and parameters, shared by all variants."""
+        self.parameters = dict(self._base_parameters)
+        for name, derive in self._derived_parameters.items():
+            if name not in self.parameters:
+                self.parameters[name] = derive(self.parameters)
+
+    def with_params(self, **overrides: Any) -> "BuildGraph":
+        """
+        Returns a graph with the same nodes and caches, but different parameter values.
+        """
+        unknown = [name for name in overrides if name not in self.parameters]
+        if unknown:
+            raise Exception(f"Unknown parameters: {', '.join(unknown)}")
+        graph = BuildGraph(
+            {**self._base_parameters, **overrides}, self._derived_parameters
+        )
+        graph._nodes = self._nodes
+        graph._inputs = self._inputs
+        return graph
+
+    def node(
+        self,
+        params: Iterable[str] = (),
+        deps: Iterable[str] = (),
+        lazy_deps: Iterable[str] = (),
+        inputs: Callable[[NodeParameters], Any] | None = None,
+        helpers: Iterable[Callable[..., Any]] = (),
+        persist: bool = True,
+        max_size: int = 4,
+    ):
+        """
+        Registers the decorated function as a build node named after the function.\n
+        The function is called with a NodeParameters view as first argument and the
+        results of its dependencies as keyword arguments.
+        Dependencies have to be registered before the nodes using them.
+
+        :param params: Names of the parameters the node reads.
+        :param deps: Names of the nodes the node needs.
+        :param lazy_deps: Names of the nodes the node might need.
+        :param inputs: Returns a fingerprint of inputs outside the graph.
+        :param helpers: Functions called by the node, that should invalidate it when
+        they are edited.
+        :param persist: Also store the results on disk, so they survive across runs.
+        :param max_size: Maximum number of results kept in memory.
+        """
+
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            name = func.__name__
+            if name in self._nodes:
+                raise Exception(f"Build node {name} is already registered")
+            for dep in (*deps, *lazy_deps):
+                if dep not in self._nodes:
+                    raise Exception(f"Build node {name} depends on unknown node {dep}")
+            for param in params:
+                if param not in self.parameters:
+                    raise Exception(
+                        f"Build node {name} reads unknown parameter {param}"
+                    )
+            self._nodes[name] = BuildNode(
+                name,
+                func,
+                tuple(params),
+                tuple(deps),
+                tuple(lazy_deps),
+                inputs,
+                tuple(helpers),
+                ShapeCache(f"build_graph/{name}", max_size, persist),
+            )
+            return func
+
+        return decorator
+
+    @property
+    def nodes(self) -> Mapping[str, BuildNode]:
+        return self._nodes
+
+    def _get_node_parameters(self, node: BuildNode) -> NodeParameters:
+        return NodeParameters(
+            node.name, {param: self.parameters[param] for param in node.params}
+        )
+
+    def get_key(self, name: str) -> str:
+        """
+        Returns the cache key of a node without building it or its dependencies.
+        """
+        if name not in self._keys:
+            node = self._nodes[name]
+            hasher = hashlib.sha256(_BUILD_GRAPH_VERSION.encode())
+            hasher.update(name.encode())
+            hasher.update(node.get_code_fingerprint().encode())
+            params = "".join(
+                f"{param}={get_value_fingerprint(self.parameters[param])}\n"
+                for param in node.params
+            )
+            hasher.update(params.encode())
+            if node.inputs is not None:
+                if (name, params) not in self._inputs:
+                    inputs = node.inputs(self._get_node_parameters(node))
+                    self._inputs[name, params] = get_value_fingerprint(inputs)
+                hasher.update(self._inputs[name, params].encode())
+            for dep in (*node.deps, *node.lazy_deps):
+                hasher.update(f"{dep}={self.get_key(dep)}".encode())
+            self._keys[name] = hasher.hexdigest()
+        return self._keys[name]
+
+    def preload(self, values: Mapping[str, Any]):
+        """
+        Stores results of nodes built by another process in the in-memory caches,
+        e.g. the shared nodes of a parameter sweep, see sweep.run_sweep.
+
+        :param values: Results by node name, they must have been built with the same
+        keys as in this graph.
+        """
+        for name, value in values.items():
+            self._nodes[name].cache.set(self.get_key(name), value, write_file=False)
+
+    def is_cached(self, name: str) -> bool:
+        """
+        Returns whether a node can be taken from the cache without building it.
+        """
+        return self.get_key(name) in self._nodes[name].cache
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the result of a node, building it and its dependencies only if they
+        are not cached.
+        """
+        node = self._nodes[name]
+        key = self.get_key(name)
+        missing = object()
+        value = node.cache.get(key, missing)
+        if value is missing:
+            kwargs: dict[str, Any] = {dep: self.get(dep) for dep in node.deps}
+            for dep in node.lazy_deps:
+                kwargs[dep] = functools.partial(self.get, dep)
+            logging.info(f"Building {name}")
+            with stage(name, "node"):
+                value = node.func(self._get_node_parameters(node), **kwargs)
+            node.cache.set(key, value)
+        return value
+
+    def get_many(self, names: Iterable[str]) -> dict[str, Any]:
+        return {name: self.get(name) for name in names}
+
+    def get_all_deps(self, name: str) -> set[str]:
+        """
+        Returns the names of all nodes a node depends on, directly or indirectly.
+        """
+        node = self._nodes[name]
+        all_deps: set[str] = set()
+        for dep in (*node.deps, *node.lazy_deps):
+            all_deps.add(dep)
+            all_deps |= self.get_all_deps(dep)
+        return all_deps
+
+    def get_parallel(
+        self, names: Iterable[str], max_workers: int | None = None
+    ) -> dict[str, Any]:
+        """
+        Builds independent nodes in parallel worker processes.\n
+        The dependencies of the nodes are built once in this process first and sent
+        to the workers through shared memory, see shape_transport. The results are
+        stored in the caches like with get.
+        Nodes with lazy dependencies are built in this process.
+
+        :param names: Names of nodes that do not depend on each other.
+        :param max_workers: Maximum number of worker processes, defaults to the
+        number of processors.
+
+        :return: The results by node name.
+        """
+        names = list(names)
+        for name in names:
+            dependent = self.get_all_deps(name) & set(names)
+            if dependent:
+                raise Exception(
+                    f"Build node {name} depends on {', '.join(sorted(dependent))}, "
+                    "which is built in parallel"
+                )
+        pending = [
+            name
+            for name in names
+            if not self._nodes[name].lazy_deps and not self.is_cached(name)
+        ]
+        if len(pending) > 1:
+            # Shared dependencies are built here, so the workers never build them twice
+            kwargs_by_name = {
+                name: {dep: self.get(dep) for dep in self._nodes[name].deps}
+                for name in pending
+            }
+            # The shapes are published to shared memory once, the workers only
+            # receive handles, even for dependencies shared by all nodes
+            with SharedShapeStore() as store, ProcessPoolExecutor(
+                max_workers=min(len(pending), max_workers or os.cpu_count() or 1)
+            ) as executor:
+                futures = {}
+                for name in pending:
+                    node = self._nodes[name]
+                    logging.info(f"Building {name} in a worker process")
+                    futures[name] = executor.submit(
+                        _build_node_in_worker,
+                        node.func,
+                        self._get_node_parameters(node),
+                        freeze_value(kwargs_by_name[name], store),
+                    )
+                for name, future in futures.items():
+                    value = thaw_value(future.result())
+                    self._nodes[name].cache.set(self.get_key(name), value)
+        return self.get_many(names)
+
+    def clear(self):
+        """
+        Clears the in-memory caches of all nodes, files on disk are kept.
+        """
+        for node in self._nodes.values():
+            node.cache.clear()
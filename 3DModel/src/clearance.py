@@ -0,0 +1,564 @@
+"""
+Fast, approximate clearance and interference checks between components and
+enclosure parts, on their meshes instead of with OCCT booleans.
+
+The meshes come from the mesh cache, so unchanged parts are not tessellated again.
+Distances are measured from the vertices of each mesh to the triangles of the other
+and between the edges of both meshes, which covers every closest pair of two
+triangles, so they are accurate up to the deflection of the meshes. A component
+interferes with a part if their triangles intersect or it lies inside the closed
+mesh of the part.
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import cadquery as cq
+import numpy as np
+
+from mesh_cache import Mesh, get_cq_object_mesh
+from profiling import profiled
+
+_LEAF_SIZE = 16
+"""Maximum number of triangles in a leaf of a BVH."""
+_QUERY_CHUNK_SIZE = 4096
+"""Number of points queried at once, limits the memory of the candidate pairs."""
+_SAMPLE_SIZE = 64
+"""Number of points searched first, to narrow down the search radius of the rest."""
+_RAY_DIRECTION = np.array([1.0, 1.3e-3, 1.7e-3])
+"""Direction of the rays of inside tests, slightly tilted so rays rarely hit edges
+exactly, while their bounding boxes stay thin."""
+
+
+@dataclass
+class Clearance:
+    component: str
+    part: str
+    distance: float
+    """Smallest distance between the component and the part, 0 if they interfere."""
+    interferes: bool
+
+
+@dataclass
+class Bvh:
+    """
+    Bounding volume hierarchy over the triangles of a mesh, stored as arrays.\n
+    Nodes are numbered breadth first, so children always come after their parent.
+    """
+
+    corners: np.ndarray
+    """Corners of the triangles with shape (m, 3, 3), ordered by leaf."""
+    triangle_lower: np.ndarray
+    triangle_upper: np.ndarray
+    lower: np.ndarray
+    """Lower corners of the node boxes with shape (k, 3)."""
+    upper: np.ndarray
+    children: np.ndarray
+    """Indices of the two children with shape (k, 2), -1 for leaves."""
+    start: np.ndarray
+    """Index of the first triangle of a leaf."""
+    count: np.ndarray
+    """Number of triangles of a leaf, 0 for inner nodes."""
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    # Inserts two zero bits between the lowest 21 bits of each value
+    values = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in (
+        (32, 0x1F00000000FFFF),
+        (16, 0x1F0000FF0000FF),
+        (8, 0x100F00F00F00F00F),
+        (4, 0x10C30C30C30C30C3),
+        (2, 0x1249249249249249),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _get_morton_codes(points: np.ndarray) -> np.ndarray:
+    lower, upper = points.min(axis=0), points.max(axis=0)
+    scaled = (points - lower) / np.where(upper > lower, upper - lower, 1.0)
+    quantized = (scaled * 0x1FFFFF).astype(np.uint64)
+    return (
+        _spread_bits(quantized[:, 0])
+        | (_spread_bits(quantized[:, 1]) << np.uint64(1))
+        | (_spread_bits(quantized[:, 2]) << np.uint64(2))
+    )
+
+
+def build_bvh(mesh: Mesh) -> Bvh:
+    """
+    Builds a BVH by sorting the triangles along a Morton curve and halving the
+    sorted ranges, until at most _LEAF_SIZE triangles are left. Every level is built
+    at once with NumPy.
+    """
+    vertices, triangles = mesh
+    return build_bvh_from_corners(vertices[triangles])
+
+
+def build_bvh_from_corners(corners: np.ndarray) -> Bvh:
+    """
+    Builds a BVH from the corners of triangles with shape (m, 3, 3), see build_bvh.
+    """
+    corners = corners.reshape(-1, 3, 3).astype(np.float64)
+    if len(corners):
+        corners = corners[np.argsort(_get_morton_codes(corners.mean(axis=1)))]
+    triangle_lower = corners.min(axis=1)
+    triangle_upper = corners.max(axis=1)
+
+    begins = np.array([0], dtype=np.int64)
+    ends = np.array([len(corners)], dtype=np.int64)
+    nodes = np.array([0], dtype=np.int64)
+    all_begins, all_ends = [begins], [ends]
+    # Split nodes and their left children, by level
+    levels: list[tuple[np.ndarray, np.ndarray]] = []
+    node_count = 1
+    while True:
+        split = ends - begins > _LEAF_SIZE
+        if not split.any():
+            break
+        parents, begins, ends = nodes[split], begins[split], ends[split]
+        middles = (begins + ends) // 2
+        left = node_count + 2 * np.arange(len(parents))
+        node_count += 2 * len(parents)
+        levels.append((parents, left))
+        begins = np.stack([begins, middles], axis=1).reshape(-1)
+        ends = np.stack([middles, ends], axis=1).reshape(-1)
+        nodes = np.stack([left, left + 1], axis=1).reshape(-1)
+        all_begins.append(begins)
+        all_ends.append(ends)
+
+    # Nodes are numbered in the order of the levels
+    start = np.concatenate(all_begins)
+    count = np.concatenate(all_ends) - start
+    children = np.full((node_count, 2), -1, dtype=np.int64)
+    for parents, left in levels:
+        children[parents] = np.stack([left, left + 1], axis=1)
+    count[children[:, 0] >= 0] = 0
+
+    lower = np.full((node_count, 3), np.inf)
+    upper = np.full((node_count, 3), -np.inf)
+    leaves = np.flatnonzero(count > 0)
+    if len(leaves):
+        # The leaves are contiguous ranges of the sorted triangles
+        leaves = leaves[np.argsort(start[leaves])]
+        lower[leaves] = np.minimum.reduceat(triangle_lower, start[leaves])
+        upper[leaves] = np.maximum.reduceat(triangle_upper, start[leaves])
+    for parents, left in reversed(levels):
+        lower[parents] = np.minimum(lower[left], lower[left + 1])
+        upper[parents] = np.maximum(upper[left], upper[left + 1])
+    return Bvh(
+        corners, triangle_lower, triangle_upper, lower, upper, children, start, count
+    )
+
+
+def query_boxes(
+    bvh: Bvh, lower: np.ndarray, upper: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the triangles whose bounding boxes overlap query boxes, descending the
+    BVH for all boxes at once.
+
+    :param lower: Lower corners of the query boxes with shape (n, 3).
+    :param upper: Upper corners of the query boxes with shape (n, 3).
+
+    :return: Indices of the query boxes and of the triangles of all overlapping pairs.
+    """
+    queries = np.arange(len(lower))
+    nodes = np.zeros(len(lower), dtype=np.int64)
+    leaf_queries: list[np.ndarray] = []
+    leaf_nodes: list[np.ndarray] = []
+    while len(queries):
+        overlap = np.all(
+            (lower[queries] <= bvh.upper[nodes]) & (upper[queries] >= bvh.lower[nodes]),
+            axis=1,
+        )
+        queries, nodes = queries[overlap], nodes[overlap]
+        is_leaf = bvh.children[nodes, 0] < 0
+        leaf_queries.append(queries[is_leaf])
+        leaf_nodes.append(nodes[is_leaf])
+        queries = np.repeat(queries[~is_leaf], 2)
+        nodes = bvh.children[nodes[~is_leaf]].reshape(-1)
+    if not leaf_queries:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    found_queries = np.concatenate(leaf_queries)
+    found_nodes = np.concatenate(leaf_nodes)
+    counts = bvh.count[found_nodes]
+    pair_queries = np.repeat(found_queries, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_triangles = np.repeat(bvh.start[found_nodes], counts) + offsets
+    overlap = np.all(
+        (lower[pair_queries] <= bvh.triangle_upper[pair_triangles])
+        & (upper[pair_queries] >= bvh.triangle_lower[pair_triangles]),
+        axis=1,
+    )
+    return pair_queries[overlap], pair_triangles[overlap]
+
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _safe(denominator: np.ndarray) -> np.ndarray:
+    return np.where(denominator == 0, 1.0, denominator)
+
+
+def point_triangle_distances(points: np.ndarray, corners: np.ndarray) -> np.ndarray:
+    """
+    Returns the distances of points to triangles, pairwise.\n
+    Uses the closest point regions of Ericson, Real-Time Collision Detection 5.1.5.
+
+    :param points: Points with shape (n, 3).
+    :param corners: Corners of the triangles with shape (n, 3, 3).
+    """
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    d1, d2 = _dot(ab, ap), _dot(ac, ap)
+    d3, d4 = _dot(ab, bp), _dot(ac, bp)
+    d5, d6 = _dot(ab, cp), _dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    denominator = _safe(va + vb + vc)
+    closest = a + ab * (vb / denominator)[:, None] + ac * (vc / denominator)[:, None]
+    # Regions are applied from the lowest to the highest priority
+    bc_weight = (d4 - d3) / _safe((d4 - d3) + (d5 - d6))
+    regions = [
+        (
+            (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+            b + (c - b) * bc_weight[:, None],
+        ),
+        ((vb <= 0) & (d2 >= 0) & (d6 <= 0), a + ac * (d2 / _safe(d2 - d6))[:, None]),
+        ((d6 >= 0) & (d5 <= d6), c),
+        ((vc <= 0) & (d1 >= 0) & (d3 <= 0), a + ab * (d1 / _safe(d1 - d3))[:, None]),
+        ((d3 >= 0) & (d4 <= d3), b),
+        ((d1 <= 0) & (d2 <= 0), a),
+    ]
+    for mask, region_closest in regions:
+        closest = np.where(mask[:, None], region_closest, closest)
+    return np.linalg.norm(points - closest, axis=1)
+
+
+def segment_distances(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    other_starts: np.ndarray,
+    other_ends: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the distances between segments, pairwise.\n
+    Uses the closest points of Ericson, Real-Time Collision Detection 5.1.9.
+
+    :param starts: Start points with shape (n, 3).
+    :param ends: End points with shape (n, 3).
+    :param other_starts: Start points of the other segments with shape (n, 3).
+    :param other_ends: End points of the other segments with shape (n, 3).
+    """
+    direction, other_direction = ends - starts, other_ends - other_starts
+    offset = starts - other_starts
+    a, e = _dot(direction, direction), _dot(other_direction, other_direction)
+    b = _dot(direction, other_direction)
+    c, f = _dot(direction, offset), _dot(other_direction, offset)
+    denominator = a * e - b * b
+    # Parallel segments take any closest point, here the start of the first segment
+    s = np.where(
+        denominator > 0, np.clip((b * f - c * e) / _safe(denominator), 0, 1), 0
+    )
+    t = (b * s + f) / _safe(e)
+    s = np.where(t < 0, np.clip(-c / _safe(a), 0, 1), s)
+    s = np.where(t > 1, np.clip((b - c) / _safe(a), 0, 1), s)
+    t = np.clip(t, 0, 1)
+    # A point as the other segment only leaves the closest point on the first one
+    s = np.where(e == 0, np.clip(-c / _safe(a), 0, 1), s)
+    closest = starts + direction * s[:, None]
+    other_closest = other_starts + other_direction * t[:, None]
+    return np.linalg.norm(closest - other_closest, axis=1)
+
+
+def segments_hit_triangles(
+    starts: np.ndarray, ends: np.ndarray, corners: np.ndarray
+) -> np.ndarray:
+    """
+    Returns whether segments cross triangles, pairwise (Möller-Trumbore).
+    Segments only touching a triangle with an end point do not count.
+
+    :param starts: Start points with shape (n, 3).
+    :param ends: End points with shape (n, 3).
+    :param corners: Corners of the triangles with shape (n, 3, 3).
+    """
+    a = corners[:, 0]
+    edge1, edge2 = corners[:, 1] - a, corners[:, 2] - a
+    direction = ends - starts
+    h = np.cross(direction, edge2)
+    determinant = _dot(edge1, h)
+    valid = np.abs(determinant) > 1e-12
+    inverse = 1.0 / _safe(determinant)
+    s = starts - a
+    u = inverse * _dot(s, h)
+    q = np.cross(s, edge1)
+    v = inverse * _dot(direction, q)
+    t = inverse * _dot(edge2, q)
+    return valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0) & (t < 1)
+
+
+def get_min_distance(points: np.ndarray, bvh: Bvh, max_distance: float) -> float:
+    """
+    Returns the smallest distance of points to the triangles of a BVH, or inf if
+    all points are farther than max_distance.
+    """
+    min_distance = np.inf
+    # A sparse sample first, so all other points are searched in a small radius
+    sample = points[:: max(1, len(points) // _SAMPLE_SIZE)]
+    chunks = [
+        points[begin : begin + _QUERY_CHUNK_SIZE]
+        for begin in range(0, len(points), _QUERY_CHUNK_SIZE)
+    ]
+    for chunk in [sample, *chunks]:
+        # Only search as far as the closest triangle found so far
+        radius = min(max_distance, min_distance)
+        query_indices, triangle_indices = query_boxes(
+            bvh, chunk - radius, chunk + radius
+        )
+        if len(query_indices):
+            distances = point_triangle_distances(
+                chunk[query_indices], bvh.corners[triangle_indices]
+            )
+            min_distance = min(min_distance, float(distances.min()))
+    return min_distance if min_distance <= max_distance else np.inf
+
+
+def get_min_edge_distance(corners: np.ndarray, bvh: Bvh, max_distance: float) -> float:
+    """
+    Returns the smallest distance between the edges of triangles and the edges of
+    the triangles of a BVH, or inf if all edges are farther than max_distance.
+
+    :param corners: Corners of the triangles with shape (n, 3, 3).
+    """
+    min_distance = np.inf
+    lower, upper = corners.min(axis=1), corners.max(axis=1)
+    for begin in range(0, len(corners), _QUERY_CHUNK_SIZE):
+        end = begin + _QUERY_CHUNK_SIZE
+        radius = min(max_distance, min_distance)
+        query_indices, triangle_indices = query_boxes(
+            bvh, lower[begin:end] - radius, upper[begin:end] + radius
+        )
+        if not len(query_indices):
+            continue
+        chunk_corners = corners[begin:end][query_indices]
+        other_corners = bvh.corners[triangle_indices]
+        for first, second in ((0, 1), (1, 2), (2, 0)):
+            for other_first, other_second in ((0, 1), (1, 2), (2, 0)):
+                distances = segment_distances(
+                    chunk_corners[:, first],
+                    chunk_corners[:, second],
+                    other_corners[:, other_first],
+                    other_corners[:, other_second],
+                )
+                min_distance = min(min_distance, float(distances.min()))
+    return min_distance if min_distance <= max_distance else np.inf
+
+
+def meshes_intersect(bvh: Bvh, other_bvh: Bvh) -> bool:
+    """
+    Returns whether any triangles of two BVHs cross each other.
+    """
+    for begin in range(0, len(other_bvh.corners), _QUERY_CHUNK_SIZE):
+        end = begin + _QUERY_CHUNK_SIZE
+        query_indices, triangle_indices = query_boxes(
+            bvh,
+            other_bvh.triangle_lower[begin:end],
+            other_bvh.triangle_upper[begin:end],
+        )
+        if not len(query_indices):
+            continue
+        corners = bvh.corners[triangle_indices]
+        other_corners = other_bvh.corners[begin:end][query_indices]
+        for first, second in ((0, 1), (1, 2), (2, 0)):
+            if (
+                segments_hit_triangles(
+                    other_corners[:, first], other_corners[:, second], corners
+                ).any()
+                or segments_hit_triangles(
+                    corners[:, first], corners[:, second], other_corners
+                ).any()
+            ):
+                return True
+    return False
+
+
+def get_inside(points: np.ndarray, bvh: Bvh) -> np.ndarray:
+    """
+    Returns which points lie inside the closed mesh of a BVH, by counting the
+    triangles crossed by a ray from each point.
+    """
+    inside = np.zeros(len(points), dtype=bool)
+    if not len(bvh.corners):
+        return inside
+    for begin in range(0, len(points), _QUERY_CHUNK_SIZE):
+        chunk = points[begin : begin + _QUERY_CHUNK_SIZE]
+        lengths = np.maximum(bvh.upper[0, 0] - chunk[:, 0], 0.0) + 1.0
+        ends = chunk + _RAY_DIRECTION * lengths[:, None]
+        query_indices, triangle_indices = query_boxes(
+            bvh, np.minimum(chunk, ends), np.maximum(chunk, ends)
+        )
+        hits = segments_hit_triangles(
+            chunk[query_indices], ends[query_indices], bvh.corners[triangle_indices]
+        )
+        crossings = np.bincount(query_indices[hits], minlength=len(chunk))
+        inside[begin : begin + len(chunk)] = crossings % 2 == 1
+    return inside
+
+
+class _MeshObject:
+    def __init__(self, mesh: Mesh):
+        self.vertices = mesh[0].astype(np.float64)
+        self.bvh = build_bvh(mesh)
+        self.lower = self.bvh.lower[0]
+        self.upper = self.bvh.upper[0]
+
+
+def _get_points_in_box(
+    points: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> np.ndarray:
+    return points[np.all((points >= lower) & (points <= upper), axis=1)]
+
+
+def _get_sample(points: np.ndarray) -> np.ndarray:
+    return points[:: max(1, len(points) // _SAMPLE_SIZE)]
+
+
+def _check_pair(
+    component: _MeshObject, part: _MeshObject, max_distance: float
+) -> tuple[float, bool] | None:
+    if np.any(component.lower - max_distance > part.upper) or np.any(
+        component.upper + max_distance < part.lower
+    ):
+        return None
+    # The parts are closed, so components reaching into them have points inside.
+    # Only points inside the bounding box of the part are tested, and a component
+    # inside the part without crossing triangles is inside with all of its points,
+    # so a sample is enough.
+    component_sample = _get_sample(
+        _get_points_in_box(component.vertices, part.lower, part.upper)
+    )
+    if get_inside(component_sample, part.bvh).any():
+        return 0.0, True
+
+    # Everything else only needs the triangles of the part close to the component
+    _, triangle_indices = query_boxes(
+        part.bvh,
+        (component.lower - max_distance)[None],
+        (component.upper + max_distance)[None],
+    )
+    if not len(triangle_indices):
+        return None
+    near_part = build_bvh_from_corners(part.bvh.corners[triangle_indices])
+    near_part_vertices = np.unique(near_part.corners.reshape(-1, 3), axis=0)
+    # Inside tests need a closed mesh, which components do not always have, so walls
+    # reaching into a component are only found by their crossing triangles
+    if meshes_intersect(near_part, component.bvh):
+        return 0.0, True
+
+    distance = get_min_distance(
+        _get_points_in_box(
+            component.vertices,
+            near_part.lower[0] - max_distance,
+            near_part.upper[0] + max_distance,
+        ),
+        near_part,
+        max_distance,
+    )
+    distance = min(
+        distance,
+        get_min_distance(
+            _get_points_in_box(
+                near_part_vertices,
+                component.lower - max_distance,
+                component.upper + max_distance,
+            ),
+            component.bvh,
+            min(distance, max_distance),
+        ),
+    )
+    # Edges can pass closer to each other than any vertex comes to a triangle, e.g.
+    # a long component edge along a chamfered edge of the part
+    component_corners = component.bvh.corners[
+        np.all(
+            (component.bvh.triangle_upper >= near_part.lower[0] - max_distance)
+            & (component.bvh.triangle_lower <= near_part.upper[0] + max_distance),
+            axis=1,
+        )
+    ]
+    distance = min(
+        distance,
+        get_min_edge_distance(
+            component_corners, near_part, min(distance, max_distance)
+        ),
+    )
+    return (distance, False) if distance <= max_distance else None
+
+
+@profiled()
+def check_clearances(
+    components: Mapping[str, cq.Workplane | cq.Shape],
+    parts: Mapping[str, cq.Workplane | cq.Shape],
+    max_distance: float = 2.0,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+) -> list[Clearance]:
+    """
+    Measures the clearance between every component and every part, e.g. the
+    components of a PCB and the halves of its enclosure.
+
+    :param components: Objects to check by name, e.g. a shapes dictionary.
+    :param parts: Objects to check the components against by name.
+    :param max_distance: Pairs farther apart than this are not reported.
+    :param tolerance: Linear deflection of the meshes, see mesh_cache.get_mesh.
+    :param angular_tolerance: Angular deflection of the meshes in radians.
+
+    :return: The pairs closer than max_distance, interfering pairs first, then by
+    distance.
+    """
+    part_meshes = {
+        name: _MeshObject(get_cq_object_mesh(cq_object, tolerance, angular_tolerance))
+        for name, cq_object in parts.items()
+    }
+    clearances: list[Clearance] = []
+    for component_name, cq_object in components.items():
+        component = _MeshObject(
+            get_cq_object_mesh(cq_object, tolerance, angular_tolerance)
+        )
+        for part_name, part in part_meshes.items():
+            result = _check_pair(component, part, max_distance)
+            if result is not None:
+                clearances.append(Clearance(component_name, part_name, *result))
+    clearances.sort(
+        key=lambda clearance: (not clearance.interferes, clearance.distance)
+    )
+    return clearances
+
+
+def summarize_clearances(clearances: list[Clearance]) -> dict[str, Any]:
+    """
+    Returns the interfering pairs and the smallest clearance of the other pairs,
+    e.g. for manifests.
+    """
+    return {
+        "interferences": [
+            f"{clearance.component} / {clearance.part}"
+            for clearance in clearances
+            if clearance.interferes
+        ],
+        "min_clearance": min(
+            (
+                clearance.distance
+                for clearance in clearances
+                if not clearance.interferes
+            ),
+            default=None,
+        ),
+    }
@@ -0,0 +1,142 @@
+import os
+import pickle
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import cadquery as cq
+from OCP.Bnd import Bnd_Box
+from OCP.gp import gp_Pnt
+from profiling import stage
+from serializer import dump, load, register
+
+register()
+
+_INDEX_FILE_NAME = "index.pkl"
+
+
+@dataclass
+class ComponentInfo:
+    name: str
+    file_name: str
+    bounding_box: tuple[float, float, float, float, float, float]
+    """xmin, ymin, zmin, xmax, ymax, zmax"""
+    center: tuple[float, float, float]
+
+
+def _get_component_info(name: str, file_name: str, shape: cq.Shape) -> ComponentInfo:
+    bounds = shape.BoundingBox()
+    return ComponentInfo(
+        name,
+        file_name,
+        (
+            bounds.xmin,
+            bounds.ymin,
+            bounds.zmin,
+            bounds.xmax,
+            bounds.ymax,
+            bounds.zmax,
+        ),
+        shape.Center().toTuple(),
+    )
+
+
+class LazyShapesDict(Mapping[str, cq.Shape]):
+    """
+    Read-only shapes dictionary backed by a component store folder.\n
+    Each component is loaded only when it is accessed, bounding boxes and centers
+    are answered from the index without rebuilding any geometry.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        components: list[ComponentInfo],
+        shapes: dict[str, cq.Shape] | None = None,
+    ):
+        self._folder = folder
+        self._components = {component.name: component for component in components}
+        self._shapes: dict[str, cq.Shape] = dict(shapes or {})
+
+    def __getitem__(self, name: str) -> cq.Shape:
+        if name not in self._shapes:
+            component = self._components[name]
+            with stage("unpickle component"):
+                self._shapes[name] = load(
+                    os.path.join(self._folder, component.file_name)
+                )
+        return self._shapes[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._components)
+
+    def __len__(self) -> int:
+        return len(self._components)
+
+    def __reduce__(self):
+        # Only send the index, the receiving process loads components from disk on demand
+        return LazyShapesDict, (self._folder, list(self._components.values()))
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._shapes
+
+    def info(self, name: str) -> ComponentInfo:
+        return self._components[name]
+
+    def bounding_box(self, name: str) -> cq.BoundBox:
+        """
+        Returns the bounding box of a component without loading its geometry.
+        """
+        xmin, ymin, zmin, xmax, ymax, zmax = self._components[name].bounding_box
+        return cq.BoundBox(
+            Bnd_Box(gp_Pnt(xmin, ymin, zmin), gp_Pnt(xmax, ymax, zmax))
+        )
+
+    def bounding_boxes(self) -> dict[str, cq.BoundBox]:
+        return {name: self.bounding_box(name) for name in self._components}
+
+    def center(self, name: str) -> cq.Vector:
+        """
+        Returns the center of a component without loading its geometry.
+        """
+        return cq.Vector(*self._components[name].center)
+
+
+def save_component_store(
+    shapes_dict: Mapping[str, cq.Shape], folder: str, cache_key: Any
+) -> LazyShapesDict:
+    """
+    Saves every shape to its own pickle file inside the folder, plus an index with
+    the cache key, names, bounding boxes and centers.
+
+    :return: A LazyShapesDict for the saved store, with all shapes already loaded.
+    """
+    os.makedirs(folder, exist_ok=True)
+    index_file = os.path.join(folder, _INDEX_FILE_NAME)
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    components: list[ComponentInfo] = []
+    for i, (name, shape) in enumerate(shapes_dict.items()):
+        file_name = f"{i}.pkl"
+        with open(os.path.join(folder, file_name), "wb") as f:
+            dump(shape, f)
+        components.append(_get_component_info(name, file_name, shape))
+    # Written last, so an interrupted save never leaves a valid looking index
+    with open(index_file, "wb") as f:
+        pickle.dump((cache_key, components), f)
+    return LazyShapesDict(folder, components, dict(shapes_dict))
+
+
+def load_component_store(folder: str) -> tuple[Any, LazyShapesDict]:
+    """
+    Loads the index of a component store, no component geometry is loaded.
+
+    :return: The cache key the store was saved with and a LazyShapesDict.
+    """
+    with open(os.path.join(folder, _INDEX_FILE_NAME), "rb") as f:
+        (cache_key, components) = pickle.load(f)
+    return cache_key, LazyShapesDict(folder, components)
+
+
+def has_component_store(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, _INDEX_FILE_NAME))
@@ -0,0 +1,136 @@
+"""
+Layouts of connected cubes on a grid, for building scenes of many cubes.
+
+Cubes sit on the cells of a grid in the xy plane, one box length apart, and are
+rotated around the z axis. Modules have pogo connectors on all sides, power supplies
+only on their right side, so power supplies are turned towards a module.
+"""
+
+from dataclasses import dataclass
+
+MODULE = "Module"
+POWER_SUPPLY = "Power Supply"
+
+GRID_SYMBOLS = {"M": MODULE, "P": POWER_SUPPLY}
+"""Cube kinds by grid symbol, "." or " " is an empty cell."""
+
+DIRECTIONS = {"Right": (1, 0), "Top": (0, 1), "Left": (-1, 0), "Bottom": (0, -1)}
+"""Neighbouring cells by side name, in the order of increasing rotation."""
+_ROTATIONS = {offset: index * 90 for index, offset in enumerate(DIRECTIONS.values())}
+"""Rotations turning the right side of a cube towards a neighbouring cell."""
+
+
+@dataclass(frozen=True)
+class CubePlacement:
+    kind: str
+    """MODULE or POWER_SUPPLY."""
+    cell: tuple[int, int]
+    """Column and row of the grid, the row grows in y direction."""
+    rotation: int = 0
+    """Rotation around the z axis in degrees, a multiple of 90."""
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind} {self.cell[0]},{self.cell[1]}"
+
+
+def face_modules(layout: list[CubePlacement]) -> list[CubePlacement]:
+    """
+    Turns the right side of every power supply towards a neighbouring module, the
+    first one in the order of DIRECTIONS. Power supplies without one are kept.
+    """
+    modules = {placement.cell for placement in layout if placement.kind == MODULE}
+    placements: list[CubePlacement] = []
+    for placement in layout:
+        if placement.kind == POWER_SUPPLY:
+            x, y = placement.cell
+            for (dx, dy), rotation in _ROTATIONS.items():
+                if (x + dx, y + dy) in modules:
+                    placement = CubePlacement(POWER_SUPPLY, placement.cell, rotation)
+                    break
+        placements.append(placement)
+    return placements
+
+
+def validate_layout(layout: list[CubePlacement]):
+    cells: set[tuple[int, int]] = set()
+    for placement in layout:
+        if placement.kind not in (MODULE, POWER_SUPPLY):
+            raise Exception(f"Unknown cube kind {placement.kind}")
+        if placement.rotation % 90 != 0:
+            raise Exception(f"Rotation of {placement.name} is not a multiple of 90")
+        if placement.cell in cells:
+            raise Exception(f"More than one cube at {placement.cell}")
+        cells.add(placement.cell)
+
+
+def parse_grid(text: str) -> list[CubePlacement]:
+    """
+    Parses a layout drawn as rows of GRID_SYMBOLS, separated by new lines or "/".
+    The first row is the top one, e.g. "MMM/PM." for three modules above a power
+    supply and a module. Power supplies face a neighbouring module, see face_modules.
+    """
+    rows = [row for row in text.replace("/", "\n").splitlines() if row.strip()]
+    layout: list[CubePlacement] = []
+    for row_index, row in enumerate(rows):
+        for column, symbol in enumerate(row.replace(" ", ".")):
+            if symbol == ".":
+                continue
+            if symbol.upper() not in GRID_SYMBOLS:
+                raise Exception(
+                    f"Unknown grid symbol {symbol}, use one of "
+                    f"{', '.join(GRID_SYMBOLS)} or . for an empty cell"
+                )
+            cell = (column, len(rows) - 1 - row_index)
+            layout.append(CubePlacement(GRID_SYMBOLS[symbol.upper()], cell))
+    layout = face_modules(layout)
+    validate_layout(layout)
+    return layout
+
+
+def attach(
+    layout: list[CubePlacement], index: int, side: str, kind: str = MODULE
+) -> list[CubePlacement]:
+    """
+    Returns the layout with a cube added next to one of its cubes, for building
+    layouts from connections instead of a grid.
+
+    :param layout: The cubes so far, e.g. [CubePlacement(POWER_SUPPLY, (0, 0))].
+    :param index: Index of the cube to connect to.
+    :param side: Side of that cube as seen in the grid, see DIRECTIONS.
+    :param kind: Kind of the new cube, a power supply faces the cube it is
+    connected to.
+    """
+    if side not in DIRECTIONS:
+        raise Exception(f"Unknown side {side}, use one of {', '.join(DIRECTIONS)}")
+    x, y = layout[index].cell
+    dx, dy = DIRECTIONS[side]
+    rotation = _ROTATIONS[(-dx, -dy)] if kind == POWER_SUPPLY else 0
+    extended = [*layout, CubePlacement(kind, (x + dx, y + dy), rotation)]
+    validate_layout(extended)
+    return extended
+
+
+def get_chain(count: int, side: str = "Right") -> list[CubePlacement]:
+    """
+    Returns a power supply with a row of modules connected to one side of it.
+    """
+    layout = [CubePlacement(POWER_SUPPLY, (0, 0), _ROTATIONS[DIRECTIONS[side]])]
+    for index in range(count):
+        layout = attach(layout, index, side)
+    return layout
+
+
+def get_grid(columns: int, rows: int) -> list[CubePlacement]:
+    """
+    Returns a full grid of modules, powered by a power supply left of the bottom
+    left module.
+    """
+    return face_modules(
+        [CubePlacement(POWER_SUPPLY, (-1, 0))]
+        + [
+            CubePlacement(MODULE, (column, row))
+            for row in range(rows)
+            for column in range(columns)
+        ]
+    )
@@ -1,26 +1,50 @@
 import cadquery as cq
+from collections.abc import Iterable, Mapping
 from typing import Any
 
+from preview import Lod, get_preview
 
-def debug_show_no_exit(
-    *objs: cq.Workplane | Any,
-    **kobjs: cq.Workplane | Any,
+
+def debug_preview_no_exit(
+    objs: Iterable[cq.Workplane | Any] = (),
+    kobjs: Mapping[str, cq.Workplane | Any] | None = None,
+    lod: Lod = "full",
+    lods: Mapping[str, Lod] | None = None,
 ):
     """
-    Show a cq object in the cadquery viewer
+    Show cq objects in the cadquery viewer with a level of detail.\n
+    The objects are passed as a list and a dictionary instead of keyword arguments,
+    so object names never clash with the options.
+
+    :param objs: Objects to show without a name.
+    :param kobjs: Objects to show by name.
+    :param lod: Level of detail of the objects, see preview.get_preview. "coarse" or
+    "box" keep large objects like whole PCBs quick to show.
+    :param lods: Level of detail of named objects, overriding lod.
     """
     import ocp_vscode
 
-    def to_cq_object(obj: cq.Workplane):
+    def to_cq_object(obj: cq.Workplane, lod: Lod):
         if isinstance(obj, cq.Workplane):
-            return obj
+            return get_preview(obj, lod)
         else:
             raise TypeError(f"Unsupported type: {type(obj)}")
 
+    lods = lods or {}
     for obj in objs:
-        ocp_vscode.show_object(to_cq_object(obj))
-    for key, obj in kobjs.items():
-        ocp_vscode.show_object(to_cq_object(obj), name=key)
+        ocp_vscode.show_object(to_cq_object(obj, lod))
+    for key, obj in (kobjs or {}).items():
+        ocp_vscode.show_object(to_cq_object(obj, lods.get(key, lod)), name=key)
+
+
+def debug_show_no_exit(
+    *objs: cq.Workplane | Any,
+    **kobjs: cq.Workplane | Any,
+):
+    """
+    Show a cq object in the cadquery viewer
+    """
+    debug_preview_no_exit(objs, kobjs)
 
 
 def debug_show(*objs: cq.Workplane | Any, **kobjs: cq.Workplane | Any) -> None:
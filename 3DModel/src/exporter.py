@@ -0,0 +1,219 @@
+"""
+Writes the exported files of an output folder, skipping files whose geometry is
+unchanged since the last export.
+
+The fingerprint of every written file is stored in export_manifest.json next to the
+files. Files are written to a hidden folder first and then moved into place, so
+programs watching the output folder only ever see complete files, and only for
+files that actually changed.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+import cadquery as cq
+
+from fingerprint import get_cq_object_fingerprint
+from mesh_cache import export_stl
+from shape_cache import freeze_value, thaw_value
+from shape_transport import SharedShapeStore
+
+_EXPORT_VERSION = "1"
+"""Part of every file fingerprint, increase to rewrite all files after format changes."""
+
+MANIFEST_FILE_NAME = "export_manifest.json"
+_PARTIAL_FOLDER_NAME = ".partial"
+
+
+def get_file_fingerprint(
+    geometry_fingerprint: str,
+    file_name: str,
+    tolerance: float,
+    angular_tolerance: float,
+) -> str:
+    """
+    Returns the fingerprint of an exported file, from the fingerprint of its geometry
+    and the settings it is written with.
+    """
+    key = (
+        f"{_EXPORT_VERSION}-{geometry_fingerprint}-{os.path.splitext(file_name)[1]}"
+        f"-{tolerance!r}-{angular_tolerance!r}"
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ExportManifest:
+    """
+    Fingerprints of the files in an output folder, see MANIFEST_FILE_NAME.
+    """
+
+    def __init__(self, output_folder: str):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_FILE_NAME)
+        self.fingerprints: dict[str, str] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.fingerprints = json.load(f)["files"]
+            except Exception as e:
+                print(f"Error loading export manifest {self.path}: {e}")
+
+    def is_unchanged(self, file_name: str, fingerprint: str) -> bool:
+        """
+        Returns True if the file exists and was written with the same fingerprint.
+        """
+        return self.fingerprints.get(file_name) == fingerprint and os.path.exists(
+            os.path.join(self.output_folder, file_name)
+        )
+
+    def set(self, file_name: str, fingerprint: str):
+        self.fingerprints[file_name] = fingerprint
+
+    def save(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(
+                {
+                    "version": _EXPORT_VERSION,
+                    "files": dict(sorted(self.fingerprints.items())),
+                },
+                f,
+                indent=2,
+            )
+        os.replace(temporary_path, self.path)
+
+
+def write_file(output_folder: str, file_name: str, write: Callable[[str], None]):
+    """
+    Writes a file of the output folder in the hidden partial folder first and moves
+    it into place once it is complete.
+
+    :param write: Writes the file to the path it is given, the path has the same file
+    name, so the format can still be chosen by the extension.
+    """
+    partial_folder = os.path.join(output_folder, _PARTIAL_FOLDER_NAME, str(os.getpid()))
+    os.makedirs(partial_folder, exist_ok=True)
+    partial_path = os.path.join(partial_folder, file_name)
+    write(partial_path)
+    os.replace(partial_path, os.path.join(output_folder, file_name))
+    with contextlib.suppress(OSError):
+        os.rmdir(partial_folder)
+
+
+def _export_stl_file(
+    cq_object: cq.Workplane | cq.Shape,
+    output_folder: str,
+    file_name: str,
+    tolerance: float,
+    angular_tolerance: float,
+):
+    write_file(
+        output_folder,
+        file_name,
+        lambda path: export_stl(cq_object, path, tolerance, angular_tolerance),
+    )
+
+
+def _export_stl_file_in_worker(
+    frozen_cq_object: object,
+    output_folder: str,
+    file_name: str,
+    tolerance: float,
+    angular_tolerance: float,
+):
+    _export_stl_file(
+        thaw_value(frozen_cq_object),
+        output_folder,
+        file_name,
+        tolerance,
+        angular_tolerance,
+    )
+
+
+def export_stls(
+    cq_objects: dict[str, cq.Workplane],
+    output_folder: str,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+    max_workers: int | None = None,
+    force: bool = False,
+    manifest: ExportManifest | None = None,
+) -> list[str]:
+    """
+    Exports cq objects as binary STL files in parallel worker processes, skipping
+    files whose geometry and tolerances are unchanged since the last export.
+
+    :param cq_objects: The objects to export by file name, e.g. "Box_Top.stl".
+    :param output_folder: Folder to write the files and the manifest to.
+    :param tolerance: Linear deflection of the meshes, see mesh_cache.get_mesh.
+    :param angular_tolerance: Angular deflection of the meshes in radians.
+    :param max_workers: Maximum number of worker processes, defaults to the number of
+    processors. 1 writes all files in this process.
+    :param force: Write all files, even if they are unchanged.
+    :param manifest: Manifest of the output folder, loaded from the folder if None.
+    It is saved after writing the files.
+
+    :return: The names of the written files.
+    """
+    manifest = manifest or ExportManifest(output_folder)
+    fingerprints = {
+        file_name: get_file_fingerprint(
+            get_cq_object_fingerprint(cq_object),
+            file_name,
+            tolerance,
+            angular_tolerance,
+        )
+        for file_name, cq_object in cq_objects.items()
+    }
+    pending = [
+        file_name
+        for file_name, fingerprint in fingerprints.items()
+        if force or not manifest.is_unchanged(file_name, fingerprint)
+    ]
+    for file_name in cq_objects:
+        if file_name not in pending:
+            logging.info(f"Skipping unchanged {file_name}")
+
+    worker_count = min(len(pending), max_workers or os.cpu_count() or 1)
+    try:
+        if worker_count > 1:
+            # Only handles to the shapes in shared memory are sent to the workers
+            with SharedShapeStore() as store, ProcessPoolExecutor(
+                max_workers=worker_count
+            ) as executor:
+                futures = {
+                    file_name: executor.submit(
+                        _export_stl_file_in_worker,
+                        freeze_value(cq_objects[file_name], store),
+                        output_folder,
+                        file_name,
+                        tolerance,
+                        angular_tolerance,
+                    )
+                    for file_name in pending
+                }
+                for file_name, future in futures.items():
+                    future.result()
+                    manifest.set(file_name, fingerprints[file_name])
+                    logging.info(f"Exported {file_name}")
+        else:
+            for file_name in pending:
+                _export_stl_file(
+                    cq_objects[file_name],
+                    output_folder,
+                    file_name,
+                    tolerance,
+                    angular_tolerance,
+                )
+                manifest.set(file_name, fingerprints[file_name])
+                logging.info(f"Exported {file_name}")
+    finally:
+        # Files written before a failure are not written again in the next run
+        manifest.save()
+    return pending
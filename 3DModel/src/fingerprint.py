@@ -0,0 +1,74 @@
+import hashlib
+from collections.abc import Iterable
+from io import BytesIO
+from typing import Any
+from weakref import WeakKeyDictionary
+
+import cadquery as cq
+from OCP.BinTools import BinTools, BinTools_FormatVersion
+
+_fingerprints: "WeakKeyDictionary[cq.Shape, str]" = WeakKeyDictionary()
+"""Fingerprints of shapes that were already hashed in this process."""
+
+
+def get_shape_fingerprint(shape: cq.Shape) -> str:
+    """
+    Returns a stable hash of the geometry of a shape, including its location.\n
+    Equal shapes have equal fingerprints across runs and processes, meshing a shape
+    does not change its fingerprint.
+    """
+    fingerprint = _fingerprints.get(shape)
+    if fingerprint is None:
+        with BytesIO() as stream:
+            # Triangulations are left out, so meshing a shape keeps its fingerprint
+            BinTools.Write_s(
+                shape.wrapped,
+                stream,
+                False,
+                False,
+                BinTools_FormatVersion.BinTools_FormatVersion_CURRENT,
+            )
+            fingerprint = hashlib.sha256(stream.getbuffer()).hexdigest()
+        _fingerprints[shape] = fingerprint
+    return fingerprint
+
+
+def get_shapes_fingerprint(shapes: Iterable[cq.Shape]) -> str:
+    """
+    Returns a stable hash of the geometry of multiple shapes, in the given order.
+    """
+    hasher = hashlib.sha256()
+    for shape in shapes:
+        hasher.update(get_shape_fingerprint(shape).encode())
+    return hasher.hexdigest()
+
+
+def get_cq_object_fingerprint(cq_object: cq.Workplane | cq.Shape) -> str:
+    """
+    Returns a stable hash of the geometry of all shapes of a cq object.
+    """
+    if isinstance(cq_object, cq.Shape):
+        return get_shapes_fingerprint([cq_object])
+    return get_shapes_fingerprint(
+        val for val in cq_object.vals() if isinstance(val, cq.Shape)
+    )
+
+
+def get_value_fingerprint(value: Any) -> str:
+    """
+    Returns a stable string for a function argument, hashing the geometry of
+    cq objects and using repr for everything else.
+    """
+    if isinstance(value, (cq.Workplane, cq.Shape)):
+        return f"{type(value).__name__}({get_cq_object_fingerprint(value)})"
+    if isinstance(value, cq.Vector):
+        return f"Vector{value.toTuple()!r}"
+    if isinstance(value, (list, tuple)):
+        items = ", ".join(get_value_fingerprint(item) for item in value)
+        return f"{type(value).__name__}({items})"
+    if isinstance(value, dict):
+        items = ", ".join(
+            f"{key!r}: {get_value_fingerprint(item)}" for key, item in value.items()
+        )
+        return f"dict({items})"
+    return repr(value)
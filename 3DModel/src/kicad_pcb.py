@@ -0,0 +1,294 @@
+"""
+Lightweight reader for KiCad .kicad_pcb files.
+
+Only parses the s-expression structure, without any KiCad dependencies, to find out
+whether the parts of a board that end up in the exported STEP file have changed.
+"""
+
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+
+SExpr = str | list["SExpr"]
+
+_GEOMETRY_FINGERPRINT_VERSION = "1"
+"""Bump this when changing what is included in the geometry fingerprint."""
+
+_TOKEN_PATTERN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+_ESCAPE_PATTERN = re.compile(r"\\(.)")
+
+_EDGE_CUTS_LAYER = "Edge.Cuts"
+_BOARD_GRAPHIC_NODES = (
+    "gr_line",
+    "gr_arc",
+    "gr_circle",
+    "gr_rect",
+    "gr_poly",
+    "gr_curve",
+)
+_FOOTPRINT_GRAPHIC_NODES = (
+    "fp_line",
+    "fp_arc",
+    "fp_circle",
+    "fp_rect",
+    "fp_poly",
+    "fp_curve",
+)
+_IGNORED_NODES = ("uuid", "tstamp", "stroke", "effects")
+"""Nodes that never change the exported geometry."""
+_DEFAULT_BOARD_THICKNESS = 1.6
+
+
+@dataclass
+class OutlineSegment:
+    kind: str
+    """line, arc, circle, rect, poly or curve"""
+    points: list[tuple[float, float]]
+    """
+    line: start, end\n
+    arc: start, mid, end\n
+    circle: center, point on the circle\n
+    rect: two opposite corners\n
+    poly: corners of the closed polygon\n
+    curve: the four bezier control points
+    """
+
+
+def parse_sexpr(text: str) -> SExpr:
+    """
+    Parses a KiCad s-expression into nested lists of strings.\n
+    Quoted strings are unquoted, numbers are kept as strings.
+
+    :param text: The s-expression text.
+
+    :return: The root expression.
+    """
+    stack: list[list[SExpr]] = [[]]
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError(f"Unexpected ')' at position {match.start()}")
+            node = stack.pop()
+            stack[-1].append(node)
+        elif token[0] == '"':
+            stack[-1].append(_ESCAPE_PATTERN.sub(r"\1", token[1:-1]))
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError("Unbalanced s-expression")
+    return stack[0][0]
+
+
+def load_kicad_pcb(kicad_pcb_file: str) -> SExpr:
+    """
+    Loads and parses a .kicad_pcb file.
+    """
+    with open(kicad_pcb_file, "r", encoding="utf-8") as f:
+        root = parse_sexpr(f.read())
+    if not isinstance(root, list) or not root or root[0] != "kicad_pcb":
+        raise ValueError(f"{kicad_pcb_file} is not a KiCad PCB file")
+    return root
+
+
+def get_children(node: SExpr, name: str) -> list[list[SExpr]]:
+    """
+    Returns all child nodes with the given name.
+    """
+    return [
+        child
+        for child in node
+        if isinstance(child, list) and child and child[0] == name
+    ]
+
+
+def get_child(node: SExpr, name: str) -> list[SExpr] | None:
+    """
+    Returns the first child node with the given name or None.
+    """
+    for child in node:
+        if isinstance(child, list) and child and child[0] == name:
+            return child
+    return None
+
+
+def get_layer(node: SExpr) -> str | None:
+    layer = get_child(node, "layer")
+    if layer is None or len(layer) < 2:
+        return None
+    return layer[1]  # type: ignore
+
+
+def _without_ignored_nodes(node: SExpr) -> SExpr:
+    if not isinstance(node, list):
+        return node
+    return [
+        _without_ignored_nodes(child)
+        for child in node
+        if not (isinstance(child, list) and child and child[0] in _IGNORED_NODES)
+    ]
+
+
+def _get_footprint_geometry(footprint: list[SExpr]) -> list[SExpr]:
+    """
+    Returns the parts of a footprint that change the exported STEP file:
+    placement, attributes (e.g. dnp), 3D models, drilled pads, edge cuts and
+    the reference and value the components are named after.
+    """
+    geometry: list[SExpr] = [footprint[1] if len(footprint) > 1 else ""]
+    for child in footprint[2:]:
+        if not isinstance(child, list) or not child:
+            continue
+        name = child[0]
+        if name in ("layer", "at", "attr", "model", "dnp"):
+            geometry.append(_without_ignored_nodes(child))
+        elif name == "property" and child[1:2] in (["Reference"], ["Value"]):
+            geometry.append(child[:3])
+        elif name == "pad" and get_child(child, "drill") is not None:
+            geometry.append(
+                [
+                    child[:4],
+                    get_child(child, "at"),
+                    get_child(child, "size"),
+                    get_child(child, "drill"),
+                ]
+            )
+        elif (
+            name in _FOOTPRINT_GRAPHIC_NODES
+            and get_layer(child) == _EDGE_CUTS_LAYER
+        ):
+            geometry.append(_without_ignored_nodes(child))
+    return geometry
+
+
+def get_geometry(kicad_pcb: SExpr) -> list[SExpr]:
+    """
+    Extracts the parts of a parsed board that change the exported STEP file.\n
+    Tracks, zones, texts and silkscreen are left out, vias are kept, as their
+    holes can be cut into the board body.
+
+    :param kicad_pcb: The parsed board, see load_kicad_pcb.
+
+    :return: The extracted parts in file order.
+    """
+    geometry: list[SExpr] = []
+    for node in kicad_pcb[1:]:
+        if not isinstance(node, list) or not node:
+            continue
+        name = node[0]
+        if name == "general":
+            geometry.append(get_child(node, "thickness") or [])
+        elif name == "setup":
+            geometry.append(_without_ignored_nodes(get_child(node, "stackup") or []))
+            geometry.append(get_child(node, "aux_axis_origin") or [])
+        elif name in _BOARD_GRAPHIC_NODES and get_layer(node) == _EDGE_CUTS_LAYER:
+            geometry.append(_without_ignored_nodes(node))
+        elif name == "via":
+            geometry.append(["via", get_child(node, "at"), get_child(node, "drill")])
+        elif name == "footprint":
+            geometry.append(["footprint", *_get_footprint_geometry(node)])
+    return geometry
+
+
+def get_geometry_fingerprint(kicad_pcb_file: str) -> str:
+    """
+    Returns a hash of the parts of a .kicad_pcb file that change the exported STEP file:
+    board outline, thickness and stack-up, drill origin, footprint placements,
+    3D models, drilled holes and dnp flags.
+    """
+    geometry = get_geometry(load_kicad_pcb(kicad_pcb_file))
+    hasher = hashlib.sha256(_GEOMETRY_FINGERPRINT_VERSION.encode())
+    hasher.update(repr(geometry).encode())
+    return hasher.hexdigest()
+
+
+def _get_xy(node: list[SExpr] | None) -> tuple[float, float]:
+    if node is None or len(node) < 3:
+        raise ValueError(f"Expected coordinates, found {node}")
+    return float(node[1]), float(node[2])  # type: ignore
+
+
+def _get_graphic_points(node: list[SExpr]) -> list[tuple[float, float]]:
+    kind = node[0][3:]  # type: ignore
+    if kind == "arc":
+        names = ("start", "mid", "end")
+    elif kind == "circle":
+        names = ("center", "end")
+    elif kind in ("line", "rect"):
+        names = ("start", "end")
+    else:
+        pts = get_child(node, "pts")
+        if pts is None:
+            raise ValueError(f"Missing pts in {node[0]}")
+        return [_get_xy(xy) for xy in get_children(pts, "xy")]
+    return [_get_xy(get_child(node, name)) for name in names]
+
+
+def get_board_outline(kicad_pcb: SExpr) -> list[OutlineSegment]:
+    """
+    Returns all Edge.Cuts graphics of a parsed board, including the ones inside
+    footprints, in the coordinate system of the STEP export with the drill origin:
+    relative to the drill origin, with the y axis pointing up.
+
+    :param kicad_pcb: The parsed board, see load_kicad_pcb.
+    """
+    setup = get_child(kicad_pcb, "setup")
+    aux_axis_origin = None if setup is None else get_child(setup, "aux_axis_origin")
+    origin_x, origin_y = (
+        (0.0, 0.0) if aux_axis_origin is None else _get_xy(aux_axis_origin)
+    )
+
+    def to_step(point: tuple[float, float]) -> tuple[float, float]:
+        return point[0] - origin_x, -(point[1] - origin_y)
+
+    outline: list[OutlineSegment] = []
+    for node in kicad_pcb[1:]:
+        if not isinstance(node, list) or not node:
+            continue
+        if node[0] in _BOARD_GRAPHIC_NODES and get_layer(node) == _EDGE_CUTS_LAYER:
+            points = [to_step(p) for p in _get_graphic_points(node)]
+            outline.append(OutlineSegment(node[0][3:], points))  # type: ignore
+        elif node[0] == "footprint":
+            at = get_child(node, "at")
+            x, y = _get_xy(at)
+            angle = math.radians(float(at[3])) if len(at) > 3 else 0  # type: ignore
+            cos, sin = math.cos(angle), math.sin(angle)
+            for child in node:
+                if (
+                    isinstance(child, list)
+                    and child
+                    and child[0] in _FOOTPRINT_GRAPHIC_NODES
+                    and get_layer(child) == _EDGE_CUTS_LAYER
+                ):
+                    points = [
+                        # KiCad rotates counterclockwise on screen, y pointing down
+                        to_step((x + px * cos + py * sin, y - px * sin + py * cos))
+                        for px, py in _get_graphic_points(child)
+                    ]
+                    outline.append(OutlineSegment(child[0][3:], points))  # type: ignore
+    return outline
+
+
+def get_board_thickness(kicad_pcb: SExpr) -> float:
+    """
+    Returns the board thickness of a parsed board, taken from the general section
+    or summed up from the stack-up if it is missing.
+    """
+    general = get_child(kicad_pcb, "general")
+    thickness = None if general is None else get_child(general, "thickness")
+    if thickness is not None:
+        return float(thickness[1])  # type: ignore
+    setup = get_child(kicad_pcb, "setup")
+    stackup = None if setup is None else get_child(setup, "stackup")
+    if stackup is not None:
+        layer_thicknesses = [
+            float(layer_thickness[1])  # type: ignore
+            for layer in get_children(stackup, "layer")
+            if (layer_thickness := get_child(layer, "thickness")) is not None
+        ]
+        if layer_thicknesses:
+            return sum(layer_thicknesses)
+    return _DEFAULT_BOARD_THICKNESS
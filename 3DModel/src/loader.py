@@ -1,4 +1,9 @@
+import hashlib
 import os
+import subprocess
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
 
 from OCP import IFSelect
 from OCP.STEPCAFControl import STEPCAFControl_Reader
@@ -12,7 +17,14 @@ from OCP.XCAFDoc import XCAFDoc_DocumentTool
 from io import BytesIO
 import cadquery as cq
 from serializer import register
-import pickle
+from profiling import profiled
+from kicad_pcb import get_geometry_fingerprint
+from component_store import (
+    LazyShapesDict,
+    has_component_store,
+    load_component_store,
+    save_component_store,
+)
 
 register()
 
@@ -20,20 +32,51 @@ _path_to_script = os.path.dirname(os.path.abspath(__file__))
 _pcb_folder = os.path.abspath(os.path.join(_path_to_script, "..", "..", "PCB"))
 _output_folder = os.path.abspath(os.path.join(_path_to_script, "..", "models"))
 
+_KICAD_CLI_STEP_EXPORT_FLAGS = ("--drill-origin", "--no-dnp", "--subst-models")
+"""Flags passed to `kicad-cli pcb export step`, part of the cache key."""
 
+
+class KicadPcbConversionError(Exception):
+    """
+    Raised when one or more KiCad PCBs could not be converted to shapes.
+    """
+
+
+@profiled("kicad-cli STEP export")
 def _convert_kicad_pcb(
     kicad_pcb_file: str,
     step_file: str,
-):
+) -> str:
     """
     Converts a KiCad PCB file to a STEP file using kicad-cli.
+
+    :return: The captured output of kicad-cli.
     """
     kicad_pcb_file = os.path.abspath(kicad_pcb_file)
     step_file = os.path.abspath(step_file)
-    print("Converting " + kicad_pcb_file + " to " + step_file)
-    kicad_cli_cmd = f'kicad-cli pcb export step "{kicad_pcb_file}" --drill-origin --no-dnp --subst-models -o "{step_file}"'
-    print(f"Running command: {kicad_cli_cmd}")
-    os.system(kicad_cli_cmd)
+    os.makedirs(os.path.dirname(step_file), exist_ok=True)
+    kicad_cli_cmd = [
+        "kicad-cli",
+        "pcb",
+        "export",
+        "step",
+        kicad_pcb_file,
+        *_KICAD_CLI_STEP_EXPORT_FLAGS,
+        "-o",
+        step_file,
+    ]
+    output = f"Converting {kicad_pcb_file} to {step_file}\n"
+    output += f"Running command: {subprocess.list2cmdline(kicad_cli_cmd)}\n"
+    try:
+        result = subprocess.run(kicad_cli_cmd, capture_output=True, text=True)
+    except OSError as e:
+        raise KicadPcbConversionError(output + f"Could not run kicad-cli: {e}")
+    output += result.stdout + result.stderr
+    if result.returncode != 0:
+        raise KicadPcbConversionError(
+            output + f"kicad-cli exited with code {result.returncode}"
+        )
+    return output
 
 
 def _get_kicad_pcb_step_file(
@@ -45,7 +88,7 @@ def _get_kicad_pcb_step_file(
     return os.path.join(_output_folder, f"{kicad_pcb_name}.step")
 
 
-def _get_kicad_pcb_file(
+def get_kicad_pcb_file(
     kicad_pcb_name: str,
 ):
     """
@@ -54,15 +97,16 @@ def _get_kicad_pcb_file(
     return os.path.join(_pcb_folder, kicad_pcb_name, f"{kicad_pcb_name}.kicad_pcb")
 
 
-def _get_kicad_pcb_pickle_file(
+def _get_kicad_pcb_store_folder(
     kicad_pcb_name: str,
 ):
     """
-    Returns the path to the pickle file for the given KiCad PCB name.
+    Returns the path to the component store folder for the given KiCad PCB name.
     """
-    return os.path.join(_output_folder, f"{kicad_pcb_name}.pkl")
+    return os.path.join(_output_folder, kicad_pcb_name)
 
 
+@profiled("STEP import")
 def _step_to_shapes_dict(
     step_file: str, pcb_part_name: str, full_name: str
 ) -> dict[str, cq.Shape]:
@@ -118,63 +162,193 @@ def _step_to_shapes_dict(
     return shapes
 
 
-def get_kicad_pcb_modification_time(kicad_pcb_name: str) -> float:
-    kicad_pcb_file = _get_kicad_pcb_file(kicad_pcb_name)
-    return os.path.getmtime(kicad_pcb_file)
+@cache
+def _get_kicad_cli_version() -> str | None:
+    """
+    Returns the version reported by kicad-cli or None if kicad-cli is not available.
+    """
+    try:
+        result = subprocess.run(
+            ["kicad-cli", "--version"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
 
 
-def save_to_pickle(shapes_dict: dict[str, cq.Shape], kicad_pcb_name: str):
-    pickle_file = _get_kicad_pcb_pickle_file(kicad_pcb_name)
-    modification_time = get_kicad_pcb_modification_time(kicad_pcb_name)
-    with open(pickle_file, "wb") as f:
-        pickle.dump((modification_time, shapes_dict), f)
+def get_kicad_pcb_cache_key(kicad_pcb_name: str) -> dict[str, str | None]:
+    """
+    Returns the cache key for the given KiCad PCB name.\n
+    The key consists of a fingerprint of the board parts that end up in the STEP file,
+    the kicad-cli version and the flags used for the STEP export, so it survives checkouts
+    and fresh clones and ignores edits to routing, zones or silkscreen.
+    If the board file can not be parsed, a hash of the whole file is used instead.
+    """
+    kicad_pcb_file = get_kicad_pcb_file(kicad_pcb_name)
+    cache_key: dict[str, str | None] = {}
+    try:
+        cache_key["geometry"] = get_geometry_fingerprint(kicad_pcb_file)
+    except ValueError as e:
+        print(f"Could not fingerprint {kicad_pcb_file}, using a content hash: {e}")
+        with open(kicad_pcb_file, "rb") as f:
+            cache_key["content"] = hashlib.sha256(f.read()).hexdigest()
+    cache_key["kicad_cli"] = _get_kicad_cli_version()
+    cache_key["flags"] = " ".join(_KICAD_CLI_STEP_EXPORT_FLAGS)
+    return cache_key
+
+
+def is_cache_key_current(
+    cache_key: dict[str, str | None], current_cache_key: dict[str, str | None]
+) -> bool:
+    """
+    Checks whether a stored cache key still matches the current one.\n
+    If kicad-cli is not available, the version is ignored, as the cache could not be rebuilt anyway.
+    """
+    if not isinstance(cache_key, dict):
+        return False
+    for key, value in current_cache_key.items():
+        if key == "kicad_cli" and value is None:
+            continue
+        if cache_key.get(key) != value:
+            return False
+    return True
+
+
+@profiled("save component store")
+def save_to_store(
+    shapes_dict: dict[str, cq.Shape], kicad_pcb_name: str
+) -> LazyShapesDict:
+    store_folder = _get_kicad_pcb_store_folder(kicad_pcb_name)
+    cache_key = get_kicad_pcb_cache_key(kicad_pcb_name)
+    return save_component_store(shapes_dict, store_folder, cache_key)
+
+
+@profiled("load component store index")
+def load_from_store(
+    kicad_pcb_name: str,
+) -> tuple[dict[str, str | None], LazyShapesDict]:
+    store_folder = _get_kicad_pcb_store_folder(kicad_pcb_name)
+    return load_component_store(store_folder)
+
 
+def _build_kicad_pcb_shapes_dict(
+    kicad_pcb_name: str,
+    pcb_part_name: str,
+    full_name: str,
+) -> tuple[LazyShapesDict, str]:
+    """
+    Converts a KiCad PCB to a shapes dictionary and saves it to its component store.\n
+    Runs in a worker process when loading in parallel, only the store index is sent
+    back and the components are loaded from disk when they are accessed.
 
-def load_from_pickle(filename: str) -> tuple[float, dict[str, cq.Shape]]:
-    with open(filename, "rb") as f:
-        (modification_time, shapes_dict_cq_shape) = pickle.load(f)
-    return modification_time, shapes_dict_cq_shape
+    :return: The shapes dictionary and the captured conversion output.
+    """
+    kicad_pcb_file = get_kicad_pcb_file(kicad_pcb_name)
+    step_file = _get_kicad_pcb_step_file(kicad_pcb_name)
+    output = _convert_kicad_pcb(kicad_pcb_file, step_file)
+    shapes_dict = _step_to_shapes_dict(step_file, pcb_part_name, full_name)
+    return save_to_store(shapes_dict, kicad_pcb_name), output
 
 
+@profiled("load PCBs")
 def get_kicad_pcbs_as_shapes_dicts(
     kicad_pcb_names: list[str],
     pcb_part_name: str = "PCB",
     full_name: str = "FullBoard",
+    parallel: bool = False,
+    max_workers: int | None = None,
 ):
     """
     Loads the KiCad PCBs as cadquery shapes dictionaries.
     :param kicad_pcb_names: List of KiCad PCB names to load.
     :param pcb_part_name: The part name of the PCB in the STEP file.
+    :param parallel: Convert and parse outdated KiCad PCBs in a process pool.
+    :param max_workers: Maximum number of worker processes, defaults to one per outdated PCB.
     :return: A dictionary of KiCad PCB names and their corresponding cadquery shapes dictionaries.
+        Components are loaded lazily, bounding boxes and centers are available without loading.
     """
-    shapes_dicts: dict[str, dict[str, cq.Shape]] = {}
+    shapes_dicts: dict[str, LazyShapesDict] = {}
+    outdated_kicad_pcb_names: list[str] = []
     for kicad_pcb_name in kicad_pcb_names:
-        pickle_file = _get_kicad_pcb_pickle_file(kicad_pcb_name)
-        is_kicad_pcb_pickle_outdated = True
-        if os.path.exists(pickle_file):
+        store_folder = _get_kicad_pcb_store_folder(kicad_pcb_name)
+        is_kicad_pcb_store_outdated = True
+        if has_component_store(store_folder):
             try:
-                print(f"Loading {kicad_pcb_name} from pickle file {pickle_file}")
-                modification_time, shapes_dict = load_from_pickle(pickle_file)
-                is_kicad_pcb_pickle_outdated = (
-                    modification_time != get_kicad_pcb_modification_time(kicad_pcb_name)
+                print(f"Loading {kicad_pcb_name} from component store {store_folder}")
+                cache_key, shapes_dict = load_from_store(kicad_pcb_name)
+                is_kicad_pcb_store_outdated = not is_cache_key_current(
+                    cache_key, get_kicad_pcb_cache_key(kicad_pcb_name)
                 )
                 shapes_dicts[kicad_pcb_name] = shapes_dict
             except Exception as e:
-                print(f"Error loading pickle file {pickle_file}: {e}")
-                is_kicad_pcb_pickle_outdated = True
-        if is_kicad_pcb_pickle_outdated:
-            print(f"KiCad PCB pickle file {pickle_file} is outdated or does not exist.")
-            kicad_pcb_file = _get_kicad_pcb_file(kicad_pcb_name)
-            step_file = _get_kicad_pcb_step_file(kicad_pcb_name)
-            _convert_kicad_pcb(kicad_pcb_file, step_file)
-            shapes_dict = _step_to_shapes_dict(step_file, pcb_part_name, full_name)
-            shapes_dicts[kicad_pcb_name] = shapes_dict
-            save_to_pickle(shapes_dicts[kicad_pcb_name], kicad_pcb_name)
-
-    return shapes_dicts
-
-
-def shapes_dict_to_cq_object(shapes_dict: dict[str, cq.Shape]) -> cq.Workplane:
+                print(f"Error loading component store {store_folder}: {e}")
+                is_kicad_pcb_store_outdated = True
+        if is_kicad_pcb_store_outdated:
+            print(
+                f"KiCad PCB component store {store_folder} is outdated or does not exist."
+            )
+            outdated_kicad_pcb_names.append(kicad_pcb_name)
+
+    errors: dict[str, Exception] = {}
+
+    def handle_result(kicad_pcb_name: str, get_result):
+        try:
+            shapes_dict, output = get_result()
+        except Exception as e:
+            errors[kicad_pcb_name] = e
+            return
+        print(output, end="")
+        shapes_dicts[kicad_pcb_name] = shapes_dict
+
+    if parallel and len(outdated_kicad_pcb_names) > 1:
+        with ProcessPoolExecutor(
+            max_workers=max_workers or len(outdated_kicad_pcb_names)
+        ) as executor:
+            futures = {
+                kicad_pcb_name: executor.submit(
+                    _build_kicad_pcb_shapes_dict,
+                    kicad_pcb_name,
+                    pcb_part_name,
+                    full_name,
+                )
+                for kicad_pcb_name in outdated_kicad_pcb_names
+            }
+            for kicad_pcb_name, future in futures.items():
+                handle_result(kicad_pcb_name, future.result)
+    else:
+        for kicad_pcb_name in outdated_kicad_pcb_names:
+            handle_result(
+                kicad_pcb_name,
+                lambda: _build_kicad_pcb_shapes_dict(
+                    kicad_pcb_name, pcb_part_name, full_name
+                ),
+            )
+
+    for kicad_pcb_name, error in errors.items():
+        if kicad_pcb_name in shapes_dicts:
+            print(
+                f"Error converting {kicad_pcb_name}, using outdated component store instead:\n{error}"
+            )
+    missing_errors = {
+        kicad_pcb_name: error
+        for kicad_pcb_name, error in errors.items()
+        if kicad_pcb_name not in shapes_dicts
+    }
+    if missing_errors:
+        raise KicadPcbConversionError(
+            "\n".join(
+                f"Error converting {kicad_pcb_name}:\n{error}"
+                for kicad_pcb_name, error in missing_errors.items()
+            )
+        )
+
+    return {
+        kicad_pcb_name: shapes_dicts[kicad_pcb_name]
+        for kicad_pcb_name in kicad_pcb_names
+    }
+
+
+def shapes_dict_to_cq_object(shapes_dict: Mapping[str, cq.Shape]) -> cq.Workplane:
     """
     Converts a shapes dictionary to a cadquery Workplane object by combining all shapes.
 
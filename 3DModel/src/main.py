@@ -1,600 +1,285 @@
-import ocp_vscode
-import cadquery as cq
-from loader import get_kicad_pcbs_as_shapes_dicts, shapes_dict_to_cq_object
-from debug import debug_show, debug_show_no_exit
-from pcb import make_offset_shape
+import argparse
+import logging
 import os
 
-
-def build_octahedron(
-    size: float, cq_object: cq.Workplane = cq.Workplane("XY")
-) -> cq.Workplane:
-    v = [
-        (size, 0, 0),
-        (-size, 0, 0),
-        (0, size, 0),
-        (0, -size, 0),
-        (0, 0, size),
-        (0, 0, -size),
-    ]
-    faces = [
-        [0, 2, 4],
-        [2, 1, 4],
-        [1, 3, 4],
-        [3, 0, 4],
-        [0, 5, 2],
-        [2, 5, 1],
-        [1, 5, 3],
-        [3, 5, 0],
-    ]
-    cq_faces: list[cq.Face] = []
-    for f in faces:
-        polygon = cq.Wire.makePolygon([v[f[0]], v[f[1]], v[f[2]], v[f[0]]])
-        tri = cq.Face.makeFromWires(polygon)
-        cq_faces.append(tri)
-    cq_shell = cq.Shell.makeShell(cq_faces)
-    cq_solid = cq.Solid.makeSolid(cq_shell)
-    return cq_object.add(cq_solid)
-
-
-# fmt: off
-# ----------- Constants
-KICAD_PCB_NAMES = [
-    "Module",
-    "PowerSupply",
-    "PogoConnector",
-]
-
-PRINTER_MIN_OUTER_WALL_WIDTH = 0.42
-
-PCB_PART_NAME = "PCB"
-FULL_PCB_NAME = "FullBoard"
-PCB_THICKNESS = 1.6
-
-WALL_THICKNESS = 1
-"""Typical wall thickness for 3D printed parts."""
-PCB_TOLERANCE = 0.1
-"""Tolerance to apply in all directions around the PCB to ensure it fits into the box."""
-TOLERANCE = 0.15
-"""Tolerance to apply in all directions when combining two 3d printed parts."""
-
-POGO_PIN_OFFSET = 2.3
-"""Distance from the center of the pogo connecter to the center of the pogo pins."""
-
-POGO_PIN_DIAMETER = 2.0
-POGO_PIN_LENGTH = 3.0
-"""Length of the pogo pin, when not compressed."""
-POGO_PIN_MAX_COMPRESSION = 1.0
-"""Maximum compression length for pogo pins, meaning how far the pin can be pushed in."""
-POGO_PIN_TARGET_COMPRESSION_PERCENTAGE = 0.6
-"""Target compression percentage for pogo pins. 60% compression is recommended."""
-POGO_PIN_LENGTH_COMPRESSED = (
-    POGO_PIN_LENGTH - (POGO_PIN_TARGET_COMPRESSION_PERCENTAGE * POGO_PIN_MAX_COMPRESSION)
-)
-"""Length of the pogo pin when compressed to the target percentage."""
-POGO_PIN_SPACING = 3
-"""Spacing between pogo pins."""
-NUMBER_OF_POGO_PINS = 6
-
-POGO_PIN_CUTOUT_EXTRA_DIAMETER = 1
-"""Diameter to add to the pogo pin diameter for a cutout to prevent filament from making the surface uneven."""
-POGO_PIN_CUTOUT_THICKNESS = PRINTER_MIN_OUTER_WALL_WIDTH
-"""Thickness of the cutout for the pogo pins."""
-
-MAGNET_DIAMETER = 10.0 - 0.1  # Slightly smaller for a tighter fit
-MAGNET_THICKNESS = 2.7
-MAGNET_DISTANCE = 4 * PRINTER_MIN_OUTER_WALL_WIDTH  # Has to be at least twice the outer wall width of slicer
-"""Distance between two magnets when two boxes are connected."""
-MAGNET_SPACING = 3
-"""Spacing between the two magnets, measured from the edges of the magnets."""
-MAGNET_POGO_CONNECTOR_DISTANCE = 0.5
-"""Distance between the edge of the magnet and the edge of the pogo connector pcb."""
-MAGNET_HOLDER_COVER_PERCENTAGE = 0.1
-"""Percentage of the magnet diameter that should be covered by the magnet holder."""
-MAGNET_HOLDER_COVER_THICKNESS = WALL_THICKNESS
-"""Thickness of the magnet holder cover."""
-
-BOX_FILLET = 5.0
-BOX_BE_A_CUBE = False
-"""When True, the box will be a perfect cube. When False, the size of the box in positive and negative z direction will depend on the components inside."""
-
-MODULE_PILLAR_DIAMETER = 6.4
-"""Diameter of the pillars that hold the module PCB inside the box."""
-
-CLIP_CONNECTOR_THICKNESS = 0.7
-"""Thickness of the clipping connectors on the module pillars."""
-CLIP_CONNECTOR_OFFSET_Z = 0.1
-"""Offset in z direction of the clipping connectors for a better fit."""
-CLIP_CONNECTOR_OFFSET = 1
-"""Offset in xy direction (tune this value until it fits well)"""
-CLIP_CONNECTOR_TOLERANCE = 0.1
-"""Tolerance to apply to the clipping connectors for a better fit."""
-
-USB_C_CONNECTOR_WIDTH = 9
-USB_C_CONNECTOR_HEIGHT = 3.3
-USB_C_CONNECTOR_OFFSET_FROM_PCB = 0.1
-"""Distance from the bottom of the USB-C connecter to the top of the PCB."""
-USB_C_CONNECTOR_FILLET = 1.2
-USB_C_CONNECTOR_DEPTH = 7.5
-USB_C_CONNECTOR_OVERHANG = 1.3
-"""How much the USB-C connector extends beyond the edge of the PCB"""
-
-# ----------- Load PCBs
-shapes_dicts = get_kicad_pcbs_as_shapes_dicts(
-    kicad_pcb_names=KICAD_PCB_NAMES,
-    pcb_part_name=PCB_PART_NAME,
-    full_name=FULL_PCB_NAME,
+import profiling
+from build_graph import BuildGraph
+from cube_layout import CubePlacement, parse_grid
+from pipeline import (
+    CLEARANCES,
+    DEFAULT_LAYOUT,
+    ENCLOSURES,
+    EXPORTS,
+    get_export,
+    get_preview_lods,
+    get_scene,
+    graph,
 )
-module_shapes_dict = shapes_dicts["Module"]
-power_supply_shapes_dict = shapes_dicts["PowerSupply"]
-pogo_connector_shapes_dict = shapes_dicts["PogoConnector"]
-
-cq_pogo_connector = shapes_dict_to_cq_object(pogo_connector_shapes_dict)
-cq_power_supply = shapes_dict_to_cq_object(power_supply_shapes_dict)
-cq_module = shapes_dict_to_cq_object(module_shapes_dict)
-
-cq_module_pcb = module_shapes_dict[PCB_PART_NAME]
-module_pcb_bounds = cq_module_pcb.BoundingBox()
-module_length = module_pcb_bounds.xlen
-box_length = round(module_length + POGO_PIN_LENGTH_COMPRESSED, 2)
-"""Length of a side of the box on the xy plane."""
+from preview import LODS, Lod
 
-cq_power_supply_pcb = power_supply_shapes_dict[PCB_PART_NAME]
-power_supply_pcb_bounds = cq_power_supply_pcb.BoundingBox()
-power_supply_length = power_supply_pcb_bounds.xlen
+output_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "output"))
 
-module_max_z = module_pcb_bounds.zmax
-for shape in module_shapes_dict.values():
-    bounds = shape.BoundingBox()
-    if bounds.zmax > module_max_z:
-        module_max_z = bounds.zmax
-power_supply_max_z = power_supply_pcb_bounds.zmax
-for shape in power_supply_shapes_dict.values():
-    bounds = shape.BoundingBox()
-    if bounds.zmax > power_supply_max_z:
-        power_supply_max_z = bounds.zmax
+SCENE_TARGET = "Scene"
+"""Target exporting the whole scene as Scene.step and Scene.stl."""
+TARGETS = [*EXPORTS, SCENE_TARGET]
+
+
+def get_target_nodes(targets: list[str]) -> list[str]:
+    """
+    Returns the names of the nodes the targets are taken from.
+    """
+    nodes: list[str] = []
+    for target in targets:
+        target_nodes = ENCLOSURES if target == SCENE_TARGET else [EXPORTS[target][0]]
+        nodes.extend(node for node in target_nodes if node not in nodes)
+    return nodes
+
+
+def log_clearances(graph: BuildGraph, enclosures: list[str]):
+    """
+    Logs the PCB components interfering with the enclosures and the smallest
+    clearance of the others, see clearance.check_clearances.
+    """
+    for enclosure in enclosures:
+        clearances = graph.get(CLEARANCES[enclosure])
+        for clearance in clearances:
+            if clearance.interferes:
+                logging.warning(
+                    f"{clearance.component} interferes with {clearance.part}"
+                )
+        closest = next((c for c in clearances if not c.interferes), None)
+        if closest is not None:
+            logging.info(
+                f"Smallest clearance of {enclosure}: {closest.distance:.2f} mm between "
+                f"{closest.component} and {closest.part}"
+            )
 
-# ----------- Pogo Connectors and Magnets
-############# Position Pogo Connectors
-cq_pogo_connectors: list[cq.Workplane] = []
-cq_pogo_pin_holes: list[cq.Workplane] = []
-"""List of holes to later cut out of the box for the pogo pins."""
-cq_pogo_connector_holes: list[cq.Workplane] = []
-"""List of holes to later cut out of the box for the pogo connectors."""
-cq_magnet_holes: list[cq.Workplane] = []
-"""List of holes to later cut out of the box for the magnets."""
-cq_magnets: list[cq.Workplane] = []
-"""List of magnets to be placed inside the box."""
 
-pogo_connector_translation = PCB_TOLERANCE
-def transform_pogo_connector(cq_obj: cq.Workplane) -> cq.Workplane:
-    """Position an object to align with the pogo connector placement on the module PCB."""
-    return (
-        cq_obj
-        .rotate((0, 0, 0), (0, 1, 0), 90)
-        .translate((
-            0.5 * module_length - PCB_THICKNESS,
-            0,
-            pogo_connector_translation,
-        ))
-    )
-cq_pogo_connector_pcb = pogo_connector_shapes_dict[PCB_PART_NAME]
-pogo_pin_positions = [
-    (0, (i-NUMBER_OF_POGO_PINS / 2 + 0.5) * POGO_PIN_SPACING) for i in range(NUMBER_OF_POGO_PINS)
-]
-cq_pogo_pin_hole = (
-    cq.Workplane()
-    .pushPoints(pogo_pin_positions)
-    .eachpoint(
-        cq.Workplane()
-        .circle(0.5 * POGO_PIN_DIAMETER)
-        .extrude(0.5 * POGO_PIN_LENGTH_COMPRESSED - POGO_PIN_CUTOUT_THICKNESS)
-        .faces(">Z")
-        .workplane()
-        .circle(0.5 * POGO_PIN_DIAMETER)
-        .workplane(offset=POGO_PIN_CUTOUT_THICKNESS)
-        .circle(0.5 * (POGO_PIN_DIAMETER + POGO_PIN_CUTOUT_EXTRA_DIAMETER))
-        .loft(ruled=True)
-    )
-    .translate((POGO_PIN_OFFSET, 0, PCB_THICKNESS))
-)
-pogo_connector_bounds = cq_pogo_connector_pcb.BoundingBox()
-cq_pogo_pin_pcb_with_tolerance = (
-    cq.Workplane()
-    .box(
-        pogo_connector_bounds.xlen + 2 * PCB_TOLERANCE,
-        pogo_connector_bounds.ylen + 2 * PCB_TOLERANCE,
-        pogo_connector_bounds.zlen + 2 * PCB_TOLERANCE,
+def show(
+    graph: BuildGraph,
+    preview: bool = False,
+    lods: dict[str, Lod] | None = None,
+    layout: list[CubePlacement] = DEFAULT_LAYOUT,
+):
+    """
+    Shows the scene in the ocp_vscode viewer.
+
+    :param preview: Show the PCBs coarse and all cubes but the first ones as
+    bounding boxes, see pipeline.get_preview_lods.
+    :param lods: Level of detail by instance or part name, overriding the preview.
+    :param layout: The cubes to show, see cube_layout.
+    """
+    # Only imported when needed, so headless builds work without a viewer
+    import ocp_vscode
+
+    scene = get_scene(graph, layout)
+    scene_lods = get_preview_lods(scene, layout) if preview else {}
+    scene_lods.update(lods or {})
+    ocp_vscode.show(scene.to_assembly(lods=scene_lods))
+
+
+def export(
+    graph: BuildGraph,
+    output_folder: str = output_folder,
+    targets: list[str] = TARGETS,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+    max_workers: int | None = None,
+    force: bool = False,
+    layout: list[CubePlacement] = DEFAULT_LAYOUT,
+):
+    """
+    Exports the targets, files whose geometry is unchanged since the last export are
+    not written again, see exporter.export_stls. The scene shows the cubes of the
+    layout.
+    """
+    from exporter import ExportManifest, export_stls, get_file_fingerprint, write_file
+    from scene import export_scene, get_scene_fingerprint
+
+    manifest = ExportManifest(output_folder)
+    export_stls(
+        {
+            f"{target}.stl": get_export(graph, target)
+            for target in targets
+            if target != SCENE_TARGET
+        },
+        output_folder,
+        tolerance,
+        angular_tolerance,
+        max_workers,
+        force,
+        manifest,
     )
-    .translate((0, 0, 0.5 * PCB_THICKNESS))
-)
+    if SCENE_TARGET in targets:
+        # Repeated parts are written once and placed as instances
+        scene = get_scene(graph, layout)
+        scene_fingerprint = get_scene_fingerprint(scene)
+        for file_name in ("Scene.step", "Scene.stl"):
+            fingerprint = get_file_fingerprint(
+                scene_fingerprint, file_name, tolerance, angular_tolerance
+            )
+            if not force and manifest.is_unchanged(file_name, fingerprint):
+                logging.info(f"Skipping unchanged {file_name}")
+                continue
+            write_file(
+                output_folder,
+                file_name,
+                lambda path: export_scene(scene, path, tolerance, angular_tolerance),
+            )
+            manifest.set(file_name, fingerprint)
+            manifest.save()
+
+
+def _parse_layout(text: str) -> list[CubePlacement]:
+    if os.path.isfile(text):
+        with open(text) as f:
+            text = f.read()
+    try:
+        return parse_grid(text)
+    except Exception as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _parse_lod(text: str) -> tuple[str, Lod]:
+    name, separator, lod = text.rpartition("=")
+    if not separator or not name:
+        raise argparse.ArgumentTypeError(f"Expected NAME=LOD, got {text}")
+    if lod not in LODS:
+        raise argparse.ArgumentTypeError(
+            f"Unknown level of detail {lod}, use one of {', '.join(LODS)}"
+        )
+    return name, lod  # type: ignore
 
-magnet_translation_x = 0.5 * pogo_connector_bounds.xlen + MAGNET_POGO_CONNECTOR_DISTANCE + 0.5 * MAGNET_DIAMETER + PCB_TOLERANCE
-magnet_positions = [
-    (magnet_translation_x, 0.5 * (MAGNET_SPACING + MAGNET_DIAMETER)),
-    (magnet_translation_x, -0.5 * (MAGNET_SPACING + MAGNET_DIAMETER)),
-]
-cq_magnet = (
-    cq.Workplane()
-    .pushPoints(magnet_positions)
-    .circle(0.5 * MAGNET_DIAMETER)
-    .extrude(-MAGNET_THICKNESS)
-    .rotate((0, 0, 0), (0, 1, 0), 90)
-    .translate((
-        0.5 * box_length - 0.5 * MAGNET_DISTANCE,
-        0,
-        pogo_connector_translation,
-    ))
-)
-cq_magnet_hole = (
-    cq.Workplane()
-    .pushPoints(magnet_positions)
-    .circle(0.5 * MAGNET_DIAMETER)
-    .extrude(-MAGNET_THICKNESS)
-    .rotate((0, 0, 0), (0, 1, 0), 90)
-    .translate((
-        0.5 * box_length - 0.5 * MAGNET_DISTANCE,
-        0,
-        pogo_connector_translation,
-    ))
-)
 
-cq_pogo_connector_transformed = transform_pogo_connector(cq_pogo_connector)
-cq_pogo_pin_hole_transformed = transform_pogo_connector(cq_pogo_pin_hole)
-cq_pogo_pin_pcb_with_tolerance_transformed = transform_pogo_connector(cq_pogo_pin_pcb_with_tolerance)
-for angle in [90, 0, 270, 180]:  # Top, Right, Bottom, Left
-    cq_pogo_connectors.append(
-        cq_pogo_connector_transformed
-        .rotate((0, 0, 0), (0, 0, 1), angle)
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build and export the 3D models of the SmartCube enclosures."
     )
-    cq_pogo_pin_holes.append(
-        cq_pogo_pin_hole_transformed
-        .rotate((0, 0, 0), (0, 0, 1), angle)
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=TARGETS,
+        default=TARGETS,
+        metavar="TARGET",
+        help=f"Files to export, any of {', '.join(TARGETS)}. Defaults to all.",
     )
-    cq_pogo_connector_holes.append(
-        cq_pogo_pin_pcb_with_tolerance_transformed
-        .rotate((0, 0, 0), (0, 0, 1), angle)
+    parser.add_argument(
+        "--no-view",
+        action="store_true",
+        help="Do not show the result in the ocp_vscode viewer.",
     )
-    cq_magnets.append(
-        cq_magnet
-        .rotate((0, 0, 0), (0, 0, 1), angle)
+    parser.add_argument(
+        "--layout",
+        type=_parse_layout,
+        default=DEFAULT_LAYOUT,
+        metavar="GRID",
+        help="Cubes of the scene as rows of M (module), P (power supply) and . "
+        "(empty), separated by / or new lines, or a file containing them, "
+        'e.g. "MMM/PMM". Power supplies face a neighbouring module. Defaults to '
+        "two modules and a power supply.",
     )
-    cq_magnet_holes.append(
-        cq_magnet_hole
-        .rotate((0, 0, 0), (0, 0, 1), angle)
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="Show the PCBs as coarse meshes and all cubes but the first module and "
+        "power supply as bounding boxes, so the viewer only gets the enclosures in "
+        "full detail.",
     )
-
-pogo_pin_center_z = -POGO_PIN_OFFSET + pogo_connector_translation
-"""Final global z position of the center of the pogo pins."""
-
-# ----------- Box
-box_wall_thickness = WALL_THICKNESS
-box_height = 0.5 * box_length
-"""Height of the box in positive z direction."""
-box_depth = 0.5 * box_length
-"""Depth of the box in negative z direction."""
-if not BOX_BE_A_CUBE:
-    module_max_z = max(module_max_z, power_supply_max_z)
-    box_height = module_max_z + 2 * PCB_TOLERANCE + BOX_FILLET + box_wall_thickness
-    box_depth = magnet_translation_x + 0.5 * MAGNET_DIAMETER + BOX_FILLET + box_wall_thickness
-cq_box_original = (
-    cq.Workplane().box(
-        box_length,
-        box_length,
-        box_height + box_depth,
-        centered=(True, True, False),
+    parser.add_argument(
+        "--lod",
+        type=_parse_lod,
+        action="append",
+        default=[],
+        metavar="NAME=LOD",
+        help=f"Level of detail of an instance or part in the viewer, one of "
+        f"{', '.join(LODS)}, e.g. \"Module=box\". Can be given multiple times.",
     )
-    .translate((0, 0, -box_depth))
-    .edges()
-    .chamfer(BOX_FILLET)
-)
-cq_box = cq_box_original.shell(-box_wall_thickness)
-cq_box_with_tolerance = cq_box_original.shell(-(box_wall_thickness + TOLERANCE))
-
-############# Holders for the magnets
-magnet_center_z = -magnet_translation_x + pogo_connector_translation
-"""Final global z position of the center of the magnets inside the box."""
-magnet_holder_height = box_depth + magnet_center_z + 0.5 * MAGNET_DIAMETER + MAGNET_POGO_CONNECTOR_DISTANCE
-magnet_holder_width = box_length
-magnet_holder_cover_height = box_depth + magnet_center_z - 0.5 * MAGNET_DIAMETER + MAGNET_HOLDER_COVER_PERCENTAGE * MAGNET_DIAMETER
-
-cq_magnet_holder = (
-    cq.Workplane()
-    .box(
-        magnet_holder_width,
-        MAGNET_THICKNESS,
-        magnet_holder_height,
-        centered=(True, True, False),
+    parser.add_argument(
+        "--output-dir",
+        default=output_folder,
+        help="Folder to export to, defaults to the output folder.",
     )
-    .translate((
-        0, 0.5 * box_length - 0.5 * MAGNET_DISTANCE -0.5 * MAGNET_THICKNESS, -box_depth
-    ))
-    .intersect(cq_box_original)
-    .cut(cq_box)
-)
-cq_magnet_holder_cover = (
-    cq.Workplane()
-    .box(
-        magnet_holder_width,
-        MAGNET_HOLDER_COVER_THICKNESS,
-        magnet_holder_cover_height,
-        centered=(True, True, False),
+    parser.add_argument(
+        "--no-parallel",
+        action="store_true",
+        help="Build and export the enclosures one after the other in this process.",
     )
-    .translate((
-        0, 0.5 * box_length - 0.5 * MAGNET_DISTANCE - MAGNET_THICKNESS -0.5 * MAGNET_HOLDER_COVER_THICKNESS, -box_depth
-    ))
-    .intersect(cq_box_original)
-    .cut(cq_box)
-)
-
-for angle in [0, 90, 180, 270]:
-    cq_magnet_holder_rotated = cq_magnet_holder.rotate((0, 0, 0), (0, 0, 1), angle)
-    cq_magnet_holder_cover_rotated = cq_magnet_holder_cover.rotate((0, 0, 0), (0, 0, 1), angle)
-    cq_box = cq_box.union(cq_magnet_holder_rotated)
-    # cq_box = cq_box.union(cq_magnet_holder_cover_rotated) # TODO: cover currently not needed
-
-############# Holders for the pogo connectors
-pogo_connector_holder_height = box_length - magnet_holder_height
-pogo_connector_holder_width = pogo_connector_bounds.ylen + 2 * WALL_THICKNESS
-pogo_connector_holder_thickness = PCB_THICKNESS
-
-cq_pogo_connector_holder = (
-    cq.Workplane()
-    .box(
-        pogo_connector_holder_width,
-        pogo_connector_holder_thickness,
-        pogo_connector_holder_height,
-        centered=(True, False, False),
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Record the time and memory of every stage and CadQuery operation and "
+        "write profile.json, trace.json and profile.folded to this folder. "
+        "Everything is built in this process, as worker processes are not recorded.",
     )
-    .translate((
-        0, 0.5 * box_length - box_wall_thickness - pogo_connector_holder_thickness, -box_depth + magnet_holder_height
-    ))
-    .intersect(cq_box_original)
-    .cut(cq_box)
-)
-
-for angle in [0, 90, 180, 270]:
-    cq_pogo_connector_holder_rotated = cq_pogo_connector_holder.rotate((0, 0, 0), (0, 0, 1), angle)
-    cq_box = cq_box.union(cq_pogo_connector_holder_rotated)
-
-############# USB-C Connector Cutout
-cq_usb_c_connector = (
-    cq.Workplane()
-    .box(
-        USB_C_CONNECTOR_DEPTH,
-        USB_C_CONNECTOR_WIDTH,
-        USB_C_CONNECTOR_HEIGHT,
-        centered=(False, True, False),
-    )
-    .edges("X")
-    .fillet(USB_C_CONNECTOR_FILLET)
-    .translate((
-        -0.5 * module_length - USB_C_CONNECTOR_OVERHANG, 0, PCB_THICKNESS + USB_C_CONNECTOR_OFFSET_FROM_PCB
-    ))
-)
-
-############# ESP-32 Connector Cutout
-esp32_bounds = None
-for name, shape in power_supply_shapes_dict.items():
-    if "ESP32" in name:
-        esp32_bounds = shape.BoundingBox()
-        break
-assert esp32_bounds is not None, "ESP32 shape not found in power supply PCB shapes."
-cq_esp32 = (
-    cq.Workplane()
-    .box(
-        esp32_bounds.xlen + 2 * PCB_TOLERANCE,
-        esp32_bounds.ylen + 2 * PCB_TOLERANCE,
-        esp32_bounds.zlen + 2 * PCB_TOLERANCE,
+    parser.add_argument(
+        "--no-clearance-check",
+        action="store_true",
+        help="Do not check the PCB components for interferences with the enclosures.",
     )
-    .translate(esp32_bounds.center)
-)
-
-def finish_box(cq_box: cq.Workplane, is_power_supply: bool) -> tuple[cq.Workplane, cq.Workplane]:
-    """Finish editing the box, extracted to a function to work for the power supply box as well."""
-
-    ############# Cut Holes
-    if is_power_supply:
-        # Only cut holes on the right side
-        cq_box = cq_box.cut(cq_pogo_pin_holes[1])
-        cq_box = cq_box.cut(cq_pogo_connector_holes[1])
-        cq_box = cq_box.cut(cq_magnet_holes[1])
-        # Cut the USB-C connector hole
-        cq_box = cq_box.cut(cq_usb_c_connector)
-    else:
-        for cq_pogo_pin_hole in cq_pogo_pin_holes:
-            cq_box = cq_box.cut(cq_pogo_pin_hole)
-        for cq_pogo_connector_hole in cq_pogo_connector_holes:
-            cq_box = cq_box.cut(cq_pogo_connector_hole)
-        for cq_magnet_hole in cq_magnet_holes:
-            cq_box = cq_box.cut(cq_magnet_hole)
-
-    ############# Split the box into two halves that can be clipped together
-    def get_cq_split_body_bottom(tolerance: float = 0) -> cq.Workplane:
-        cq_split_body_bottom = (
-            cq.Workplane()
-            .box(box_length, box_length, box_depth + pogo_pin_center_z - 0.25 * POGO_PIN_DIAMETER, centered=(True, True, False))
-            .translate((0, 0, -box_depth))
-            .edges("|Z")
-            .chamfer(BOX_FILLET)
-        )
-        cq_split_body_bottom = (
-            cq.Workplane()
-            .add(
-                cq_split_body_bottom
-                .faces(">Z")
-                .wires()
-                .toPending()
-                .offset2D(-PRINTER_MIN_OUTER_WALL_WIDTH - tolerance, kind="intersection")
-                # Small hack to get the wires (idk why offset2D alone does not work here)
-                .extrude(1)
-                .faces(">Z")
-                .translate((0, 0, -1))
-            )
-            .add(
-                cq_split_body_bottom
-                .translate((0, 0, box_wall_thickness))
-                .faces(">Z")
-                .wires()
-                .toPending()
-                .offset2D(-PRINTER_MIN_OUTER_WALL_WIDTH - tolerance - box_wall_thickness, kind="intersection")
-            )
-            .wires()
-            .toPending()
-            .loft(ruled=True)
-            .add(cq_split_body_bottom)
-        )
-        return cq_split_body_bottom
-    cq_split_body_top = (
-        cq_box_original
-        .cut(get_cq_split_body_bottom(TOLERANCE))
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Linear deflection of the exported meshes, defaults to 0.1.",
     )
-
-    cq_box_top = (
-        cq_box
-        .cut(get_cq_split_body_bottom())
+    parser.add_argument(
+        "--angular-tolerance",
+        type=float,
+        default=0.1,
+        help="Angular deflection of the exported meshes in radians, defaults to 0.1.",
     )
-    cq_box_bottom = (
-        cq_box
-        .cut(cq_split_body_top)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Write all files, even if their geometry is unchanged since the last "
+        "export.",
     )
-
-    cq_box_top_with_tolerance = (
-        cq_box_with_tolerance
-        .cut(get_cq_split_body_bottom(TOLERANCE))
-    )
-
-    ############# Module PCB Slot
-    if is_power_supply:
-        cq_module_pcb_with_tolerance = make_offset_shape(cq.Workplane(cq_power_supply_pcb), cq.Vector(PCB_TOLERANCE, PCB_TOLERANCE, PCB_TOLERANCE))
-    else:
-        cq_module_pcb_with_tolerance = make_offset_shape(cq.Workplane(cq_module_pcb), cq.Vector(PCB_TOLERANCE, PCB_TOLERANCE, PCB_TOLERANCE))
-    cq_box_top = (
-        cq_box_top
-        .cut(
-            cq_module_pcb_with_tolerance
-            .faces(">Z")
-            .wires().toPending()
-            .extrude(-(box_height + box_depth))
+    return parser.parse_args(args)
+
+
+def main(args: list[str] | None = None):
+    arguments = parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    if arguments.profile:
+        profiling.enable()
+
+    target_nodes = get_target_nodes(arguments.targets)
+    if not arguments.no_view:
+        target_nodes += [node for node in ENCLOSURES if node not in target_nodes]
+    if not arguments.no_parallel and not arguments.profile:
+        # The enclosures only share read-only inputs, build them in parallel
+        graph.get_parallel(node for node in ENCLOSURES if node in target_nodes)
+
+    with profiling.stage("build"):
+        for node in target_nodes:
+            graph.get(node)
+    if not arguments.no_clearance_check:
+        with profiling.stage("clearance check"):
+            log_clearances(graph, [node for node in ENCLOSURES if node in target_nodes])
+
+    if not arguments.no_view:
+        with profiling.stage("show"):
+            show(graph, arguments.preview, dict(arguments.lod), arguments.layout)
+    with profiling.stage("export"):
+        export(
+            graph,
+            arguments.output_dir,
+            arguments.targets,
+            arguments.tolerance,
+            arguments.angular_tolerance,
+            1 if arguments.no_parallel or arguments.profile else None,
+            arguments.force,
+            arguments.layout,
         )
-    )
 
-    if is_power_supply:
-        cq_box_top = cq_box_top.cut(
-            cq_esp32
-            .faces(">Z")
-            .wires().toPending()
-            .extrude(-(box_height + box_depth))
+    if arguments.profile:
+        profiling.disable()
+        report = profiling.write_report(arguments.profile)
+        logging.info(
+            f"Wrote profile to {arguments.profile}: {report['wall_seconds']:.1f}s wall, "
+            f"{report['cpu_seconds']:.1f}s CPU, {report['peak_rss_mb']} MB peak memory"
         )
 
-    ############# Module Pillars
-    module_pillar_height = box_depth - box_wall_thickness - PCB_TOLERANCE + PCB_THICKNESS
-    module_pillar_translation = 0.5 * box_length - box_wall_thickness - 0.5 * MODULE_PILLAR_DIAMETER
-    module_pillar_positions = [
-        (module_pillar_translation, module_pillar_translation),
-        (module_pillar_translation, -module_pillar_translation),
-        (-module_pillar_translation, module_pillar_translation),
-        (-module_pillar_translation, -module_pillar_translation),
-    ]
-    cq_module_pillar = (
-        cq.Workplane()
-        .pushPoints(module_pillar_positions)
-        .eachpoint(
-            cq.Workplane()
-            .rect(MODULE_PILLAR_DIAMETER, MODULE_PILLAR_DIAMETER)
-            .extrude(-module_pillar_height)
-            .rotate((0, 0, 0), (0, 0, 1), 45)
-        )
-        .translate((
-            0,
-            0,
-            -PCB_TOLERANCE + PCB_THICKNESS,
-        ))
-        .intersect(cq_box_original)
-        .cut(cq_box)
-        .cut(cq_box_top_with_tolerance)
-        .cut(cq_module_pcb_with_tolerance)
-    )
-    cq_box_bottom = cq_box_bottom.union(cq_module_pillar)
-
-    ############# Clipping on the Module Pillars
-    clip_connector_translation = module_pillar_translation + CLIP_CONNECTOR_OFFSET
-    clip_connector_positions = [
-        (clip_connector_translation, clip_connector_translation),
-        (clip_connector_translation, -clip_connector_translation),
-        (-clip_connector_translation, clip_connector_translation),
-        (-clip_connector_translation, -clip_connector_translation),
-    ]
-    def build_clip_connector(tolerance: float = 0) -> cq.Workplane:
-        return (
-            cq.Workplane()
-            .pushPoints(clip_connector_positions)
-            .eachpoint(
-                build_octahedron(CLIP_CONNECTOR_THICKNESS + tolerance)
-                .rotate((0, 0, 0), (0, 0, 1), 45)
-            )
-            .intersect(cq_box_original)
-        )
-    cq_clip_connector = build_clip_connector().translate((0, 0, CLIP_CONNECTOR_OFFSET_Z))
-    cq_clip_connector_with_tolerance = build_clip_connector(CLIP_CONNECTOR_TOLERANCE)
-    cq_box_top = cq_box_top.union(cq_clip_connector)
-    cq_box_bottom = cq_box_bottom.cut(cq_clip_connector_with_tolerance)
 
-    return cq_box_top, cq_box_bottom
-
-cq_box_top, cq_box_bottom = finish_box(cq_box, is_power_supply=False)
-cq_power_supply_box_top, cq_power_supply_box_bottom = finish_box(cq_box, is_power_supply=True)
-
-# ----------- Show Result
-full_cube: dict[str, cq.Workplane] = {
-    "Module": cq_module,
-    "Pogo Connector Top": cq_pogo_connectors[0],
-    "Pogo Connector Right": cq_pogo_connectors[1],
-    "Pogo Connector Bottom": cq_pogo_connectors[2],
-    "Pogo Connector Left": cq_pogo_connectors[3],
-    "Box Top": cq_box_top,
-    "Box Bottom": cq_box_bottom,
-    **{f"Magnet {i+1}": cq_magnets[i] for i in range(len(cq_magnets))},
-}
-full_power_supply_cube: dict[str, cq.Workplane] = {
-    "Power Supply": cq_power_supply,
-    "Power Supply Pogo Connector Right": cq_pogo_connectors[1],
-    "Power Supply Box Top": cq_power_supply_box_top,
-    "Power Supply Box Bottom": cq_power_supply_box_bottom,
-    "Power Supply Magnet 1": cq_magnets[1],
-}
-for name, cq_object in full_power_supply_cube.items():
-    full_power_supply_cube[name] = cq_object.translate((
-        -box_length, 0, 0
-    ))
-cq_full_cube = cq.Workplane()
-for value in full_cube.values():
-    cq_full_cube = cq_full_cube.add(value)
-
-full_cube_2 = {
-    f"{name}_2]": cq_object.translate((
-        0, box_length, 0
-    ))
-    for name, cq_object in full_cube.items()
-}
-cq_full_cube_2 = cq_full_cube.translate((0, box_length, 0))
-
-cq_power_supply_cube = cq.Workplane()
-for value in full_power_supply_cube.values():
-    cq_power_supply_cube = cq_power_supply_cube.add(value)
-cq_power_supply_cube = cq_power_supply_cube.translate((-box_length, 0, 0))
-
-ocp_vscode.show(
-    *[*full_cube.values(), *full_power_supply_cube.values(), cq_full_cube_2],
-    names=list(full_cube.keys()) + list(full_power_supply_cube.keys()) + ["Full Cube 2"],
-)
-
-# ----------- Save Result
-output_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "output"))
-cq.Assembly(cq_pogo_connectors[0]).export(os.path.join(output_folder, "Pogo_Connector.stl"))
-cq.Assembly(cq_module).export(os.path.join(output_folder, "Module.stl"))
-cq.Assembly(cq_power_supply).export(os.path.join(output_folder, "Power_Supply.stl"))
-cq.Assembly(cq_box_top).export(os.path.join(output_folder, "Box_Top.stl"))
-cq.Assembly(cq_box_bottom).export(os.path.join(output_folder, "Box_Bottom.stl"))
-cq.Assembly(cq_power_supply_box_top).export(os.path.join(output_folder, "Power_Supply_Box_Top.stl"))
-cq.Assembly(cq_power_supply_box_bottom).export(os.path.join(output_folder, "Power_Supply_Box_Bottom.stl"))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import hashlib
+import os
+from typing import BinaryIO
+
+import cadquery as cq
+import numpy as np
+
+from fingerprint import get_shape_fingerprint
+from profiling import profiled
+from shape_cache import ShapeCache
+
+_path_to_script = os.path.dirname(os.path.abspath(__file__))
+_mesh_cache_folder = os.path.abspath(
+    os.path.join(_path_to_script, "..", "models", "mesh_cache")
+)
+
+_STL_TRIANGLE_DTYPE = np.dtype(
+    [
+        ("normal", "<f4", (3,)),
+        ("vertices", "<f4", (3, 3)),
+        ("attribute", "<u2"),
+    ]
+)
+
+Mesh = tuple[np.ndarray, np.ndarray]
+"""Vertices with shape (n, 3) and triangles as vertex indices with shape (m, 3)."""
+
+_meshes = ShapeCache("mesh_cache", max_size=512)
+"""Meshes used recently in this process, the others are read from disk again."""
+
+
+def _get_mesh_key(shape: cq.Shape, tolerance: float, angular_tolerance: float) -> str:
+    key = f"{get_shape_fingerprint(shape)}-{tolerance!r}-{angular_tolerance!r}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@profiled("tessellate")
+def _tessellate(shape: cq.Shape, tolerance: float, angular_tolerance: float) -> Mesh:
+    vertices, triangles = shape.tessellate(tolerance, angular_tolerance)
+    vertex_array = np.array([vertex.toTuple() for vertex in vertices], dtype=np.float64)
+    triangle_array = np.array(triangles, dtype=np.int64)
+    return vertex_array.reshape(-1, 3), triangle_array.reshape(-1, 3)
+
+
+def get_mesh(
+    shape: cq.Shape,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+    use_disk_cache: bool = True,
+) -> Mesh:
+    """
+    Tessellates a shape, reusing the triangulation of a previous run if the geometry
+    and the tolerances are unchanged.
+
+    :param shape: The shape to tessellate.
+    :param tolerance: Linear deflection, relative to the edge lengths like cq.Shape.tessellate.
+    :param angular_tolerance: Angular deflection in radians.
+    :param use_disk_cache: Store and look up the triangulation in the models/mesh_cache folder.
+
+    :return: The vertices and triangles of the mesh.
+    """
+    key = _get_mesh_key(shape, tolerance, angular_tolerance)
+    mesh = _meshes.get(key)
+    if mesh is not None:
+        return mesh
+    mesh_file = os.path.join(_mesh_cache_folder, f"{key}.npz")
+    if use_disk_cache and os.path.exists(mesh_file):
+        try:
+            with np.load(mesh_file) as data:
+                mesh = (data["vertices"], data["triangles"])
+            _meshes.set(key, mesh)
+            return mesh
+        except Exception as e:
+            print(f"Error loading mesh cache file {mesh_file}: {e}")
+    mesh = _tessellate(shape, tolerance, angular_tolerance)
+    if use_disk_cache:
+        os.makedirs(_mesh_cache_folder, exist_ok=True)
+        # Write to a temporary file first, so parallel runs never read a partial file
+        temporary_mesh_file = f"{mesh_file}.{os.getpid()}.tmp"
+        with open(temporary_mesh_file, "wb") as f:
+            np.savez(f, vertices=mesh[0], triangles=mesh[1])
+        os.replace(temporary_mesh_file, mesh_file)
+    _meshes.set(key, mesh)
+    return mesh
+
+
+def get_cq_object_mesh(
+    cq_object: cq.Workplane | cq.Shape,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+    use_disk_cache: bool = True,
+) -> Mesh:
+    """
+    Tessellates all shapes of a cq object into a single mesh, see get_mesh.
+    """
+    shapes = (
+        [cq_object]
+        if isinstance(cq_object, cq.Shape)
+        else [val for val in cq_object.vals() if isinstance(val, cq.Shape)]
+    )
+    all_vertices: list[np.ndarray] = []
+    all_triangles: list[np.ndarray] = []
+    vertex_count = 0
+    for shape in shapes:
+        vertices, triangles = get_mesh(
+            shape, tolerance, angular_tolerance, use_disk_cache
+        )
+        all_vertices.append(vertices)
+        all_triangles.append(triangles + vertex_count)
+        vertex_count += len(vertices)
+    if not all_vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(all_vertices), np.concatenate(all_triangles)
+
+
+def get_stl_records(mesh: Mesh) -> np.ndarray:
+    """
+    Returns the triangles of a mesh as records of a binary STL file.
+    """
+    vertices, triangles = mesh
+    corners = vertices[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    records = np.zeros(len(triangles), dtype=_STL_TRIANGLE_DTYPE)
+    records["normal"] = normals
+    records["vertices"] = corners
+    return records
+
+
+def write_stl_header(f: BinaryIO, triangle_count: int):
+    """
+    Writes the header of a binary STL file, followed by triangle_count records.
+    """
+    f.write(b"SmartCube".ljust(80, b" "))
+    f.write(np.array([triangle_count], dtype="<u4").tobytes())
+
+
+@profiled()
+def write_stl(mesh: Mesh, path: str):
+    """
+    Writes a mesh as binary STL file.
+    """
+    records = get_stl_records(mesh)
+    with open(path, "wb") as f:
+        write_stl_header(f, len(records))
+        f.write(records.tobytes())
+
+
+def export_stl(
+    cq_object: cq.Workplane | cq.Shape,
+    path: str,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+):
+    """
+    Exports a cq object as binary STL file, only tessellating shapes that are not
+    found in the mesh cache.
+    """
+    write_stl(get_cq_object_mesh(cq_object, tolerance, angular_tolerance), path)
@@ -4,14 +4,28 @@ from OCP.TopoDS import TopoDS, TopoDS_Shape, TopoDS_Wire, TopoDS_Edge
 from OCP.TopExp import TopExp_Explorer
 from OCP.TopAbs import TopAbs_EDGE, TopAbs_WIRE
 from OCP.BRepAdaptor import BRepAdaptor_Curve
-from OCP.GeomAbs import GeomAbs_Circle
+from OCP.GeomAbs import GeomAbs_Circle, GeomAbs_Line
 from OCP.BRepBuilderAPI import BRepBuilderAPI_MakeFace
 from OCP.BRepGProp import BRepGProp
 from OCP.GProp import GProp_GProps
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+
+import heapq
+import math
+import numpy as np
 
-from functools import cache
 import logging
 
+from kicad_pcb import (
+    OutlineSegment,
+    get_board_outline,
+    get_board_thickness,
+    load_kicad_pcb,
+)
+from profiling import profiled
+from shape_cache import geometry_cache
+
 
 @dataclass
 class WireData:
@@ -19,7 +33,17 @@ class WireData:
     opc_edges: list[TopoDS_Edge]
     isCircle: bool
     diameter: float
-    enclosed_area: float = 0
+    area_upper_bound: float = math.inf
+    """Cheap upper bound of the enclosed area, derived from the bounding box."""
+    enclosed_area: float | None = None
+    """Computed on demand, see get_enclosed_area."""
+    center: tuple[float, float, float] | None = None
+    """Center of the circle for circle wires."""
+
+    def get_enclosed_area(self) -> float:
+        if self.enclosed_area is None:
+            self.enclosed_area = get_area_of_wire(self.ocp_wire)
+        return self.enclosed_area
 
 
 def get_area_of_wire(wire: TopoDS_Wire):
@@ -30,7 +54,45 @@ def get_area_of_wire(wire: TopoDS_Wire):
     return gprop.Mass()
 
 
-@cache
+def get_area_upper_bound_of_wire(wire: TopoDS_Wire) -> float:
+    """
+    Returns an upper bound of the area enclosed by a planar wire, without building a face.\n
+    The areas of the projections onto the xy, yz and xz planes are bounded by the
+    bounding box, and the area of a planar wire is the norm of its projected areas.
+    """
+    box = Bnd_Box()
+    BRepBndLib.Add_s(wire, box, False)
+    xmin, ymin, zmin, xmax, ymax, zmax = box.Get()
+    dx, dy, dz = xmax - xmin, ymax - ymin, zmax - zmin
+    return math.hypot(dx * dy, dy * dz, dx * dz)
+
+
+def get_largest_wires(wire_data_list: list[WireData], count: int) -> list[WireData]:
+    """
+    Returns the wires that enclose the most area, largest first.\n
+    Wires are visited by their area upper bound, the exact area is only computed until
+    no remaining wire can enclose more area than the smallest of the current top wires.
+    """
+    candidates = sorted(
+        wire_data_list, key=lambda wire: wire.area_upper_bound, reverse=True
+    )
+    largest: list[tuple[float, int, WireData]] = []
+    computed_count = 0
+    for wire in candidates:
+        if len(largest) == count and wire.area_upper_bound <= largest[0][0]:
+            break
+        entry = (wire.get_enclosed_area(), computed_count, wire)
+        computed_count += 1
+        if len(largest) < count:
+            heapq.heappush(largest, entry)
+        else:
+            heapq.heappushpop(largest, entry)
+    logging.info(f"Computed the area of {computed_count} of {len(candidates)} wires")
+    return [wire for _, _, wire in sorted(largest, reverse=True)]
+
+
+@profiled()
+@geometry_cache(max_size=8)
 def get_wire_data_list(
     pcb_cq_object: cq.Workplane,
 ) -> list[WireData]:
@@ -44,6 +106,7 @@ def get_wire_data_list(
         ocp_edges: list[TopoDS_Edge] = []
         diameter = -1
         isCircle = False
+        center = None
         while edgeExplorer.More():
             shape: TopoDS_Shape = edgeExplorer.Current()
             edge: TopoDS_Edge = cq.Edge(shape).wrapped
@@ -52,32 +115,279 @@ def get_wire_data_list(
             curveAdaptor = BRepAdaptor_Curve(edge)
             isCircle = curveAdaptor.GetType() == GeomAbs_Circle
             if isCircle:
-                diameter = curveAdaptor.Circle().Radius() * 2
-        enclosed_area = get_area_of_wire(ocp_wire)
+                circle = curveAdaptor.Circle()
+                diameter = circle.Radius() * 2
+                center = circle.Location().Coord()
+        area_upper_bound = get_area_upper_bound_of_wire(ocp_wire)
         isCircleWire = False
         if len(ocp_edges) == 1 and isCircle:
             isCircleWire = True
         wire_data_list.append(
-            WireData(ocp_wire, ocp_edges, isCircleWire, diameter, enclosed_area)
+            WireData(
+                ocp_wire,
+                ocp_edges,
+                isCircleWire,
+                diameter,
+                area_upper_bound,
+                center=center if isCircleWire else None,
+            )
         )
         explorer.Next()
     return wire_data_list
 
 
-def make_offset_shape(
-    pcb_cq_object: cq.Workplane,
-    board_tolerance: cq.Vector,
-):
-    logging.info("Making offset shape")
-    if board_tolerance.x != board_tolerance.y:
-        raise Exception("Different tolerances for x and y are not supported")
+HOLE_LAYER_NAMES = ("through", "top", "bottom", "inner")
+"""Names of the layer codes in HoleTable.layers."""
+
+
+class HoleTable:
+    """
+    Compact, array-backed table of the circular holes and slots of a PCB, with a grid
+    based spatial index for nearest neighbour and region queries in the xy plane.
+    """
+
+    def __init__(
+        self,
+        centers: np.ndarray,
+        diameters: np.ndarray,
+        lengths: np.ndarray,
+        angles: np.ndarray,
+        depths: np.ndarray,
+        layers: np.ndarray,
+    ):
+        """
+        :param centers: (n, 3) centers of the holes, z is the middle of the hole.
+        :param diameters: (n,) hole diameters, the width for slots.
+        :param lengths: (n,) overall slot lengths, equal to the diameter for round holes.
+        :param angles: (n,) slot directions in degrees from the x axis, 0 for round holes.
+        :param depths: (n,) hole depths in z direction.
+        :param layers: (n,) layer codes, see HOLE_LAYER_NAMES.
+        """
+        self.centers = centers
+        self.diameters = diameters
+        self.lengths = lengths
+        self.angles = angles
+        self.depths = depths
+        self.layers = layers
+        self._build_index()
+
+    def _build_index(self):
+        count = len(self.centers)
+        if count == 0:
+            self._cell_size = 1.0
+            self._origin = np.zeros(2)
+            self._cells: dict[tuple[int, int], np.ndarray] = {}
+            self._cell_span = 0
+            return
+        xy = self.centers[:, :2]
+        self._origin = xy.min(axis=0)
+        extent = np.maximum(xy.max(axis=0) - self._origin, 1e-9)
+        # Roughly one hole per cell on average
+        self._cell_size = float(max(math.sqrt(extent[0] * extent[1] / count), 1e-3))
+        keys = np.floor((xy - self._origin) / self._cell_size).astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.any(np.diff(sorted_keys, axis=0), axis=1)) + 1
+        self._cells = {
+            (int(indices_key[0]), int(indices_key[1])): indices
+            for indices, indices_key in zip(
+                np.split(order, boundaries), sorted_keys[np.r_[0, boundaries]]
+            )
+        }
+        self._cell_span = int(keys.max()) + 1
+
+    def __len__(self) -> int:
+        return len(self.centers)
+
+    def _get_cell(self, x: float, y: float) -> tuple[int, int]:
+        i, j = np.floor((np.array((x, y)) - self._origin) / self._cell_size)
+        return int(i), int(j)
+
+    def _get_ring(self, cell: tuple[int, int], ring: int) -> list[np.ndarray]:
+        ci, cj = cell
+        found: list[np.ndarray] = []
+        for i in range(ci - ring, ci + ring + 1):
+            for j in range(cj - ring, cj + ring + 1):
+                if max(abs(i - ci), abs(j - cj)) == ring and (i, j) in self._cells:
+                    found.append(self._cells[(i, j)])
+        return found
 
+    def nearest(self, x: float, y: float, count: int = 1) -> np.ndarray:
+        """
+        Returns the indices of the holes nearest to a point in the xy plane, nearest first.
+        """
+        count = min(count, len(self))
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+        cell = self._get_cell(x, y)
+        max_ring = self._cell_span + max(abs(cell[0]), abs(cell[1]))
+        candidates: list[np.ndarray] = []
+        for ring in range(max_ring + 1):
+            candidates.extend(self._get_ring(cell, ring))
+            if not candidates:
+                continue
+            indices = np.concatenate(candidates)
+            if len(indices) < count:
+                continue
+            distances = np.hypot(
+                self.centers[indices, 0] - x, self.centers[indices, 1] - y
+            )
+            # Holes outside the searched rings are at least ring cells away
+            if np.partition(distances, count - 1)[count - 1] <= ring * self._cell_size:
+                break
+        indices = np.concatenate(candidates)
+        distances = np.hypot(self.centers[indices, 0] - x, self.centers[indices, 1] - y)
+        return indices[np.argsort(distances, kind="stable")[:count]]
+
+    def in_region(
+        self, xmin: float, ymin: float, xmax: float, ymax: float
+    ) -> np.ndarray:
+        """
+        Returns the indices of the holes with their center inside the rectangle.
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        imin, jmin = self._get_cell(xmin, ymin)
+        imax, jmax = self._get_cell(xmax, ymax)
+        candidates = [
+            indices
+            for (i, j), indices in self._cells.items()
+            if imin <= i <= imax and jmin <= j <= jmax
+        ]
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        indices = np.sort(np.concatenate(candidates))
+        xy = self.centers[indices, :2]
+        inside = (
+            (xy[:, 0] >= xmin)
+            & (xy[:, 0] <= xmax)
+            & (xy[:, 1] >= ymin)
+            & (xy[:, 1] <= ymax)
+        )
+        return indices[inside]
+
+    def within(self, x: float, y: float, radius: float) -> np.ndarray:
+        """
+        Returns the indices of the holes with their center within radius of a point.
+        """
+        indices = self.in_region(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self.centers[indices, 0] - x, self.centers[indices, 1] - y)
+        return indices[distances <= radius]
+
+    def layer_names(self, indices: np.ndarray | None = None) -> list[str]:
+        layers = self.layers if indices is None else self.layers[indices]
+        return [HOLE_LAYER_NAMES[layer] for layer in layers]
+
+
+def _get_slot(wire: WireData) -> tuple[float, float, float, float, float, float] | None:
+    """
+    Returns x, y, z, width, length and angle if the wire is a horizontal oval slot made
+    of two half circles and two lines, otherwise None.
+    """
+    if len(wire.opc_edges) != 4:
+        return None
+    arc_centers: list[tuple[float, float, float]] = []
+    radii: list[float] = []
+    for edge in wire.opc_edges:
+        curve = BRepAdaptor_Curve(edge)
+        if curve.GetType() == GeomAbs_Circle:
+            circle = curve.Circle()
+            if abs(abs(circle.Axis().Direction().Z()) - 1) > 1e-6:
+                return None
+            arc_centers.append(circle.Location().Coord())
+            radii.append(circle.Radius())
+        elif curve.GetType() != GeomAbs_Line:
+            return None
+    if len(arc_centers) != 2 or abs(radii[0] - radii[1]) > 1e-6:
+        return None
+    (x0, y0, z0), (x1, y1, z1) = arc_centers
+    if abs(z0 - z1) > 1e-6:
+        return None
+    distance = math.hypot(x1 - x0, y1 - y0)
+    angle = math.degrees(math.atan2(y1 - y0, x1 - x0)) % 180
+    width = 2 * radii[0]
+    return (x0 + x1) / 2, (y0 + y1) / 2, z0, width, distance + width, angle
+
+
+@profiled()
+@geometry_cache(max_size=8, persist=True)
+def get_hole_table(pcb_cq_object: cq.Workplane, tolerance: float = 1e-3) -> HoleTable:
+    """
+    Extracts all circular holes and oval slots of the PCB solid.\n
+    Every hole shows up as one circle (or slot outline) per face it goes through, those
+    are grouped by position and size to get the depth of the hole.
+
+    :param pcb_cq_object: The PCB solid.
+    :param tolerance: Distance below which circles are considered to belong to the same hole.
+
+    :return: The hole table, see HoleTable.
+    """
+    logging.info("Extracting holes")
+    bounds = pcb_cq_object.val().BoundingBox()
+    groups: dict[tuple[int, ...], list[tuple[float, ...]]] = {}
+    for wire in get_wire_data_list(pcb_cq_object):
+        if wire.isCircle and wire.center is not None:
+            x, y, z = wire.center
+            feature = (x, y, z, wire.diameter, wire.diameter, 0.0)
+        else:
+            feature = _get_slot(wire)
+            if feature is None:
+                continue
+        x, y, z, width, length, angle = feature
+        key = tuple(round(value / tolerance) for value in (x, y, width, length, angle))
+        groups.setdefault(key, []).append(feature)
+
+    rows: list[tuple[float, ...]] = []
+    for features in groups.values():
+        z_values = [feature[2] for feature in features]
+        z_min, z_max = min(z_values), max(z_values)
+        reaches_bottom = abs(z_min - bounds.zmin) <= tolerance
+        reaches_top = abs(z_max - bounds.zmax) <= tolerance
+        if reaches_bottom and reaches_top:
+            layer = 0
+        elif reaches_top:
+            layer = 1
+        elif reaches_bottom:
+            layer = 2
+        else:
+            layer = 3
+        x, y, _, width, length, angle = features[0]
+        z_center = (z_min + z_max) / 2
+        depth = z_max - z_min
+        rows.append((x, y, z_center, width, length, angle, depth, layer))
+    table = np.array(rows, dtype=np.float64).reshape(-1, 8)
+    return HoleTable(
+        centers=table[:, 0:3].copy(),
+        diameters=table[:, 3].copy(),
+        lengths=table[:, 4].copy(),
+        angles=table[:, 5].copy(),
+        depths=table[:, 6].copy(),
+        layers=table[:, 7].astype(np.int8),
+    )
+
+
+OffsetTolerance = cq.Vector | tuple[float, float] | tuple[float, float, float]
+"""Tolerance as (x, y, z) or as (xy, z)."""
+
+
+def _to_tolerance_vector(tolerance: OffsetTolerance) -> cq.Vector:
+    if isinstance(tolerance, cq.Vector):
+        return tolerance
+    if len(tolerance) == 2:
+        return cq.Vector(tolerance[0], tolerance[0], tolerance[1])
+    return cq.Vector(*tolerance)
+
+
+@geometry_cache(max_size=8)
+def _get_outline_face(pcb_cq_object: cq.Workplane) -> tuple[cq.Face, float]:
+    """
+    Returns the bottom outline face of the PCB and the PCB thickness.
+    """
     wire_data_list = get_wire_data_list(pcb_cq_object)
 
     # find the wires that enclose the most area
     logging.info("Sorting wires")
-    wire_data_list.sort(key=lambda wire: wire.enclosed_area, reverse=True)
-    outline_wires = wire_data_list[:2]
+    outline_wires = get_largest_wires(wire_data_list, 2)
 
     logging.info("Sorting outline_wires by center z position")
     outline_wires.sort(key=lambda wire: cq.Wire(wire.ocp_wire).Center().z)
@@ -89,13 +399,249 @@ def make_offset_shape(
         outline_faces.append(outline_face)
     logging.info("Getting pcb thickness")
     pcb_thickness = outline_faces[1].Center().z - outline_faces[0].Center().z
+    return outline_faces[0], pcb_thickness
+
+
+@profiled()
+@geometry_cache(max_size=32, persist=True)
+def make_offset_shapes(
+    pcb_cq_object: cq.Workplane,
+    board_tolerances: list[OffsetTolerance],
+) -> list[cq.Workplane]:
+    """
+    Makes one offset body of the PCB outline for every tolerance, extracting the
+    outline only once.
+
+    :param pcb_cq_object: The PCB solid.
+    :param board_tolerances: Tolerances as (x, y, z) or (xy, z). x and y may differ
+    for outlines made of lines and arcs, see _offset_outline_wire.
+
+    :return: The offset bodies, in the order of the tolerances.
+    """
+    logging.info("Making offset shapes")
+    outline_face, pcb_thickness = _get_outline_face(pcb_cq_object)
+    return [
+        _extrude_offset_outline(
+            outline_face, pcb_thickness, _to_tolerance_vector(board_tolerance)
+        )
+        for board_tolerance in board_tolerances
+    ]
+
+
+def make_offset_shape(
+    pcb_cq_object: cq.Workplane,
+    board_tolerance: OffsetTolerance,
+):
+    logging.info("Making offset shape")
+    return make_offset_shapes(pcb_cq_object, [board_tolerance])[0]
+
+
+def _split_into_monotone_edges(edge: cq.Edge) -> list[cq.Edge]:
+    """
+    Splits arcs at their leftmost, rightmost, lowest and highest points, so every
+    returned edge is monotone in x and in y. Lines are returned as they are.
+    """
+    if edge.geomType() == "LINE":
+        return [edge]
+    if edge.geomType() != "CIRCLE":
+        raise Exception(
+            "Different tolerances for x and y are only supported for outlines made of "
+            f"lines and arcs, found an edge of type {edge.geomType()}"
+        )
+    center = edge.arcCenter()
+    radius = edge.radius()
+
+    def angle_of(point: cq.Vector) -> float:
+        return math.atan2(point.y - center.y, point.x - center.x)
+
+    start_angle = angle_of(edge.startPoint())
+    to_middle = (angle_of(edge.positionAt(0.5)) - start_angle) % math.tau
+    to_end = (angle_of(edge.endPoint()) - start_angle) % math.tau or math.tau
+    # Counterclockwise if the middle comes before the end, seen from the start
+    sweep = to_end if to_middle < to_end else to_end - math.tau
+    low, high = sorted((start_angle, start_angle + sweep))
+    quarter = math.pi / 2
+    # Splits closer than 1e-4 mm to the ends would only leave slivers
+    angle_tolerance = 1e-4 / radius
+    splits = [
+        i * quarter
+        for i in range(math.floor(low / quarter), math.ceil(high / quarter) + 1)
+        if low + angle_tolerance < i * quarter < high - angle_tolerance
+    ]
+    if not splits:
+        return [edge]
+    angles = [start_angle, *(splits if sweep > 0 else reversed(splits))]
+    angles.append(start_angle + sweep)
+
+    def point_at(angle: float) -> cq.Vector:
+        return center + cq.Vector(math.cos(angle), math.sin(angle), 0) * radius
+
+    # The ends of the edge are kept exactly, so the pieces connect to its neighbours
+    points = [edge.startPoint(), *map(point_at, angles[1:-1]), edge.endPoint()]
+    return [
+        cq.Edge.makeThreePointArc(start, point_at((a0 + a1) / 2), end)
+        for start, end, a0, a1 in zip(points, points[1:], angles, angles[1:])
+    ]
+
+
+def _sweep_edge(edge: cq.Edge, distance: cq.Vector) -> cq.Face | None:
+    """
+    Returns the face covered by an edge moving from -distance to +distance, None if
+    the edge is parallel to the movement and covers no area.\n
+    The edge needs to be monotone perpendicular to the movement, see
+    _split_into_monotone_edges, so the face is bounded by the two moved edges and two
+    straight lines.
+    """
+    start, end = edge.startPoint(), edge.endPoint()
+    cross = (end - start).cross(distance).z
+    if abs(cross) < 1e-9 * distance.Length:
+        return None
+    if cross < 0:
+        # The face is the same for both signs, this one makes it counterclockwise so
+        # that it faces +z like the outline face
+        distance = -distance
+    wire = cq.Wire.assembleEdges(
+        [
+            edge.translate(-distance),
+            cq.Edge.makeLine(end - distance, end + distance),
+            edge.translate(distance),
+            cq.Edge.makeLine(start + distance, start - distance),
+        ]
+    )
+    return cq.Face.makeFromWires(wire)
+
+
+def _grow_face(face: cq.Face, distance: cq.Vector) -> cq.Face:
+    """
+    Returns all points within distance of the face along one axis, the face moved
+    from -distance to +distance.\n
+    A point is covered if it lies in the face or if its movement crosses an edge, so
+    the result is the face fused with the areas swept by its edges.
+    """
+    if distance.Length == 0:
+        return face
+    swept = [
+        swept_face
+        for edge in face.Edges()
+        for monotone_edge in _split_into_monotone_edges(edge)
+        if (swept_face := _sweep_edge(monotone_edge, distance)) is not None
+    ]
+    if not swept:
+        return face
+    faces = face.fuse(*swept).clean().Faces()
+    if len(faces) != 1:
+        raise Exception(f"Growing the outline resulted in {len(faces)} faces")
+    return faces[0]
+
+
+def _offset_outline_wire(outline_wire: cq.Wire, x: float, y: float) -> list[cq.Wire]:
+    """
+    Offsets a wire in the xy plane by x in x direction and by y in y direction.\n
+    Equal tolerances use offset2D. Otherwise the enclosed area grows by the rectangle
+    [-x, x] x [-y, y], so the board can move by x along x and by y along y:
+    edges along x move by y and edges along y by x, a line with the normal (nx, ny)
+    by |nx| * x + |ny| * y and every arc quarter by the corner of the rectangle its
+    normals point to. Corners are sharp like with kind="intersection".
+    Only lines and arcs are supported.
+    """
+    if x == y:
+        return outline_wire.offset2D(x, kind="intersection")
+    if x < 0 or y < 0:
+        raise Exception("Different tolerances for x and y need to be positive")
+    face = cq.Face.makeFromWires(outline_wire)
+    if face.normalAt().z < 0:
+        # Clockwise outline, the swept faces are counterclockwise, see _sweep_edge
+        face = cq.Face(face.wrapped.Reversed())
+    face = _grow_face(_grow_face(face, cq.Vector(x, 0, 0)), cq.Vector(0, y, 0))
+    return [face.outerWire()]
+
+
+def _extrude_offset_outline(
+    outline_face: cq.Face,
+    pcb_thickness: float,
+    board_tolerance: cq.Vector,
+) -> cq.Workplane:
     logging.info("Offsetting and extruding outline faces")
-    outline_worplane = cq.Workplane(outline_faces[0]).tag("a")
+    offset_wires = _offset_outline_wire(
+        outline_face.outerWire(), board_tolerance.x, board_tolerance.y
+    )
     outline_extrusion = (
-        outline_worplane.wires()
+        cq.Workplane()
+        .add(offset_wires)
         .toPending()
-        .offset2D(board_tolerance.x, kind="intersection")
         .extrude(pcb_thickness + 2 * board_tolerance.z)
         .translate((0, 0, -board_tolerance.z))
     )
     return outline_extrusion
+
+
+def _outline_segment_to_edges(segment: OutlineSegment) -> list[cq.Edge]:
+    points = [cq.Vector(x, y, 0) for x, y in segment.points]
+    if segment.kind == "line":
+        return [cq.Edge.makeLine(points[0], points[1])]
+    if segment.kind == "arc":
+        return [cq.Edge.makeThreePointArc(*points)]
+    if segment.kind == "circle":
+        return [cq.Edge.makeCircle((points[1] - points[0]).Length, points[0])]
+    if segment.kind == "curve":
+        return [cq.Edge.makeBezier(points)]
+    if segment.kind == "rect":
+        (x0, y0), (x1, y1) = segment.points
+        corners = ((x0, y0), (x1, y0), (x1, y1), (x0, y1))
+        points = [cq.Vector(x, y, 0) for x, y in corners]
+    if segment.kind in ("rect", "poly"):
+        return [
+            cq.Edge.makeLine(start, end)
+            for start, end in zip(points, points[1:] + points[:1])
+            if (end - start).Length > 0
+        ]
+    raise Exception(f"Unsupported Edge.Cuts graphic: {segment.kind}")
+
+
+def _get_kicad_pcb_outline_face(kicad_pcb_file: str) -> tuple[cq.Face, float]:
+    kicad_pcb = load_kicad_pcb(kicad_pcb_file)
+    edges: list[cq.Edge] = []
+    for segment in get_board_outline(kicad_pcb):
+        edges.extend(_outline_segment_to_edges(segment))
+    if not edges:
+        raise Exception(f"No Edge.Cuts outline found in {kicad_pcb_file}")
+
+    logging.info("Assembling outline wires")
+    outline_wires = cq.Wire.combine(edges, tol=1e-4)
+    # The outer outline encloses all cutouts, so it has the largest bounding box
+    outline_wire = max(
+        outline_wires,
+        key=lambda wire: wire.BoundingBox().xlen * wire.BoundingBox().ylen,
+    )
+    if not outline_wire.IsClosed():
+        raise Exception(f"The Edge.Cuts outline in {kicad_pcb_file} is not closed")
+    return cq.Face.makeFromWires(outline_wire), get_board_thickness(kicad_pcb)
+
+
+@profiled()
+def make_offset_shapes_from_kicad_pcb(
+    kicad_pcb_file: str,
+    board_tolerances: list[OffsetTolerance],
+) -> list[cq.Workplane]:
+    """
+    Same as make_offset_shapes, but reads the outline from the Edge.Cuts graphics and
+    the thickness from the stack-up of the .kicad_pcb file, without a STEP export.
+    """
+    logging.info("Making offset shapes from KiCad PCB")
+    outline_face, pcb_thickness = _get_kicad_pcb_outline_face(kicad_pcb_file)
+    return [
+        _extrude_offset_outline(
+            outline_face, pcb_thickness, _to_tolerance_vector(board_tolerance)
+        )
+        for board_tolerance in board_tolerances
+    ]
+
+
+def make_offset_shape_from_kicad_pcb(
+    kicad_pcb_file: str,
+    board_tolerance: OffsetTolerance,
+):
+    """
+    Same as make_offset_shape, but reads the outline from the .kicad_pcb file.
+    """
+    return make_offset_shapes_from_kicad_pcb(kicad_pcb_file, [board_tolerance])[0]
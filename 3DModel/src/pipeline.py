@@ -0,0 +1,900 @@
+from collections.abc import Callable
+from typing import Any
+
+import cadquery as cq
+from booleans import cut_all, union_all
+from clearance import Clearance, check_clearances
+from cube_layout import MODULE, POWER_SUPPLY, CubePlacement, validate_layout
+from build_graph import BuildGraph, NodeParameters
+from loader import (
+    get_kicad_pcb_cache_key,
+    get_kicad_pcb_file,
+    get_kicad_pcbs_as_shapes_dicts,
+    shapes_dict_to_cq_object,
+)
+from pcb import make_offset_shape, make_offset_shape_from_kicad_pcb
+from profiling import is_enabled as is_profiling
+from preview import Lod
+from scene import Scene
+
+
+def build_octahedron(
+    size: float, cq_object: cq.Workplane = cq.Workplane("XY")
+) -> cq.Workplane:
+    v = [
+        (size, 0, 0),
+        (-size, 0, 0),
+        (0, size, 0),
+        (0, -size, 0),
+        (0, 0, size),
+        (0, 0, -size),
+    ]
+    faces = [
+        [0, 2, 4],
+        [2, 1, 4],
+        [1, 3, 4],
+        [3, 0, 4],
+        [0, 5, 2],
+        [2, 5, 1],
+        [1, 5, 3],
+        [3, 5, 0],
+    ]
+    cq_faces: list[cq.Face] = []
+    for f in faces:
+        polygon = cq.Wire.makePolygon([v[f[0]], v[f[1]], v[f[2]], v[f[0]]])
+        tri = cq.Face.makeFromWires(polygon)
+        cq_faces.append(tri)
+    cq_shell = cq.Shell.makeShell(cq_faces)
+    cq_solid = cq.Solid.makeSolid(cq_shell)
+    return cq_object.add(cq_solid)
+
+
+# fmt: off
+# ----------- Constants
+KICAD_PCB_NAMES = [
+    "Module",
+    "PowerSupply",
+    "PogoConnector",
+]
+
+PRINTER_MIN_OUTER_WALL_WIDTH = 0.42
+
+PCB_PART_NAME = "PCB"
+FULL_PCB_NAME = "FullBoard"
+PCB_THICKNESS = 1.6
+PCB_OUTLINE_FROM_KICAD_PCB = True
+"""When True, the PCB slots are built from the Edge.Cuts outline of the .kicad_pcb files instead of the STEP export."""
+BOOLEAN_FUZZY_VALUE = 0.0
+"""Fuzzy value of the batched boolean operations, 0 uses the OCCT default. Increase slightly if cuts with coplanar faces fail."""
+
+WALL_THICKNESS = 1
+"""Typical wall thickness for 3D printed parts."""
+PCB_TOLERANCE = 0.1
+"""Tolerance to apply in all directions around the PCB to ensure it fits into the box."""
+TOLERANCE = 0.15
+"""Tolerance to apply in all directions when combining two 3d printed parts."""
+
+POGO_PIN_OFFSET = 2.3
+"""Distance from the center of the pogo connecter to the center of the pogo pins."""
+
+POGO_PIN_DIAMETER = 2.0
+POGO_PIN_LENGTH = 3.0
+"""Length of the pogo pin, when not compressed."""
+POGO_PIN_MAX_COMPRESSION = 1.0
+"""Maximum compression length for pogo pins, meaning how far the pin can be pushed in."""
+POGO_PIN_TARGET_COMPRESSION_PERCENTAGE = 0.6
+"""Target compression percentage for pogo pins. 60% compression is recommended."""
+POGO_PIN_SPACING = 3
+"""Spacing between pogo pins."""
+NUMBER_OF_POGO_PINS = 6
+
+POGO_PIN_CUTOUT_EXTRA_DIAMETER = 1
+"""Diameter to add to the pogo pin diameter for a cutout to prevent filament from making the surface uneven."""
+
+MAGNET_DIAMETER = 10.0 - 0.1  # Slightly smaller for a tighter fit
+MAGNET_THICKNESS = 2.7
+MAGNET_SPACING = 3
+"""Spacing between the two magnets, measured from the edges of the magnets."""
+MAGNET_POGO_CONNECTOR_DISTANCE = 0.5
+"""Distance between the edge of the magnet and the edge of the pogo connector pcb."""
+MAGNET_HOLDER_COVER_PERCENTAGE = 0.1
+"""Percentage of the magnet diameter that should be covered by the magnet holder."""
+
+BOX_FILLET = 5.0
+BOX_BE_A_CUBE = False
+"""When True, the box will be a perfect cube. When False, the size of the box in positive and negative z direction will depend on the components inside."""
+
+MODULE_PILLAR_DIAMETER = 6.4
+"""Diameter of the pillars that hold the module PCB inside the box."""
+
+CLIP_CONNECTOR_THICKNESS = 0.7
+"""Thickness of the clipping connectors on the module pillars."""
+CLIP_CONNECTOR_OFFSET_Z = 0.1
+"""Offset in z direction of the clipping connectors for a better fit."""
+CLIP_CONNECTOR_OFFSET = 1
+"""Offset in xy direction (tune this value until it fits well)"""
+CLIP_CONNECTOR_TOLERANCE = 0.1
+"""Tolerance to apply to the clipping connectors for a better fit."""
+
+USB_C_CONNECTOR_WIDTH = 9
+USB_C_CONNECTOR_HEIGHT = 3.3
+USB_C_CONNECTOR_OFFSET_FROM_PCB = 0.1
+"""Distance from the bottom of the USB-C connecter to the top of the PCB."""
+USB_C_CONNECTOR_FILLET = 1.2
+USB_C_CONNECTOR_DEPTH = 7.5
+USB_C_CONNECTOR_OVERHANG = 1.3
+"""How much the USB-C connector extends beyond the edge of the PCB"""
+
+CLEARANCE_MAX_DISTANCE = 2.0
+"""Components farther than this from the enclosure are left out of the clearance check."""
+
+PARAMETERS: dict[str, Any] = {name: value for name, value in dict(globals()).items() if name.isupper()}
+"""All constants above, by name."""
+
+DERIVED_PARAMETERS: dict[str, Callable[[dict[str, Any]], Any]] = {
+    # Length of the pogo pin when compressed to the target percentage.
+    "POGO_PIN_LENGTH_COMPRESSED": lambda p: p["POGO_PIN_LENGTH"] - (p["POGO_PIN_TARGET_COMPRESSION_PERCENTAGE"] * p["POGO_PIN_MAX_COMPRESSION"]),
+    # Thickness of the cutout for the pogo pins.
+    "POGO_PIN_CUTOUT_THICKNESS": lambda p: p["PRINTER_MIN_OUTER_WALL_WIDTH"],
+    # Distance between two magnets when two boxes are connected. Has to be at least twice the outer wall width of slicer.
+    "MAGNET_DISTANCE": lambda p: 4 * p["PRINTER_MIN_OUTER_WALL_WIDTH"],
+    # Thickness of the magnet holder cover.
+    "MAGNET_HOLDER_COVER_THICKNESS": lambda p: p["WALL_THICKNESS"],
+}
+"""Constants computed from the constants above, recomputed when those are overridden."""
+
+graph = BuildGraph(PARAMETERS, DERIVED_PARAMETERS)
+"""Build graph of the whole model, use graph.with_params to build variants."""
+
+SIDE_ANGLES = [90, 0, 270, 180]  # Top, Right, Bottom, Left
+"""Rotation around the z axis of the pogo connectors and magnets on each side of the box."""
+SIDE_NAMES = ["Top", "Right", "Bottom", "Left"]
+RIGHT_SIDE = 1
+
+
+# ----------- Load PCBs
+@graph.node(
+    params=["KICAD_PCB_NAMES", "PCB_PART_NAME", "FULL_PCB_NAME"],
+    inputs=lambda p: [get_kicad_pcb_cache_key(name) for name in p.KICAD_PCB_NAMES],
+    # The component stores already cache the boards on disk
+    persist=False,
+)
+def pcbs(p: NodeParameters):
+    return get_kicad_pcbs_as_shapes_dicts(
+        kicad_pcb_names=p.KICAD_PCB_NAMES,
+        pcb_part_name=p.PCB_PART_NAME,
+        full_name=p.FULL_PCB_NAME,
+        # Worker processes are not profiled
+        parallel=not is_profiling(),
+    )
+
+
+@graph.node(deps=["pcbs"], persist=False)
+def pcb_objects(p: NodeParameters, pcbs) -> dict[str, cq.Workplane]:
+    return {name: shapes_dict_to_cq_object(shapes_dict) for name, shapes_dict in pcbs.items()}
+
+
+@graph.node(params=["PCB_PART_NAME"], deps=["pcbs"])
+def pcb_bounds(p: NodeParameters, pcbs) -> dict[str, Any]:
+    """Dimensions of the boards, taken from the component store indices without loading any geometry."""
+    module_shapes_dict = pcbs["Module"]
+    power_supply_shapes_dict = pcbs["PowerSupply"]
+    pogo_connector_shapes_dict = pcbs["PogoConnector"]
+
+    module_pcb_bounds = module_shapes_dict.bounding_box(p.PCB_PART_NAME)
+    power_supply_pcb_bounds = power_supply_shapes_dict.bounding_box(p.PCB_PART_NAME)
+
+    module_max_z = module_pcb_bounds.zmax
+    for bounds in module_shapes_dict.bounding_boxes().values():
+        if bounds.zmax > module_max_z:
+            module_max_z = bounds.zmax
+    power_supply_max_z = power_supply_pcb_bounds.zmax
+    for bounds in power_supply_shapes_dict.bounding_boxes().values():
+        if bounds.zmax > power_supply_max_z:
+            power_supply_max_z = bounds.zmax
+
+    pogo_connector_bounds = pogo_connector_shapes_dict.bounding_box(p.PCB_PART_NAME)
+
+    esp32_bounds = None
+    for name in power_supply_shapes_dict:
+        if "ESP32" in name:
+            esp32_bounds = power_supply_shapes_dict.bounding_box(name)
+            break
+    assert esp32_bounds is not None, "ESP32 shape not found in power supply PCB shapes."
+
+    return {
+        "module_length": module_pcb_bounds.xlen,
+        "power_supply_length": power_supply_pcb_bounds.xlen,
+        "module_max_z": module_max_z,
+        "power_supply_max_z": power_supply_max_z,
+        "pogo_connector_size": (pogo_connector_bounds.xlen, pogo_connector_bounds.ylen, pogo_connector_bounds.zlen),
+        "esp32_size": (esp32_bounds.xlen, esp32_bounds.ylen, esp32_bounds.zlen),
+        "esp32_center": esp32_bounds.center.toTuple(),
+    }
+
+
+@graph.node(
+    params=[
+        "POGO_PIN_LENGTH_COMPRESSED", "PCB_TOLERANCE", "POGO_PIN_OFFSET", "MAGNET_POGO_CONNECTOR_DISTANCE",
+        "MAGNET_DIAMETER", "BOX_BE_A_CUBE", "BOX_FILLET", "WALL_THICKNESS",
+    ],
+    deps=["pcb_bounds"],
+    persist=False,
+)
+def box_dimensions(p: NodeParameters, pcb_bounds) -> dict[str, float]:
+    box_length = round(pcb_bounds["module_length"] + p.POGO_PIN_LENGTH_COMPRESSED, 2)
+    """Length of a side of the box on the xy plane."""
+    pogo_connector_translation = p.PCB_TOLERANCE
+    magnet_translation_x = 0.5 * pcb_bounds["pogo_connector_size"][0] + p.MAGNET_POGO_CONNECTOR_DISTANCE + 0.5 * p.MAGNET_DIAMETER + p.PCB_TOLERANCE
+
+    box_height = 0.5 * box_length
+    """Height of the box in positive z direction."""
+    box_depth = 0.5 * box_length
+    """Depth of the box in negative z direction."""
+    if not p.BOX_BE_A_CUBE:
+        module_max_z = max(pcb_bounds["module_max_z"], pcb_bounds["power_supply_max_z"])
+        box_height = module_max_z + 2 * p.PCB_TOLERANCE + p.BOX_FILLET + p.WALL_THICKNESS
+        box_depth = magnet_translation_x + 0.5 * p.MAGNET_DIAMETER + p.BOX_FILLET + p.WALL_THICKNESS
+
+    return {
+        "box_length": box_length,
+        "box_height": box_height,
+        "box_depth": box_depth,
+        "pogo_connector_translation": pogo_connector_translation,
+        "magnet_translation_x": magnet_translation_x,
+        # Final global z position of the center of the pogo pins.
+        "pogo_pin_center_z": -p.POGO_PIN_OFFSET + pogo_connector_translation,
+        # Final global z position of the center of the magnets inside the box.
+        "magnet_center_z": -magnet_translation_x + pogo_connector_translation,
+    }
+
+
+# ----------- Pogo Connectors and Magnets
+def transform_pogo_connector(cq_obj: cq.Workplane, module_length: float, pcb_thickness: float, pogo_connector_translation: float) -> cq.Workplane:
+    """Position an object to align with the pogo connector placement on the module PCB."""
+    return (
+        cq_obj
+        .rotate((0, 0, 0), (0, 1, 0), 90)
+        .translate((
+            0.5 * module_length - pcb_thickness,
+            0,
+            pogo_connector_translation,
+        ))
+    )
+
+
+def rotate_to_sides(cq_obj: cq.Workplane) -> list[cq.Workplane]:
+    """Copies of an object for every side of the box, see SIDE_ANGLES."""
+    return [cq_obj.rotate((0, 0, 0), (0, 0, 1), angle) for angle in SIDE_ANGLES]
+
+
+def get_side_location(side: int) -> cq.Location:
+    """Location of the copy of an object on a side of the box, like rotate_to_sides."""
+    return cq.Location(cq.Vector(), cq.Vector(0, 0, 1), SIDE_ANGLES[side])
+
+
+@graph.node(params=["PCB_THICKNESS"], deps=["pcb_objects", "pcb_bounds", "box_dimensions"], helpers=[transform_pogo_connector], persist=False)
+def pogo_connector(p: NodeParameters, pcb_objects, pcb_bounds, box_dimensions) -> cq.Workplane:
+    """The pogo connector on the right side of the box."""
+    return transform_pogo_connector(
+        pcb_objects["PogoConnector"], pcb_bounds["module_length"], p.PCB_THICKNESS, box_dimensions["pogo_connector_translation"]
+    )
+
+
+@graph.node(deps=["pogo_connector"], helpers=[rotate_to_sides], persist=False)
+def pogo_connectors(p: NodeParameters, pogo_connector) -> list[cq.Workplane]:
+    return rotate_to_sides(pogo_connector)
+
+
+@graph.node(
+    params=[
+        "NUMBER_OF_POGO_PINS", "POGO_PIN_SPACING", "POGO_PIN_DIAMETER", "POGO_PIN_LENGTH_COMPRESSED", "POGO_PIN_CUTOUT_THICKNESS",
+        "POGO_PIN_CUTOUT_EXTRA_DIAMETER", "POGO_PIN_OFFSET", "PCB_THICKNESS",
+    ],
+    deps=["pcb_bounds", "box_dimensions"],
+    helpers=[transform_pogo_connector, rotate_to_sides],
+)
+def pogo_pin_holes(p: NodeParameters, pcb_bounds, box_dimensions) -> list[cq.Workplane]:
+    """Holes to later cut out of the box for the pogo pins."""
+    pogo_pin_positions = [
+        (0, (i-p.NUMBER_OF_POGO_PINS / 2 + 0.5) * p.POGO_PIN_SPACING) for i in range(p.NUMBER_OF_POGO_PINS)
+    ]
+    cq_pogo_pin_hole = (
+        cq.Workplane()
+        .pushPoints(pogo_pin_positions)
+        .eachpoint(
+            cq.Workplane()
+            .circle(0.5 * p.POGO_PIN_DIAMETER)
+            .extrude(0.5 * p.POGO_PIN_LENGTH_COMPRESSED - p.POGO_PIN_CUTOUT_THICKNESS)
+            .faces(">Z")
+            .workplane()
+            .circle(0.5 * p.POGO_PIN_DIAMETER)
+            .workplane(offset=p.POGO_PIN_CUTOUT_THICKNESS)
+            .circle(0.5 * (p.POGO_PIN_DIAMETER + p.POGO_PIN_CUTOUT_EXTRA_DIAMETER))
+            .loft(ruled=True)
+        )
+        .translate((p.POGO_PIN_OFFSET, 0, p.PCB_THICKNESS))
+    )
+    return rotate_to_sides(transform_pogo_connector(
+        cq_pogo_pin_hole, pcb_bounds["module_length"], p.PCB_THICKNESS, box_dimensions["pogo_connector_translation"]
+    ))
+
+
+@graph.node(params=["PCB_TOLERANCE", "PCB_THICKNESS"], deps=["pcb_bounds", "box_dimensions"], helpers=[transform_pogo_connector, rotate_to_sides])
+def pogo_connector_holes(p: NodeParameters, pcb_bounds, box_dimensions) -> list[cq.Workplane]:
+    """Holes to later cut out of the box for the pogo connectors."""
+    pogo_connector_xlen, pogo_connector_ylen, pogo_connector_zlen = pcb_bounds["pogo_connector_size"]
+    cq_pogo_pin_pcb_with_tolerance = (
+        cq.Workplane()
+        .box(
+            pogo_connector_xlen + 2 * p.PCB_TOLERANCE,
+            pogo_connector_ylen + 2 * p.PCB_TOLERANCE,
+            pogo_connector_zlen + 2 * p.PCB_TOLERANCE,
+        )
+        .translate((0, 0, 0.5 * p.PCB_THICKNESS))
+    )
+    return rotate_to_sides(transform_pogo_connector(
+        cq_pogo_pin_pcb_with_tolerance, pcb_bounds["module_length"], p.PCB_THICKNESS, box_dimensions["pogo_connector_translation"]
+    ))
+
+
+def build_magnet(p: NodeParameters, box_dimensions: dict[str, float]) -> cq.Workplane:
+    magnet_translation_x = box_dimensions["magnet_translation_x"]
+    magnet_positions = [
+        (magnet_translation_x, 0.5 * (p.MAGNET_SPACING + p.MAGNET_DIAMETER)),
+        (magnet_translation_x, -0.5 * (p.MAGNET_SPACING + p.MAGNET_DIAMETER)),
+    ]
+    cq_magnet = (
+        cq.Workplane()
+        .pushPoints(magnet_positions)
+        .circle(0.5 * p.MAGNET_DIAMETER)
+        .extrude(-p.MAGNET_THICKNESS)
+        .rotate((0, 0, 0), (0, 1, 0), 90)
+        .translate((
+            0.5 * box_dimensions["box_length"] - 0.5 * p.MAGNET_DISTANCE,
+            0,
+            box_dimensions["pogo_connector_translation"],
+        ))
+    )
+    return cq_magnet
+
+
+@graph.node(
+    params=["MAGNET_SPACING", "MAGNET_DIAMETER", "MAGNET_THICKNESS", "MAGNET_DISTANCE"],
+    deps=["box_dimensions"],
+    helpers=[build_magnet],
+)
+def magnet(p: NodeParameters, box_dimensions) -> cq.Workplane:
+    """The magnets on the right side of the box."""
+    return build_magnet(p, box_dimensions)
+
+
+@graph.node(deps=["magnet"], helpers=[rotate_to_sides], persist=False)
+def magnets(p: NodeParameters, magnet) -> list[cq.Workplane]:
+    """Magnets to be placed inside the box."""
+    return rotate_to_sides(magnet)
+
+
+@graph.node(
+    params=["MAGNET_SPACING", "MAGNET_DIAMETER", "MAGNET_THICKNESS", "MAGNET_DISTANCE"],
+    deps=["box_dimensions"],
+    helpers=[build_magnet, rotate_to_sides],
+)
+def magnet_holes(p: NodeParameters, box_dimensions) -> list[cq.Workplane]:
+    """Holes to later cut out of the box for the magnets."""
+    return rotate_to_sides(build_magnet(p, box_dimensions))
+
+
+# ----------- Box
+@graph.node(params=["WALL_THICKNESS", "TOLERANCE", "BOX_FILLET"], deps=["box_dimensions"])
+def box_shells(p: NodeParameters, box_dimensions) -> dict[str, cq.Workplane]:
+    box_length = box_dimensions["box_length"]
+    box_height = box_dimensions["box_height"]
+    box_depth = box_dimensions["box_depth"]
+    cq_box_original = (
+        cq.Workplane().box(
+            box_length,
+            box_length,
+            box_height + box_depth,
+            centered=(True, True, False),
+        )
+        .translate((0, 0, -box_depth))
+        .edges()
+        .chamfer(p.BOX_FILLET)
+    )
+    return {
+        "original": cq_box_original,
+        "shell": cq_box_original.shell(-p.WALL_THICKNESS),
+        "with_tolerance": cq_box_original.shell(-(p.WALL_THICKNESS + p.TOLERANCE)),
+    }
+
+
+@graph.node(
+    params=[
+        "MAGNET_DIAMETER", "MAGNET_THICKNESS", "MAGNET_DISTANCE", "MAGNET_POGO_CONNECTOR_DISTANCE", "MAGNET_HOLDER_COVER_PERCENTAGE",
+        "MAGNET_HOLDER_COVER_THICKNESS", "WALL_THICKNESS", "PCB_THICKNESS", "BOOLEAN_FUZZY_VALUE",
+    ],
+    deps=["box_shells", "box_dimensions", "pcb_bounds"],
+)
+def box(p: NodeParameters, box_shells, box_dimensions, pcb_bounds) -> cq.Workplane:
+    """The box shell with the holders for the magnets and pogo connectors."""
+    cq_box_original = box_shells["original"]
+    cq_box = box_shells["shell"]
+    box_wall_thickness = p.WALL_THICKNESS
+    box_length = box_dimensions["box_length"]
+    box_depth = box_dimensions["box_depth"]
+    magnet_center_z = box_dimensions["magnet_center_z"]
+
+    ############# Holders for the magnets
+    magnet_holder_height = box_depth + magnet_center_z + 0.5 * p.MAGNET_DIAMETER + p.MAGNET_POGO_CONNECTOR_DISTANCE
+    magnet_holder_width = box_length
+    magnet_holder_cover_height = box_depth + magnet_center_z - 0.5 * p.MAGNET_DIAMETER + p.MAGNET_HOLDER_COVER_PERCENTAGE * p.MAGNET_DIAMETER
+
+    cq_magnet_holder = (
+        cq.Workplane()
+        .box(
+            magnet_holder_width,
+            p.MAGNET_THICKNESS,
+            magnet_holder_height,
+            centered=(True, True, False),
+        )
+        .translate((
+            0, 0.5 * box_length - 0.5 * p.MAGNET_DISTANCE -0.5 * p.MAGNET_THICKNESS, -box_depth
+        ))
+        .intersect(cq_box_original)
+        .cut(cq_box)
+    )
+    cq_magnet_holder_cover = (
+        cq.Workplane()
+        .box(
+            magnet_holder_width,
+            p.MAGNET_HOLDER_COVER_THICKNESS,
+            magnet_holder_cover_height,
+            centered=(True, True, False),
+        )
+        .translate((
+            0, 0.5 * box_length - 0.5 * p.MAGNET_DISTANCE - p.MAGNET_THICKNESS -0.5 * p.MAGNET_HOLDER_COVER_THICKNESS, -box_depth
+        ))
+        .intersect(cq_box_original)
+        .cut(cq_box)
+    )
+
+    cq_magnet_holders_rotated: list[cq.Workplane] = []
+    for angle in [0, 90, 180, 270]:
+        cq_magnet_holder_rotated = cq_magnet_holder.rotate((0, 0, 0), (0, 0, 1), angle)
+        cq_magnet_holder_cover_rotated = cq_magnet_holder_cover.rotate((0, 0, 0), (0, 0, 1), angle)
+        cq_magnet_holders_rotated.append(cq_magnet_holder_rotated)
+        # cq_magnet_holders_rotated.append(cq_magnet_holder_cover_rotated) # TODO: cover currently not needed
+    cq_box = union_all(cq_box, cq_magnet_holders_rotated, fuzzy_value=p.BOOLEAN_FUZZY_VALUE, label="magnet holders")
+
+    ############# Holders for the pogo connectors
+    pogo_connector_holder_height = box_length - magnet_holder_height
+    pogo_connector_holder_width = pcb_bounds["pogo_connector_size"][1] + 2 * p.WALL_THICKNESS
+    pogo_connector_holder_thickness = p.PCB_THICKNESS
+
+    cq_pogo_connector_holder = (
+        cq.Workplane()
+        .box(
+            pogo_connector_holder_width,
+            pogo_connector_holder_thickness,
+            pogo_connector_holder_height,
+            centered=(True, False, False),
+        )
+        .translate((
+            0, 0.5 * box_length - box_wall_thickness - pogo_connector_holder_thickness, -box_depth + magnet_holder_height
+        ))
+        .intersect(cq_box_original)
+        .cut(cq_box)
+    )
+
+    cq_pogo_connector_holders_rotated = [
+        cq_pogo_connector_holder.rotate((0, 0, 0), (0, 0, 1), angle) for angle in [0, 90, 180, 270]
+    ]
+    cq_box = union_all(cq_box, cq_pogo_connector_holders_rotated, fuzzy_value=p.BOOLEAN_FUZZY_VALUE, label="pogo connector holders")
+
+    return cq_box
+
+
+############# USB-C Connector Cutout
+@graph.node(
+    params=[
+        "USB_C_CONNECTOR_DEPTH", "USB_C_CONNECTOR_WIDTH", "USB_C_CONNECTOR_HEIGHT", "USB_C_CONNECTOR_FILLET",
+        "USB_C_CONNECTOR_OVERHANG", "USB_C_CONNECTOR_OFFSET_FROM_PCB", "PCB_THICKNESS",
+    ],
+    deps=["pcb_bounds"],
+)
+def usb_c_connector(p: NodeParameters, pcb_bounds) -> cq.Workplane:
+    return (
+        cq.Workplane()
+        .box(
+            p.USB_C_CONNECTOR_DEPTH,
+            p.USB_C_CONNECTOR_WIDTH,
+            p.USB_C_CONNECTOR_HEIGHT,
+            centered=(False, True, False),
+        )
+        .edges("X")
+        .fillet(p.USB_C_CONNECTOR_FILLET)
+        .translate((
+            -0.5 * pcb_bounds["module_length"] - p.USB_C_CONNECTOR_OVERHANG, 0, p.PCB_THICKNESS + p.USB_C_CONNECTOR_OFFSET_FROM_PCB
+        ))
+    )
+
+
+############# ESP-32 Connector Cutout
+@graph.node(params=["PCB_TOLERANCE"], deps=["pcb_bounds"], persist=False)
+def esp32_cutout(p: NodeParameters, pcb_bounds) -> cq.Workplane:
+    esp32_xlen, esp32_ylen, esp32_zlen = pcb_bounds["esp32_size"]
+    return (
+        cq.Workplane()
+        .box(
+            esp32_xlen + 2 * p.PCB_TOLERANCE,
+            esp32_ylen + 2 * p.PCB_TOLERANCE,
+            esp32_zlen + 2 * p.PCB_TOLERANCE,
+        )
+        .translate(pcb_bounds["esp32_center"])
+    )
+
+
+############# PCB Slots
+def make_pcb_slot(p: NodeParameters, kicad_pcb_name: str, pcbs: Callable[[], Any]) -> cq.Workplane:
+    pcb_tolerance = cq.Vector(p.PCB_TOLERANCE, p.PCB_TOLERANCE, p.PCB_TOLERANCE)
+    if p.PCB_OUTLINE_FROM_KICAD_PCB:
+        return make_offset_shape_from_kicad_pcb(get_kicad_pcb_file(kicad_pcb_name), pcb_tolerance)
+    # Only load the boards when the slot is built from the STEP export
+    return make_offset_shape(cq.Workplane(pcbs()[kicad_pcb_name][p.PCB_PART_NAME]), pcb_tolerance)
+
+
+@graph.node(params=["PCB_OUTLINE_FROM_KICAD_PCB", "PCB_TOLERANCE", "PCB_PART_NAME"], lazy_deps=["pcbs"], helpers=[make_pcb_slot])
+def module_pcb_slot(p: NodeParameters, pcbs) -> cq.Workplane:
+    return make_pcb_slot(p, "Module", pcbs)
+
+
+@graph.node(params=["PCB_OUTLINE_FROM_KICAD_PCB", "PCB_TOLERANCE", "PCB_PART_NAME"], lazy_deps=["pcbs"], helpers=[make_pcb_slot])
+def power_supply_pcb_slot(p: NodeParameters, pcbs) -> cq.Workplane:
+    return make_pcb_slot(p, "PowerSupply", pcbs)
+
+
+# ----------- Finished Boxes
+FINISH_BOX_PARAMETERS = [
+    "POGO_PIN_DIAMETER", "BOX_FILLET", "PRINTER_MIN_OUTER_WALL_WIDTH", "WALL_THICKNESS", "TOLERANCE", "PCB_TOLERANCE",
+    "PCB_THICKNESS", "MODULE_PILLAR_DIAMETER", "CLIP_CONNECTOR_OFFSET", "CLIP_CONNECTOR_THICKNESS",
+    "CLIP_CONNECTOR_OFFSET_Z", "CLIP_CONNECTOR_TOLERANCE", "BOOLEAN_FUZZY_VALUE",
+]
+"""Parameters read by finish_box."""
+
+
+def finish_box(
+    p: NodeParameters,
+    cq_box: cq.Workplane,
+    box_shells: dict[str, cq.Workplane],
+    box_dimensions: dict[str, float],
+    cq_holes: list[cq.Workplane],
+    cq_module_pcb_with_tolerance: cq.Workplane,
+    cq_top_cutouts: list[cq.Workplane],
+) -> dict[str, cq.Workplane]:
+    """
+    Finish editing the box, shared by the module box and the power supply box.
+
+    :param cq_holes: Holes to cut out of the whole box.
+    :param cq_module_pcb_with_tolerance: The PCB slot.
+    :param cq_top_cutouts: Additional shapes, that are extruded downwards and cut out of the top half like the PCB slot.
+
+    :return: The top and bottom half of the box.
+    """
+    cq_box_original = box_shells["original"]
+    cq_box_with_tolerance = box_shells["with_tolerance"]
+    box_wall_thickness = p.WALL_THICKNESS
+    box_length = box_dimensions["box_length"]
+    box_height = box_dimensions["box_height"]
+    box_depth = box_dimensions["box_depth"]
+    pogo_pin_center_z = box_dimensions["pogo_pin_center_z"]
+
+    ############# Cut Holes
+    cq_box = cut_all(cq_box, cq_holes, fuzzy_value=p.BOOLEAN_FUZZY_VALUE, label="holes")
+
+    ############# Split the box into two halves that can be clipped together
+    def get_cq_split_body_bottom(tolerance: float = 0) -> cq.Workplane:
+        cq_split_body_bottom = (
+            cq.Workplane()
+            .box(box_length, box_length, box_depth + pogo_pin_center_z - 0.25 * p.POGO_PIN_DIAMETER, centered=(True, True, False))
+            .translate((0, 0, -box_depth))
+            .edges("|Z")
+            .chamfer(p.BOX_FILLET)
+        )
+        cq_split_body_bottom = (
+            cq.Workplane()
+            .add(
+                cq_split_body_bottom
+                .faces(">Z")
+                .wires()
+                .toPending()
+                .offset2D(-p.PRINTER_MIN_OUTER_WALL_WIDTH - tolerance, kind="intersection")
+                # Small hack to get the wires (idk why offset2D alone does not work here)
+                .extrude(1)
+                .faces(">Z")
+                .translate((0, 0, -1))
+            )
+            .add(
+                cq_split_body_bottom
+                .translate((0, 0, box_wall_thickness))
+                .faces(">Z")
+                .wires()
+                .toPending()
+                .offset2D(-p.PRINTER_MIN_OUTER_WALL_WIDTH - tolerance - box_wall_thickness, kind="intersection")
+            )
+            .wires()
+            .toPending()
+            .loft(ruled=True)
+            .add(cq_split_body_bottom)
+        )
+        return cq_split_body_bottom
+    cq_split_body_top = (
+        cq_box_original
+        .cut(get_cq_split_body_bottom(p.TOLERANCE))
+    )
+
+    cq_box_top = (
+        cq_box
+        .cut(get_cq_split_body_bottom())
+    )
+    cq_box_bottom = (
+        cq_box
+        .cut(cq_split_body_top)
+    )
+
+    cq_box_top_with_tolerance = (
+        cq_box_with_tolerance
+        .cut(get_cq_split_body_bottom(p.TOLERANCE))
+    )
+
+    ############# Module PCB Slot
+    cq_box_top = cut_all(
+        cq_box_top,
+        [
+            cq_top_cutout
+            .faces(">Z")
+            .wires().toPending()
+            .extrude(-(box_height + box_depth))
+            for cq_top_cutout in [cq_module_pcb_with_tolerance, *cq_top_cutouts]
+        ],
+        fuzzy_value=p.BOOLEAN_FUZZY_VALUE,
+        label="pcb slot",
+    )
+
+    ############# Module Pillars
+    module_pillar_height = box_depth - box_wall_thickness - p.PCB_TOLERANCE + p.PCB_THICKNESS
+    module_pillar_translation = 0.5 * box_length - box_wall_thickness - 0.5 * p.MODULE_PILLAR_DIAMETER
+    module_pillar_positions = [
+        (module_pillar_translation, module_pillar_translation),
+        (module_pillar_translation, -module_pillar_translation),
+        (-module_pillar_translation, module_pillar_translation),
+        (-module_pillar_translation, -module_pillar_translation),
+    ]
+    cq_module_pillar = (
+        cq.Workplane()
+        .pushPoints(module_pillar_positions)
+        .eachpoint(
+            cq.Workplane()
+            .rect(p.MODULE_PILLAR_DIAMETER, p.MODULE_PILLAR_DIAMETER)
+            .extrude(-module_pillar_height)
+            .rotate((0, 0, 0), (0, 0, 1), 45)
+        )
+        .translate((
+            0,
+            0,
+            -p.PCB_TOLERANCE + p.PCB_THICKNESS,
+        ))
+        .intersect(cq_box_original)
+        .cut(cq_box)
+        .cut(cq_box_top_with_tolerance)
+        .cut(cq_module_pcb_with_tolerance)
+    )
+    cq_box_bottom = cq_box_bottom.union(cq_module_pillar)
+
+    ############# Clipping on the Module Pillars
+    clip_connector_translation = module_pillar_translation + p.CLIP_CONNECTOR_OFFSET
+    clip_connector_positions = [
+        (clip_connector_translation, clip_connector_translation),
+        (clip_connector_translation, -clip_connector_translation),
+        (-clip_connector_translation, clip_connector_translation),
+        (-clip_connector_translation, -clip_connector_translation),
+    ]
+    def build_clip_connector(tolerance: float = 0) -> cq.Workplane:
+        return (
+            cq.Workplane()
+            .pushPoints(clip_connector_positions)
+            .eachpoint(
+                build_octahedron(p.CLIP_CONNECTOR_THICKNESS + tolerance)
+                .rotate((0, 0, 0), (0, 0, 1), 45)
+            )
+            .intersect(cq_box_original)
+        )
+    cq_clip_connector = build_clip_connector().translate((0, 0, p.CLIP_CONNECTOR_OFFSET_Z))
+    cq_clip_connector_with_tolerance = build_clip_connector(p.CLIP_CONNECTOR_TOLERANCE)
+    cq_box_top = cq_box_top.union(cq_clip_connector)
+    cq_box_bottom = cq_box_bottom.cut(cq_clip_connector_with_tolerance)
+
+    return {"top": cq_box_top, "bottom": cq_box_bottom}
+
+
+@graph.node(
+    params=FINISH_BOX_PARAMETERS,
+    deps=["box", "box_shells", "box_dimensions", "pogo_pin_holes", "pogo_connector_holes", "magnet_holes", "module_pcb_slot"],
+    helpers=[finish_box, build_octahedron],
+)
+def module_box(p: NodeParameters, box, box_shells, box_dimensions, pogo_pin_holes, pogo_connector_holes, magnet_holes, module_pcb_slot) -> dict[str, cq.Workplane]:
+    return finish_box(
+        p, box, box_shells, box_dimensions,
+        cq_holes=[*pogo_pin_holes, *pogo_connector_holes, *magnet_holes],
+        cq_module_pcb_with_tolerance=module_pcb_slot,
+        cq_top_cutouts=[],
+    )
+
+
+@graph.node(
+    params=FINISH_BOX_PARAMETERS,
+    deps=[
+        "box", "box_shells", "box_dimensions", "pogo_pin_holes", "pogo_connector_holes", "magnet_holes",
+        "usb_c_connector", "esp32_cutout", "power_supply_pcb_slot",
+    ],
+    helpers=[finish_box, build_octahedron],
+)
+def power_supply_box(
+    p: NodeParameters, box, box_shells, box_dimensions, pogo_pin_holes, pogo_connector_holes, magnet_holes,
+    usb_c_connector, esp32_cutout, power_supply_pcb_slot,
+) -> dict[str, cq.Workplane]:
+    return finish_box(
+        p, box, box_shells, box_dimensions,
+        # Only cut holes on the right side, plus the USB-C connector hole
+        cq_holes=[pogo_pin_holes[RIGHT_SIDE], pogo_connector_holes[RIGHT_SIDE], magnet_holes[RIGHT_SIDE], usb_c_connector],
+        cq_module_pcb_with_tolerance=power_supply_pcb_slot,
+        cq_top_cutouts=[esp32_cutout],
+    )
+
+
+# ----------- Clearances
+# The full board is the union of all other parts, checking it would report every
+# interference twice
+@graph.node(params=["CLEARANCE_MAX_DISTANCE", "FULL_PCB_NAME"], deps=["pcbs", "module_box"])
+def module_clearances(p: NodeParameters, pcbs, module_box) -> list[Clearance]:
+    components = {name: pcbs["Module"][name] for name in pcbs["Module"] if name != p.FULL_PCB_NAME}
+    return check_clearances(components, {"Box Top": module_box["top"], "Box Bottom": module_box["bottom"]}, p.CLEARANCE_MAX_DISTANCE)
+
+
+@graph.node(params=["CLEARANCE_MAX_DISTANCE", "FULL_PCB_NAME"], deps=["pcbs", "power_supply_box"])
+def power_supply_clearances(p: NodeParameters, pcbs, power_supply_box) -> list[Clearance]:
+    components = {name: pcbs["PowerSupply"][name] for name in pcbs["PowerSupply"] if name != p.FULL_PCB_NAME}
+    return check_clearances(
+        components,
+        {"Power Supply Box Top": power_supply_box["top"], "Power Supply Box Bottom": power_supply_box["bottom"]},
+        p.CLEARANCE_MAX_DISTANCE,
+    )
+
+
+ENCLOSURES = ["module_box", "power_supply_box"]
+"""Enclosure variants, independent of each other."""
+CLEARANCES = {"module_box": "module_clearances", "power_supply_box": "power_supply_clearances"}
+"""Clearance check node of each enclosure."""
+
+EXPORTS: dict[str, tuple[str, Any]] = {
+    "Pogo_Connector": ("pogo_connectors", 0),
+    "Module": ("pcb_objects", "Module"),
+    "Power_Supply": ("pcb_objects", "PowerSupply"),
+    "Box_Top": ("module_box", "top"),
+    "Box_Bottom": ("module_box", "bottom"),
+    "Power_Supply_Box_Top": ("power_supply_box", "top"),
+    "Power_Supply_Box_Bottom": ("power_supply_box", "bottom"),
+}
+"""Exported files by name, as node and item of the node result."""
+# fmt: on
+
+
+def get_export(graph: BuildGraph, name: str) -> cq.Workplane:
+    """
+    Builds one of the exported objects, see EXPORTS.
+    """
+    node_name, item = EXPORTS[name]
+    return graph.get(node_name)[item]
+
+
+DEFAULT_LAYOUT = [
+    CubePlacement(MODULE, (0, 0)),
+    CubePlacement(POWER_SUPPLY, (-1, 0)),
+    CubePlacement(MODULE, (0, 1)),
+]
+"""A module cube, the power supply cube left of it and another module above it."""
+PCB_PARTS = ["Module", "Power Supply", "Pogo Connector"]
+"""Parts of the scene that are loaded from the PCBs, with all their components."""
+
+
+def get_cube_location(placement: CubePlacement, box_length: float) -> cq.Location:
+    """Location of a cube of a layout, see cube_layout."""
+    x, y = placement.cell
+    return cq.Location(
+        cq.Vector(x * box_length, y * box_length, 0),
+        cq.Vector(0, 0, 1),
+        placement.rotation,
+    )
+
+
+def get_scene(graph: BuildGraph, layout: list[CubePlacement] = DEFAULT_LAYOUT) -> Scene:
+    """
+    Builds the scene of a layout of module and power supply cubes, see cube_layout.\n
+    Every part is stored once, the cubes only add instances of the shared parts, so
+    layouts of hundreds of cubes need about as much memory as a single cube.
+    The instances of each cube are grouped by the name of its placement.
+    """
+    validate_layout(layout)
+    pcb_objects = graph.get("pcb_objects")
+    module_box = graph.get("module_box")
+    power_supply_box = graph.get("power_supply_box")
+    box_length = graph.get("box_dimensions")["box_length"]
+
+    scene = Scene()
+    scene.add_part("Module", pcb_objects["Module"])
+    scene.add_part("Power Supply", pcb_objects["PowerSupply"])
+    scene.add_part("Pogo Connector", graph.get("pogo_connector"))
+    scene.add_part("Magnet", graph.get("magnet"))
+    scene.add_part("Box Top", module_box["top"])
+    scene.add_part("Box Bottom", module_box["bottom"])
+    scene.add_part("Power Supply Box Top", power_supply_box["top"])
+    scene.add_part("Power Supply Box Bottom", power_supply_box["bottom"])
+
+    for placement in layout:
+        name = placement.name
+        location = get_cube_location(placement, box_length)
+        if placement.kind == MODULE:
+            scene.add_instance(f"{name} PCB", "Module", location, name)
+            for side, side_name in enumerate(SIDE_NAMES):
+                side_location = location * get_side_location(side)
+                scene.add_instance(
+                    f"{name} Pogo Connector {side_name}",
+                    "Pogo Connector",
+                    side_location,
+                    name,
+                )
+                scene.add_instance(
+                    f"{name} Magnet {side_name}", "Magnet", side_location, name
+                )
+            scene.add_instance(f"{name} Box Top", "Box Top", location, name)
+            scene.add_instance(f"{name} Box Bottom", "Box Bottom", location, name)
+        else:
+            # Power supplies only connect on their right side
+            right_side_location = location * get_side_location(RIGHT_SIDE)
+            scene.add_instance(f"{name} PCB", "Power Supply", location, name)
+            scene.add_instance(
+                f"{name} Pogo Connector Right",
+                "Pogo Connector",
+                right_side_location,
+                name,
+            )
+            scene.add_instance(
+                f"{name} Magnet Right", "Magnet", right_side_location, name
+            )
+            scene.add_instance(
+                f"{name} Box Top", "Power Supply Box Top", location, name
+            )
+            scene.add_instance(
+                f"{name} Box Bottom", "Power Supply Box Bottom", location, name
+            )
+    return scene
+
+
+def get_preview_lods(
+    scene: Scene, layout: list[CubePlacement] = DEFAULT_LAYOUT
+) -> dict[str, Lod]:
+    """
+    Returns the levels of detail for a quick look at the enclosures in the viewer:
+    the PCBs are coarse, only the first module cube and the first power supply cube
+    of the layout are shown in detail and all other cubes as bounding boxes, see
+    Scene.to_assembly.
+    """
+    lods: dict[str, Lod] = {part: "coarse" for part in PCB_PARTS}
+    focus_groups = {
+        next((placement.name for placement in layout if placement.kind == kind), None)
+        for kind in (MODULE, POWER_SUPPLY)
+    }
+    for instance in scene.instances:
+        if instance.group not in focus_groups:
+            lods[instance.name] = "box"
+    return lods
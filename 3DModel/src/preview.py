@@ -0,0 +1,89 @@
+"""
+Lightweight stand-ins for showing objects in the viewer.
+
+Every shape of an object (e.g. every component of a PCB) is replaced on its own, so
+the layout stays recognizable while the viewer has much less to tessellate:\n
+full: the object itself\n
+coarse: a coarse triangulation, cached like every mesh in models/mesh_cache\n
+box: the bounding box of every shape
+"""
+
+from typing import Literal
+
+import cadquery as cq
+from OCP.BRep import BRep_Builder
+from OCP.gp import gp_Pnt
+from OCP.Poly import Poly_Triangle, Poly_Triangulation
+from OCP.TopoDS import TopoDS_Face
+
+from fingerprint import get_shape_fingerprint
+from mesh_cache import Mesh, get_mesh
+
+Lod = Literal["full", "coarse", "box"]
+LODS: tuple[Lod, ...] = ("full", "coarse", "box")
+
+COARSE_TOLERANCE = 0.5
+COARSE_ANGULAR_TOLERANCE = 0.5
+_MIN_BOX_SIZE = 0.01
+"""Boxes of flat shapes get this thickness, as OCCT cannot make empty boxes."""
+
+_coarse_shapes: dict[str, cq.Shape] = {}
+"""Coarse stand-ins of this process by shape fingerprint."""
+
+
+def mesh_to_shape(mesh: Mesh) -> cq.Shape:
+    """
+    Returns a face carrying only the triangulation of a mesh, without a surface.
+    The viewer shows it like any other face, but it cannot be used for modeling.
+    """
+    vertices, triangles = mesh
+    triangulation = Poly_Triangulation(len(vertices), len(triangles), False)
+    # Nodes and triangles are counted from 1
+    for index, (x, y, z) in enumerate(vertices.tolist(), 1):
+        triangulation.SetNode(index, gp_Pnt(x, y, z))
+    for index, (a, b, c) in enumerate(triangles.tolist(), 1):
+        triangulation.SetTriangle(index, Poly_Triangle(a + 1, b + 1, c + 1))
+    face = TopoDS_Face()
+    BRep_Builder().MakeFace(face, triangulation)
+    return cq.Shape.cast(face)
+
+
+def get_coarse_shape(shape: cq.Shape) -> cq.Shape:
+    key = get_shape_fingerprint(shape)
+    if key not in _coarse_shapes:
+        mesh = get_mesh(shape, COARSE_TOLERANCE, COARSE_ANGULAR_TOLERANCE)
+        _coarse_shapes[key] = mesh_to_shape(mesh)
+    return _coarse_shapes[key]
+
+
+def get_box_shape(shape: cq.Shape) -> cq.Shape:
+    bounding_box = shape.BoundingBox()
+    return cq.Solid.makeBox(
+        max(bounding_box.xlen, _MIN_BOX_SIZE),
+        max(bounding_box.ylen, _MIN_BOX_SIZE),
+        max(bounding_box.zlen, _MIN_BOX_SIZE),
+        cq.Vector(bounding_box.xmin, bounding_box.ymin, bounding_box.zmin),
+    )
+
+
+def get_preview(cq_object: cq.Workplane, lod: Lod = "full") -> cq.Workplane:
+    """
+    Returns the stand-in of an object for the viewer.
+
+    :param cq_object: The object to show.
+    :param lod: Level of detail, see LODS.
+    """
+    if lod == "full":
+        return cq_object
+    if lod == "coarse":
+        get_shape = get_coarse_shape
+    elif lod == "box":
+        get_shape = get_box_shape
+    else:
+        raise Exception(f"Unknown level of detail {lod}, use one of {', '.join(LODS)}")
+    return cq.Workplane().newObject(
+        [
+            get_shape(val) if isinstance(val, cq.Shape) else val
+            for val in cq_object.vals()
+        ]
+    )
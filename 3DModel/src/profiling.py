@@ -0,0 +1,252 @@
+"""
+Optional instrumentation of the build.
+
+Stages are recorded with wall time, CPU time and peak memory, CadQuery operations with
+their count and duration. Nothing is recorded until enable is called, so the hooks in
+the other modules cost only a flag check in normal runs.
+Only the current process is recorded, work done in worker processes is not.
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_T = TypeVar("_T")
+
+_CADQUERY_OPERATIONS = {
+    "Workplane": (
+        "box",
+        "extrude",
+        "loft",
+        "shell",
+        "chamfer",
+        "fillet",
+        "offset2D",
+        "cut",
+        "union",
+        "intersect",
+        "rotate",
+        "translate",
+        "eachpoint",
+    ),
+    "Shape": ("tessellate", "clean", "exportStep", "exportBrep"),
+}
+"""CadQuery methods that are timed, by class name."""
+
+_enabled = False
+_start_time = 0.0
+_start_cpu_time = 0.0
+"""CPU time of this process when recording started, so the report only counts the
+CPU time of the recorded period, like the wall time."""
+_frames: list[list[Any]] = []
+"""Open stages: name, start time and summed duration of children."""
+_events: list[dict[str, Any]] = []
+_stages: dict[str, dict[str, float]] = {}
+_operations: dict[str, dict[str, float]] = {}
+_folded: dict[str, float] = {}
+_operation_depth = 0
+_originals: list[tuple[type, str, Callable[..., Any]]] = []
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def get_peak_rss_mb() -> float | None:
+    """
+    Returns the peak resident memory of this process in MB, None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes everywhere else
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def enable(instrument_cadquery: bool = True):
+    """
+    Starts recording, discarding anything recorded before.
+
+    :param instrument_cadquery: Also time the CadQuery operations listed in
+    _CADQUERY_OPERATIONS, by wrapping the methods of the CadQuery classes.
+    """
+    global _enabled, _start_time, _start_cpu_time
+    disable()
+    _frames.clear()
+    _events.clear()
+    _stages.clear()
+    _operations.clear()
+    _folded.clear()
+    _start_time = time.perf_counter()
+    _start_cpu_time = time.process_time()
+    _enabled = True
+    if instrument_cadquery:
+        _instrument_cadquery()
+
+
+def disable():
+    """
+    Stops recording and restores the CadQuery methods, the results are kept.
+    """
+    global _enabled
+    _enabled = False
+    for cls, name, original in reversed(_originals):
+        setattr(cls, name, original)
+    _originals.clear()
+
+
+@contextmanager
+def stage(name: str, category: str = "stage") -> Iterator[None]:
+    """
+    Records the wall time, CPU time and peak memory of a block.
+    """
+    if not _enabled:
+        yield
+        return
+    frame = [name, time.perf_counter(), 0.0]
+    _frames.append(frame)
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        cpu_seconds = time.process_time() - cpu_start
+        _frames.pop()
+        _record(name, category, frame[1], end, frame[2], cpu_seconds)
+
+
+def _record(
+    name: str,
+    category: str,
+    start: float,
+    end: float,
+    children_seconds: float,
+    cpu_seconds: float,
+):
+    seconds = end - start
+    stack = ";".join([*(frame[0] for frame in _frames), name])
+    _folded[stack] = _folded.get(stack, 0.0) + seconds - children_seconds
+    if _frames:
+        _frames[-1][2] += seconds
+
+    stats = _operations if category == "operation" else _stages
+    if category != "operation" or _operation_depth == 0:
+        entry = stats.setdefault(name, {"count": 0, "seconds": 0.0, "cpu_seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        entry["cpu_seconds"] += cpu_seconds
+
+    _events.append(
+        {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - _start_time) * 1e6,
+            "dur": seconds * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"cpu_ms": cpu_seconds * 1e3, "peak_rss_mb": get_peak_rss_mb()},
+        }
+    )
+
+
+def profiled(
+    name: str | None = None, category: str = "stage"
+) -> Callable[[Callable[..., _T]], Callable[..., _T]]:
+    """
+    Records every call of the decorated function as a stage, see stage.
+
+    :param name: Name of the stage, defaults to the name of the function.
+    """
+
+    def decorator(func: Callable[..., _T]) -> Callable[..., _T]:
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(stage_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _wrap_operation(
+    operation_name: str, method: Callable[..., Any]
+) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        global _operation_depth
+        if not _enabled:
+            return method(*args, **kwargs)
+        with stage(operation_name, "operation"):
+            # Operations calling other operations are only counted once
+            _operation_depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _operation_depth -= 1
+
+    return wrapper
+
+
+def _instrument_cadquery():
+    import cadquery as cq
+
+    for class_name, method_names in _CADQUERY_OPERATIONS.items():
+        cls = getattr(cq, class_name)
+        for method_name in method_names:
+            original = getattr(cls, method_name)
+            _originals.append((cls, method_name, original))
+            setattr(
+                cls,
+                method_name,
+                _wrap_operation(f"{class_name}.{method_name}", original),
+            )
+
+
+def get_report() -> dict[str, Any]:
+    """
+    Returns the recorded stages and operations, sorted by name for stable diffs.
+    """
+    return {
+        "wall_seconds": time.perf_counter() - _start_time,
+        "cpu_seconds": time.process_time() - _start_cpu_time,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "stages": dict(sorted(_stages.items())),
+        "operations": dict(sorted(_operations.items())),
+    }
+
+
+def write_report(folder: str) -> dict[str, Any]:
+    """
+    Writes the recorded data to a folder:\n
+    profile.json: totals per stage and operation, see get_report\n
+    trace.json: every call in the Chrome trace format (chrome://tracing, Perfetto, speedscope)\n
+    profile.folded: self time in microseconds per call stack, for flamegraph.pl
+
+    :return: The report written to profile.json.
+    """
+    os.makedirs(folder, exist_ok=True)
+    report = get_report()
+    with open(os.path.join(folder, "profile.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(folder, "trace.json"), "w") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+    with open(os.path.join(folder, "profile.folded"), "w") as f:
+        for stack, seconds in sorted(_folded.items()):
+            f.write(f"{stack} {round(seconds * 1e6)}\n")
+    return report
@@ -0,0 +1,183 @@
+import hashlib
+import os
+from dataclasses import dataclass
+
+import cadquery as cq
+import numpy as np
+
+from fingerprint import get_cq_object_fingerprint
+from mesh_cache import get_cq_object_mesh, get_stl_records, write_stl_header
+from preview import Lod, get_preview
+from profiling import profiled
+
+
+@dataclass
+class Instance:
+    name: str
+    part: str
+    """Name of the part inside the scene."""
+    location: cq.Location
+    group: str = ""
+    """Name of the group of instances it belongs to, e.g. the cube it is part of."""
+
+
+class Scene:
+    """
+    Unique parts placed as named instances.\n
+    Repeated parts (pogo connectors, magnets, copies of whole cubes) are stored once,
+    so they are tessellated and written only once when exporting. A scene of
+    hundreds of cubes only adds instances, no geometry.
+    """
+
+    def __init__(self):
+        self.parts: dict[str, cq.Workplane] = {}
+        self.instances: list[Instance] = []
+        self._instance_names: set[str] = set()
+
+    def add_part(self, name: str, cq_object: cq.Workplane):
+        if name in self.parts and self.parts[name] is not cq_object:
+            raise Exception(f"Part {name} is already in the scene")
+        self.parts[name] = cq_object
+
+    def add_instance(
+        self,
+        name: str,
+        part: str,
+        location: cq.Location | None = None,
+        group: str = "",
+    ) -> Instance:
+        """
+        Places a part of the scene.
+
+        :param name: Unique name of the instance.
+        :param part: Name of the part, see add_part.
+        :param location: Placement of the part, defaults to no transformation.
+        :param group: Name of the group of instances it belongs to, see Instance.
+        """
+        if part not in self.parts:
+            raise Exception(f"Unknown part {part}")
+        if name in self._instance_names:
+            raise Exception(f"Instance {name} is already in the scene")
+        instance = Instance(name, part, location or cq.Location(), group)
+        self.instances.append(instance)
+        self._instance_names.add(name)
+        return instance
+
+    def get_located(self, instance: Instance) -> cq.Workplane:
+        """
+        Returns the placed part of an instance, sharing the geometry of the part.
+        """
+        return cq.Workplane().newObject(
+            [
+                val.moved(instance.location) if isinstance(val, cq.Shape) else val
+                for val in self.parts[instance.part].vals()
+            ]
+        )
+
+    def to_assembly(
+        self,
+        name: str = "Scene",
+        lods: dict[str, Lod] | None = None,
+        default_lod: Lod = "full",
+    ) -> cq.Assembly:
+        """
+        Returns an assembly referencing every part once, the instances only add
+        a location to the shared part.
+
+        :param lods: Level of detail by instance or part name, see preview.get_preview.
+        Instance names take precedence over part names. Only meant for showing the
+        scene, exported files need the full detail.
+        :param default_lod: Level of detail of instances not found in lods.
+        """
+        lods = lods or {}
+        previews: dict[tuple[str, Lod], cq.Workplane] = {}
+        assembly = cq.Assembly(name=name)
+        for instance in self.instances:
+            lod = lods.get(instance.name, lods.get(instance.part, default_lod))
+            if (instance.part, lod) not in previews:
+                previews[(instance.part, lod)] = get_preview(
+                    self.parts[instance.part], lod
+                )
+            assembly.add(
+                previews[(instance.part, lod)],
+                name=instance.name,
+                loc=instance.location,
+            )
+        return assembly
+
+
+def _get_matrix(location: cq.Location) -> np.ndarray:
+    transformation = location.wrapped.Transformation()
+    return np.array(
+        [
+            [transformation.Value(row, column) for column in range(1, 5)]
+            for row in range(1, 4)
+        ]
+    )
+
+
+def get_scene_fingerprint(scene: Scene) -> str:
+    """
+    Returns a stable hash of the geometry and placement of all instances, see
+    fingerprint.get_cq_object_fingerprint.
+    """
+    part_fingerprints = {
+        name: get_cq_object_fingerprint(cq_object)
+        for name, cq_object in scene.parts.items()
+    }
+    hasher = hashlib.sha256()
+    for instance in scene.instances:
+        matrix = _get_matrix(instance.location).round(9).tolist()
+        hasher.update(
+            f"{instance.name}-{part_fingerprints[instance.part]}-{matrix!r}".encode()
+        )
+    return hasher.hexdigest()
+
+
+def write_scene_stl(
+    scene: Scene, path: str, tolerance: float = 0.1, angular_tolerance: float = 0.1
+):
+    """
+    Writes all instances as a single binary STL file. Each part is tessellated only
+    once, and the instances are transformed and written one at a time, so the memory
+    does not grow with the number of instances.
+    """
+    part_meshes = {
+        name: get_cq_object_mesh(cq_object, tolerance, angular_tolerance)
+        for name, cq_object in scene.parts.items()
+    }
+    triangle_count = sum(
+        len(part_meshes[instance.part][1]) for instance in scene.instances
+    )
+    with open(path, "wb") as f:
+        write_stl_header(f, triangle_count)
+        for instance in scene.instances:
+            vertices, triangles = part_meshes[instance.part]
+            matrix = _get_matrix(instance.location)
+            located_vertices = vertices @ matrix[:, :3].T + matrix[:, 3]
+            f.write(get_stl_records((located_vertices, triangles)).tobytes())
+
+
+@profiled()
+def export_scene(
+    scene: Scene,
+    path: str,
+    tolerance: float = 0.1,
+    angular_tolerance: float = 0.1,
+):
+    """
+    Exports a scene, the format is chosen by the file extension:\n
+    .step/.stp and .glb/.gltf keep the instances as references to shared parts,
+    .stl writes a single mesh, tessellating every part only once, see write_scene_stl.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".stl":
+        write_scene_stl(scene, path, tolerance, angular_tolerance)
+    elif extension in (".step", ".stp"):
+        scene.to_assembly().save(path, "STEP")
+    elif extension in (".glb", ".gltf"):
+        scene.to_assembly().save(
+            path, "GLTF", tolerance=tolerance, angularTolerance=angular_tolerance
+        )
+    else:
+        raise Exception(f"Unsupported scene file extension {extension}")
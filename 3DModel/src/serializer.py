@@ -23,21 +23,107 @@ SOFTWARE.
 """
 
 import copyreg
+import mmap
+import pickle
+import struct
+import traceback
+import zlib
 from io import BytesIO
+from typing import Any, BinaryIO
 
 import cadquery as cq
 import OCP
+from OCP.BinTools import BinTools, BinTools_FormatVersion
 
+_FORMAT_MAGIC = b"SCBR"
+"""Prefix of tagged payloads, untagged payloads are text BRep from older caches."""
+_FORMAT_TEXT = b"t"
+_FORMAT_BINARY = b"b"
+_FORMAT_BINARY_ZLIB = b"z"
+_HEADER_LENGTH = len(_FORMAT_MAGIC) + 1
 
-def _inflate_shape(data: bytes):
-    with BytesIO(data) as bio:
-        return cq.Shape.importBrep(bio)
+_FILE_MAGIC = b"SCPK"
+_FILE_HEADER = struct.Struct("<4sIQ")
+"""Magic, number of out-of-band buffers and length of the pickle stream."""
+
+_binary = True
+_compression_level: int | None = 1
+
+
+def set_encoding(binary: bool = True, compression_level: int | None = 1):
+    """
+    Sets how shapes are encoded when pickling, pickles of any encoding can always be loaded.
+
+    :param binary: Use OCCT's binary BRep format instead of the text format.
+    :param compression_level: zlib compression level for binary BRep, None to disable compression.
+    """
+    global _binary, _compression_level
+    _binary = binary
+    _compression_level = compression_level
+
+
+def _write_topods(
+    shape: OCP.TopoDS.TopoDS_Shape,
+) -> bytes | bytearray | memoryview:
+    """
+    Encodes a shape, returning the encoder's buffer without copying it where possible.
+    """
+    stream = BytesIO()
+    if not _binary:
+        stream.write(_FORMAT_MAGIC + _FORMAT_TEXT)
+        OCP.BRepTools.BRepTools.Write_s(shape, stream)
+        return stream.getbuffer()
+    stream.write(_FORMAT_MAGIC + _FORMAT_BINARY)
+    # Triangulations are left out, they are rebuilt when meshing
+    BinTools.Write_s(
+        shape,
+        stream,
+        False,
+        False,
+        BinTools_FormatVersion.BinTools_FormatVersion_CURRENT,
+    )
+    if _compression_level is None:
+        return stream.getbuffer()
+    with stream.getbuffer() as view:
+        compressed = bytearray(_FORMAT_MAGIC + _FORMAT_BINARY_ZLIB)
+        compressed += zlib.compress(view[_HEADER_LENGTH:], _compression_level)
+    return compressed
+
+
+def _read_topods(data: bytes | memoryview) -> OCP.TopoDS.TopoDS_Shape:
+    """
+    Decodes a shape from a bytes-like object, e.g. a slice of a memory-mapped file.
+    """
+    shape = OCP.TopoDS.TopoDS_Shape()
+    with memoryview(data) as view:
+        if view[: len(_FORMAT_MAGIC)] != _FORMAT_MAGIC:
+            format_tag, body = _FORMAT_TEXT, data
+        else:
+            format_tag = bytes(view[_HEADER_LENGTH - 1 : _HEADER_LENGTH])
+            body = view[_HEADER_LENGTH:]
+        if format_tag == _FORMAT_BINARY_ZLIB:
+            # Decompresses straight from the given memory, BytesIO shares the result
+            format_tag, body = _FORMAT_BINARY, zlib.decompress(body)
+        with BytesIO(body) as bio:
+            if format_tag == _FORMAT_TEXT:
+                OCP.BRepTools.BRepTools.Read_s(shape, bio, OCP.BRep.BRep_Builder())
+            elif format_tag == _FORMAT_BINARY:
+                BinTools.Read_s(shape, bio)
+            else:
+                raise ValueError(f"Unknown shape format {format_tag!r}")
+    return shape
+
+
+def _inflate_shape(data: bytes | memoryview):
+    return cq.Shape.cast(_read_topods(data))
 
 
 def _reduce_shape(shape: cq.Shape):
-    with BytesIO() as stream:
-        shape.exportBrep(stream)
-        return _inflate_shape, (stream.getvalue(),)
+    return _inflate_shape, (bytes(_write_topods(shape.wrapped)),)
+
+
+def _reduce_shape_out_of_band(shape: cq.Shape):
+    return _inflate_shape, (pickle.PickleBuffer(_write_topods(shape.wrapped)),)
 
 
 def _inflate_transform(*values: float):
@@ -52,18 +138,69 @@ def _reduce_transform(transform: OCP.gp.gp_Trsf):
     )
 
 
-def _inflate_compound(data: bytes):
-    with BytesIO(data) as bio:
-        shape = OCP.TopoDS.TopoDS_Compound()
-        builder = OCP.BRep.BRep_Builder()
-        OCP.BRepTools.BRepTools.Read_s(shape, bio, builder)
-        return shape
+def _inflate_compound(data: bytes | memoryview):
+    return OCP.TopoDS.TopoDS.Compound_s(_read_topods(data))
 
 
 def _reduce_compound(compound: OCP.TopoDS.TopoDS_Compound):
-    with BytesIO() as stream:
-        OCP.BRepTools.BRepTools.Write_s(compound, stream)
-        return _inflate_compound, (stream.getvalue(),)
+    return _inflate_compound, (bytes(_write_topods(compound)),)
+
+
+def _reduce_compound_out_of_band(compound: OCP.TopoDS.TopoDS_Compound):
+    return _inflate_compound, (pickle.PickleBuffer(_write_topods(compound)),)
+
+
+def encode_shape(shape: cq.Shape) -> bytes | bytearray | memoryview:
+    """
+    Encodes a shape with the current encoding, see set_encoding.
+    """
+    return _write_topods(shape.wrapped)
+
+
+def decode_shape(data: bytes | memoryview) -> cq.Shape:
+    """
+    Decodes a shape encoded by encode_shape from any bytes-like object.
+    """
+    return _inflate_shape(data)
+
+
+_TOPODS_DOWNCASTS = {
+    OCP.TopoDS.TopoDS_Vertex: OCP.TopoDS.TopoDS.Vertex_s,
+    OCP.TopoDS.TopoDS_Edge: OCP.TopoDS.TopoDS.Edge_s,
+    OCP.TopoDS.TopoDS_Wire: OCP.TopoDS.TopoDS.Wire_s,
+    OCP.TopoDS.TopoDS_Face: OCP.TopoDS.TopoDS.Face_s,
+    OCP.TopoDS.TopoDS_Shell: OCP.TopoDS.TopoDS.Shell_s,
+    OCP.TopoDS.TopoDS_Solid: OCP.TopoDS.TopoDS.Solid_s,
+}
+"""OCCT shape types other than compounds that can be pickled, with their downcasts."""
+
+
+def _inflate_topods(data: bytes | memoryview, type_name: str):
+    shape = _read_topods(data)
+    for cls, downcast in _TOPODS_DOWNCASTS.items():
+        if cls.__name__ == type_name:
+            return downcast(shape)
+    raise ValueError(f"Unknown shape type {type_name}")
+
+
+def _reduce_topods(shape: OCP.TopoDS.TopoDS_Shape):
+    return _inflate_topods, (bytes(_write_topods(shape)), type(shape).__name__)
+
+
+def _reduce_topods_out_of_band(shape: OCP.TopoDS.TopoDS_Shape):
+    payload = pickle.PickleBuffer(_write_topods(shape))
+    return _inflate_topods, (payload, type(shape).__name__)
+
+
+_SHAPE_CLASSES = (
+    cq.Edge,
+    cq.Compound,
+    cq.Shell,
+    cq.Face,
+    cq.Solid,
+    cq.Vertex,
+    cq.Wire,
+)
 
 
 def register():
@@ -71,15 +208,7 @@ def register():
     Registers pickle support functions for common CadQuery and OCCT objects.
     """
 
-    for cls in (
-        cq.Edge,
-        cq.Compound,
-        cq.Shell,
-        cq.Face,
-        cq.Solid,
-        cq.Vertex,
-        cq.Wire,
-    ):
+    for cls in _SHAPE_CLASSES:
         copyreg.pickle(cls, _reduce_shape)
 
     copyreg.pickle(cq.Vector, lambda vec: (cq.Vector, vec.toTuple()))
@@ -88,3 +217,77 @@ def register():
         cq.Location, lambda loc: (cq.Location, (loc.wrapped.Transformation(),))
     )
     copyreg.pickle(OCP.TopoDS.TopoDS_Compound, _reduce_compound)
+    for cls in _TOPODS_DOWNCASTS:
+        copyreg.pickle(cls, _reduce_topods)
+
+
+def _get_out_of_band_dispatch_table() -> dict[type, Any]:
+    dispatch_table = copyreg.dispatch_table.copy()
+    for cls in _SHAPE_CLASSES:
+        dispatch_table[cls] = _reduce_shape_out_of_band
+    dispatch_table[OCP.TopoDS.TopoDS_Compound] = _reduce_compound_out_of_band
+    for cls in _TOPODS_DOWNCASTS:
+        dispatch_table[cls] = _reduce_topods_out_of_band
+    return dispatch_table
+
+
+def dump(obj: Any, file: BinaryIO):
+    """
+    Pickles an object with protocol 5, writing the shape payloads as out-of-band
+    buffers after the pickle stream instead of copying them into it.\n
+    Use load to read the file again.
+    """
+    buffers: list[pickle.PickleBuffer] = []
+    with BytesIO() as stream:
+        pickler = pickle.Pickler(stream, protocol=5, buffer_callback=buffers.append)
+        pickler.dispatch_table = _get_out_of_band_dispatch_table()
+        pickler.dump(obj)
+        views = [buffer.raw() for buffer in buffers]
+        pickle_length = len(stream.getbuffer())
+        file.write(_FILE_HEADER.pack(_FILE_MAGIC, len(views), pickle_length))
+        file.write(struct.pack(f"<{len(views)}Q", *(view.nbytes for view in views)))
+        file.write(stream.getbuffer())
+    for view in views:
+        file.write(view)
+
+
+def load(filename: str) -> Any:
+    """
+    Loads a file written by dump, inflating the shapes straight from the memory-mapped
+    file. Plain pickle files are loaded as well.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(_FILE_MAGIC)) != _FILE_MAGIC:
+            f.seek(0)
+            return pickle.load(f)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            views: list[memoryview] = []
+            try:
+                views.append(memoryview(mapped_file))
+                _, buffer_count, pickle_length = _FILE_HEADER.unpack_from(mapped_file)
+                offset = _FILE_HEADER.size
+                buffer_lengths = struct.unpack_from(
+                    f"<{buffer_count}Q", mapped_file, offset
+                )
+                offset += 8 * buffer_count
+                if offset + pickle_length + sum(buffer_lengths) > len(mapped_file):
+                    raise ValueError(f"{filename} is truncated")
+                pickle_view = views[0][offset : offset + pickle_length]
+                views.append(pickle_view)
+                offset += pickle_length
+                buffers: list[memoryview] = []
+                for buffer_length in buffer_lengths:
+                    buffers.append(views[0][offset : offset + buffer_length])
+                    offset += buffer_length
+                views.extend(buffers)
+                return pickle.loads(pickle_view, buffers=buffers)
+            except BaseException as e:
+                # The frames of the traceback, e.g. of a failed shape decode, still
+                # hold views into the mapping, which would keep it from being closed
+                # and replace this error with a BufferError
+                traceback.clear_frames(e.__traceback__)
+                raise
+            finally:
+                # The mapping can only be closed once no views into it are left
+                for view in reversed(views):
+                    view.release()
@@ -0,0 +1,214 @@
+import functools
+import hashlib
+import inspect
+import os
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+import cadquery as cq
+from fingerprint import get_value_fingerprint
+from serializer import dump, load, register
+from shape_transport import SharedShapeHandle, SharedShapeStore
+
+register()
+
+_path_to_script = os.path.dirname(os.path.abspath(__file__))
+_shape_cache_folder = os.path.abspath(
+    os.path.join(_path_to_script, "..", "models", "shape_cache")
+)
+
+_T = TypeVar("_T")
+
+
+class _FrozenWorkplane:
+    """
+    Picklable stand-in for a cq.Workplane, only the objects on the stack are kept.
+    """
+
+    def __init__(self, objects: list[Any]):
+        self.objects = objects
+
+    def thaw(self) -> cq.Workplane:
+        return cq.Workplane().newObject([thaw_value(obj) for obj in self.objects])
+
+
+def _get_shapes(value: Any) -> list[cq.Shape]:
+    if isinstance(value, cq.Shape):
+        return [value]
+    if isinstance(value, cq.Workplane):
+        return [obj for obj in value.objects if isinstance(obj, cq.Shape)]
+    if isinstance(value, (list, tuple)):
+        return [shape for item in value for shape in _get_shapes(item)]
+    if isinstance(value, dict):
+        return [shape for item in value.values() for shape in _get_shapes(item)]
+    return []
+
+
+def _freeze(value: Any, handles: dict[int, SharedShapeHandle]) -> Any:
+    if isinstance(value, cq.Shape):
+        return handles.get(id(value), value)
+    if isinstance(value, cq.Workplane):
+        return _FrozenWorkplane([_freeze(obj, handles) for obj in value.objects])
+    if isinstance(value, (list, tuple)):
+        return type(value)(_freeze(item, handles) for item in value)
+    if isinstance(value, dict):
+        return {key: _freeze(item, handles) for key, item in value.items()}
+    return value
+
+
+def freeze_value(value: Any, store: SharedShapeStore | None = None) -> Any:
+    """
+    Replaces cq.Workplane objects inside (nested) lists, tuples and dicts with
+    picklable stand-ins, see thaw_value.
+
+    :param store: Publish the shapes to this shared memory store and replace them
+    with handles, so sending the value to a worker process only pickles the handles.
+    Shapes already published to the store, e.g. the PCBs every node depends on, are
+    not written again.
+    """
+    handles: dict[int, SharedShapeHandle] = {}
+    if store is not None:
+        shapes = _get_shapes(value)
+        handles = {
+            id(shape): handle for shape, handle in zip(shapes, store.publish(shapes))
+        }
+    return _freeze(value, handles)
+
+
+def thaw_value(value: Any) -> Any:
+    """
+    Restores the cq.Workplane objects and shapes replaced by freeze_value.
+    """
+    if isinstance(value, _FrozenWorkplane):
+        return value.thaw()
+    if isinstance(value, SharedShapeHandle):
+        return value.load()
+    if isinstance(value, (list, tuple)):
+        return type(value)(thaw_value(item) for item in value)
+    if isinstance(value, dict):
+        return {key: thaw_value(item) for key, item in value.items()}
+    return value
+
+
+class ShapeCache:
+    """
+    Bounded LRU cache for results of geometry functions, optionally persisted to disk.
+    """
+
+    def __init__(self, name: str, max_size: int = 16, persist: bool = False):
+        """
+        :param name: Name of the cache, used as folder name inside models/shape_cache.
+        :param max_size: Maximum number of results kept in memory.
+        :param persist: Also store the results on disk, so they survive across runs.
+        """
+        self.name = name
+        self.max_size = max_size
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self._values: OrderedDict[str, Any] = OrderedDict()
+
+    def _get_file(self, key: str) -> str:
+        return os.path.join(_shape_cache_folder, self.name, f"{key}.pkl")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values or (
+            self.persist and os.path.exists(self._get_file(key))
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._values:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key]
+        if self.persist and os.path.exists(self._get_file(key)):
+            try:
+                value = thaw_value(load(self._get_file(key)))
+                self._store_in_memory(key, value)
+                self.hits += 1
+                return value
+            except Exception as e:
+                print(f"Error loading shape cache file {self._get_file(key)}: {e}")
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, write_file: bool = True):
+        """
+        :param write_file: Also store the value on disk if the cache is persisted,
+        False for values that were taken from the cache in another process.
+        """
+        self._store_in_memory(key, value)
+        if self.persist and write_file:
+            file = self._get_file(key)
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            # Write to a temporary file first, so parallel runs never read a partial file
+            temporary_file = f"{file}.{os.getpid()}.tmp"
+            with open(temporary_file, "wb") as f:
+                dump(freeze_value(value), f)
+            os.replace(temporary_file, file)
+
+    def _store_in_memory(self, key: str, value: Any):
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Clears the in-memory cache, files on disk are kept.
+        """
+        self._values.clear()
+
+
+def _get_module_source_fingerprint(func: Callable[..., Any]) -> str:
+    """
+    Returns a hash of the source file of the module defining a function, so editing
+    the function or one of the helpers next to it changes the cache keys.
+    """
+    module = inspect.getmodule(func)
+    try:
+        source = inspect.getsource(module if module is not None else func).encode()
+    except (OSError, TypeError):
+        source = func.__code__.co_code
+    return hashlib.sha256(source).hexdigest()
+
+
+def geometry_cache(
+    max_size: int = 16, persist: bool = False, version: str = "1"
+) -> Callable[[Callable[..., _T]], Callable[..., _T]]:
+    """
+    Caches the results of a function keyed on the geometry of its arguments instead
+    of their identity, see fingerprint.get_value_fingerprint.\n
+    The keys also contain the version and the source of the module defining the
+    function, so results persisted by older code are never loaded.\n
+    The cache is available as the `cache` attribute of the decorated function.
+
+    :param max_size: Maximum number of results kept in memory.
+    :param persist: Also store the results on disk, so they survive across runs.
+    :param version: Increase to discard the cached results after changes to code the
+    function calls in other modules.
+    """
+
+    def decorator(func: Callable[..., _T]) -> Callable[..., _T]:
+        cache = ShapeCache(func.__qualname__, max_size, persist)
+        missing = object()
+        code_fingerprint = _get_module_source_fingerprint(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            hasher = hashlib.sha256(f"{version}\n{code_fingerprint}\n".encode())
+            hasher.update(
+                get_value_fingerprint((args, sorted(kwargs.items()))).encode()
+            )
+            key = hasher.hexdigest()
+            value = cache.get(key, missing)
+            if value is missing:
+                value = func(*args, **kwargs)
+                cache.set(key, value)
+            return value
+
+        wrapper.cache = cache  # type: ignore
+        return wrapper
+
+    return decorator
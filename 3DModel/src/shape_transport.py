@@ -0,0 +1,121 @@
+import atexit
+import sys
+from collections.abc import Iterable
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import cadquery as cq
+from serializer import decode_shape, encode_shape, register
+
+register()
+
+_attached_segments: dict[str, SharedMemory] = {}
+"""Segments attached by this process, shared by all handles of the same segment."""
+_loaded_shapes: dict["SharedShapeHandle", cq.Shape] = {}
+"""Shapes decoded by this process, so a shape sent twice is decoded once."""
+
+
+def _attach_segment(segment_name: str) -> SharedMemory:
+    if segment_name not in _attached_segments:
+        if sys.version_info >= (3, 13):
+            segment = SharedMemory(name=segment_name, track=False)
+        else:
+            # Processes started by multiprocessing share the resource tracker of the
+            # parent, so registering the segment again does not unlink it on exit
+            segment = SharedMemory(name=segment_name)
+        _attached_segments[segment_name] = segment
+    return _attached_segments[segment_name]
+
+
+@atexit.register
+def release_attached_segments():
+    """
+    Closes all segments attached by this process, shapes loaded from them stay valid.
+    """
+    _loaded_shapes.clear()
+    for segment in _attached_segments.values():
+        segment.close()
+    _attached_segments.clear()
+
+
+@dataclass(frozen=True)
+class SharedShapeHandle:
+    """
+    Lightweight, picklable reference to a shape inside a shared memory segment.
+    """
+
+    segment_name: str
+    offset: int
+    length: int
+
+    def load(self) -> cq.Shape:
+        """
+        Decodes the shape straight from the shared memory segment, once per process.
+        """
+        if self not in _loaded_shapes:
+            segment = _attach_segment(self.segment_name)
+            view = segment.buf[self.offset : self.offset + self.length]  # type: ignore
+            with view:
+                _loaded_shapes[self] = decode_shape(view)
+        return _loaded_shapes[self]
+
+
+class SharedShapeStore:
+    """
+    Owns the shared memory segments shapes are published to.\n
+    Serializes shapes once in the parent process, workers only receive handles, see
+    shape_cache.freeze_value. The segments are unlinked when the store is closed,
+    processes that already attached them can keep using them until they exit.
+
+    Usage:
+        with SharedShapeStore() as store:
+            executor.submit(work, freeze_value(value, store))
+    """
+
+    def __init__(self):
+        self._segments: list[SharedMemory] = []
+        self._handles: dict[int, tuple[cq.Shape, SharedShapeHandle]] = {}
+        """Handles by shape id, the shapes are kept so their ids are not reused."""
+
+    def publish(self, shapes: Iterable[cq.Shape]) -> list[SharedShapeHandle]:
+        """
+        Writes the shapes that were not published yet into a single new shared memory
+        segment.
+
+        :param shapes: cadquery Shape objects, the same object is only written once.
+
+        :return: Handles of the shapes, in the given order.
+        """
+        shapes = list(shapes)
+        pending: dict[int, tuple[cq.Shape, bytes | bytearray | memoryview]] = {}
+        for shape in shapes:
+            if id(shape) not in self._handles and id(shape) not in pending:
+                pending[id(shape)] = (shape, encode_shape(shape))
+        if pending:
+            size = sum(len(encoded) for _, encoded in pending.values())
+            segment = SharedMemory(create=True, size=size)
+            self._segments.append(segment)
+            offset = 0
+            for shape_id, (shape, encoded) in pending.items():
+                length = len(encoded)
+                segment.buf[offset : offset + length] = encoded  # type: ignore
+                handle = SharedShapeHandle(segment.name, offset, length)
+                self._handles[shape_id] = (shape, handle)
+                offset += length
+        return [self._handles[id(shape)][1] for shape in shapes]
+
+    def close(self):
+        """
+        Closes and unlinks all segments of this store.
+        """
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments.clear()
+        self._handles.clear()
+
+    def __enter__(self) -> "SharedShapeStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,214 @@
+import argparse
+import ast
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from build_graph import BuildGraph
+from pipeline import CLEARANCES, EXPORTS, get_export, graph
+from shape_cache import freeze_value, thaw_value
+from shape_transport import SharedShapeStore
+
+output_folder = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "output", "sweep")
+)
+
+DEFAULT_TARGETS = ["Box_Top", "Box_Bottom"]
+
+
+def get_variants(grid: dict[str, list[Any]]) -> list[dict[str, Any]]:
+    """
+    Returns every combination of the parameter values, in grid order.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def get_label(overrides: dict[str, Any]) -> str:
+    """
+    Returns a folder name for a variant, e.g. CLIP_CONNECTOR_OFFSET-1.2_TOLERANCE-0.15
+    """
+    return "_".join(f"{name}-{value}" for name, value in overrides.items()) or "default"
+
+
+def get_shared_nodes(variant_graphs: list[BuildGraph], targets: list[str]) -> list[str]:
+    """
+    Returns the nodes needed by the targets, that have the same key in all variants.
+    """
+    target_nodes = {EXPORTS[target][0] for target in targets}
+    needed: set[str] = set(target_nodes)
+    for node in target_nodes:
+        needed |= graph.get_all_deps(node)
+    return [
+        name
+        for name in graph.nodes
+        if name in needed
+        and len({variant.get_key(name) for variant in variant_graphs}) == 1
+    ]
+
+
+def _build_variant(
+    overrides: dict[str, Any],
+    targets: list[str],
+    variant_folder: str,
+    frozen_shared_values: dict[str, Any],
+) -> dict[str, Any]:
+    start = time.perf_counter()
+    from clearance import summarize_clearances
+    from mesh_cache import export_stl
+
+    variant_graph = graph.with_params(**overrides)
+    variant_graph.preload(thaw_value(frozen_shared_values))
+    os.makedirs(variant_folder, exist_ok=True)
+    files: dict[str, str] = {}
+    keys: dict[str, str] = {}
+    for target in targets:
+        path = os.path.join(variant_folder, f"{target}.stl")
+        export_stl(get_export(variant_graph, target), path)
+        files[target] = path
+        keys[target] = variant_graph.get_key(EXPORTS[target][0])
+    # Interferences of the enclosures, so variants can be compared without printing
+    clearances: dict[str, Any] = {}
+    for target in targets:
+        node_name = EXPORTS[target][0]
+        if node_name in CLEARANCES and node_name not in clearances:
+            clearances[node_name] = summarize_clearances(
+                variant_graph.get(CLEARANCES[node_name])
+            )
+    return {
+        "files": files,
+        "keys": keys,
+        "clearances": clearances,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def run_sweep(
+    grid: dict[str, list[Any]],
+    targets: list[str] = DEFAULT_TARGETS,
+    output_folder: str = output_folder,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """
+    Builds the targets for every combination of parameter values in parallel worker
+    processes and writes them to one folder per variant, plus a manifest.json.\n
+    Nodes that are equal in all variants (e.g. the loaded PCBs) are built once in
+    this process first and sent to the workers through shared memory, see
+    shape_transport.
+
+    :param grid: Values to try by parameter name.
+    :param targets: Names of the exported files to build, see pipeline.EXPORTS.
+    :param output_folder: Folder for the variant folders and the manifest.
+    :param max_workers: Maximum number of worker processes, defaults to the number
+    of processors.
+
+    :return: The manifest.
+    """
+    variants = get_variants(grid)
+    variant_graphs = [graph.with_params(**overrides) for overrides in variants]
+    shared_nodes = get_shared_nodes(variant_graphs, targets)
+    logging.info(f"Building {len(shared_nodes)} shared nodes")
+    for name in shared_nodes:
+        graph.get(name)
+
+    manifest: dict[str, Any] = {
+        "grid": grid,
+        "targets": targets,
+        "shared_nodes": shared_nodes,
+        "variants": [],
+    }
+    with SharedShapeStore() as store, ProcessPoolExecutor(
+        max_workers=max_workers
+    ) as executor:
+        # The shared nodes are published to shared memory once, every worker only
+        # receives handles instead of building or loading them again
+        frozen_shared_values = freeze_value(graph.get_many(shared_nodes), store)
+        futures = []
+        for overrides in variants:
+            label = get_label(overrides)
+            futures.append(
+                (
+                    label,
+                    overrides,
+                    executor.submit(
+                        _build_variant,
+                        overrides,
+                        targets,
+                        os.path.join(output_folder, label),
+                        frozen_shared_values,
+                    ),
+                )
+            )
+        for label, overrides, future in futures:
+            entry: dict[str, Any] = {"label": label, "parameters": overrides}
+            try:
+                result = future.result()
+                result["files"] = {
+                    target: os.path.relpath(path, output_folder)
+                    for target, path in result["files"].items()
+                }
+                entry.update(result)
+                logging.info(f"Built {label} in {result['seconds']:.1f}s")
+            except Exception as e:
+                # One failing variant should not discard the others
+                entry["error"] = repr(e)
+                logging.error(f"Error building {label}: {e}")
+            manifest["variants"].append(entry)
+
+    os.makedirs(output_folder, exist_ok=True)
+    with open(os.path.join(output_folder, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _parse_param(text: str) -> tuple[str, list[Any]]:
+    name, separator, values = text.partition("=")
+    if not separator or not values:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE,VALUE,..., got {text}")
+    if name not in graph.parameters:
+        raise argparse.ArgumentTypeError(f"Unknown parameter {name}")
+    try:
+        return name, [ast.literal_eval(value) for value in values.split(",")]
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError(f"Values of {name} must be Python literals")
+
+
+def main(args: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Build the targets for every combination of parameter values."
+    )
+    parser.add_argument(
+        "--param",
+        type=_parse_param,
+        action="append",
+        required=True,
+        metavar="NAME=VALUE,VALUE,...",
+        help="Values to try for a parameter, e.g. CLIP_CONNECTOR_OFFSET=0.8,1,1.2",
+    )
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=list(EXPORTS),
+        default=DEFAULT_TARGETS,
+        metavar="TARGET",
+        help=f"Files to build, any of {', '.join(EXPORTS)}.",
+    )
+    parser.add_argument("--output-dir", default=output_folder)
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+
+    run_sweep(
+        dict(arguments.param),
+        arguments.targets,
+        arguments.output_dir,
+        arguments.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+# clearance reads the meshes of cq objects through the mesh cache
+pytest.importorskip("cadquery")
+
+import cadquery as cq  # noqa: E402
+import mesh_cache  # noqa: E402
+from clearance import (  # noqa: E402
+    _check_pair,
+    _MeshObject,
+    build_bvh,
+    check_clearances,
+    get_inside,
+    get_min_distance,
+    meshes_intersect,
+    point_triangle_distances,
+    query_boxes,
+    segment_distances,
+    segments_hit_triangles,
+)
+
+TRIANGLE = np.array([[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]])
+
+
+def _box(lower, upper, divisions: int = 1):
+    """
+    Mesh of a closed box, every side split into divisions x divisions squares.
+    """
+    lower, upper = np.asarray(lower, float), np.asarray(upper, float)
+    steps = np.linspace(0, 1, divisions + 1)
+    corners = []
+    for axis in range(3):
+        u_axis, v_axis = (axis + 1) % 3, (axis + 2) % 3
+        for side in (0, 1):
+            for i in range(divisions):
+                for j in range(divisions):
+                    square = []
+                    for du, dv in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                        point = np.empty(3)
+                        point[axis] = side
+                        point[u_axis] = steps[i + du]
+                        point[v_axis] = steps[j + dv]
+                        square.append(lower + point * (upper - lower))
+                    corners += [square[:3], [square[0], square[2], square[3]]]
+    corners = np.array(corners)
+    vertices = corners.reshape(-1, 3)
+    return vertices, np.arange(len(vertices)).reshape(-1, 3)
+
+
+def _ridge(along_x: bool, height: float, flipped: bool):
+    """
+    Mesh of a closed triangular prism with a 20 long ridge through (0, 0, height)
+    along x or y and 45 degree sides, pointing up or down if flipped.
+    """
+    sign = -1 if flipped else 1
+    profile = [(0.0, height), (-5.0, height - 5 * sign), (5.0, height - 5 * sign)]
+
+    def point(length: float, across: float, z: float):
+        return (length, across, z) if along_x else (across, length, z)
+
+    near = [point(-10, across, z) for across, z in profile]
+    far = [point(10, across, z) for across, z in profile]
+    corners = [near, far[::-1]]
+    for i in range(3):
+        j = (i + 1) % 3
+        corners += [[near[i], far[i], far[j]], [near[i], far[j], near[j]]]
+    vertices = np.array(corners, float).reshape(-1, 3)
+    return vertices, np.arange(len(vertices)).reshape(-1, 3)
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(mesh_cache, "_mesh_cache_folder", str(tmp_path))
+
+
+@pytest.mark.parametrize(
+    "point, distance",
+    [
+        ((0.2, 0.2, 3.0), 3.0),  # Above the face
+        ((0.2, 0.2, -0.5), 0.5),  # Below the face
+        ((0.5, -1.0, 0.0), 1.0),  # Next to the edge ab
+        ((1.0, 1.0, 0.0), np.sqrt(0.5)),  # Next to the edge bc
+        ((3.0, 0.0, 4.0), np.hypot(2.0, 4.0)),  # Beyond the corner b
+        ((-1.0, -1.0, 0.0), np.sqrt(2.0)),  # Beyond the corner a
+    ],
+)
+def test_point_triangle_distance(point, distance):
+    result = point_triangle_distances(np.array([point]), TRIANGLE)
+    assert result[0] == pytest.approx(distance)
+
+
+def test_segments_hit_triangles():
+    starts = np.array([[0.2, 0.2, -1.0], [2.0, 2.0, -1.0], [0.2, 0.2, 1.0]])
+    ends = np.array([[0.2, 0.2, 1.0], [2.0, 2.0, 1.0], [0.2, 0.2, 2.0]])
+    corners = np.repeat(TRIANGLE, 3, axis=0)
+    # Crossing, missing beside the triangle and ending before it
+    assert segments_hit_triangles(starts, ends, corners).tolist() == [
+        True,
+        False,
+        False,
+    ]
+
+
+def test_query_boxes_finds_overlapping_triangles():
+    bvh = build_bvh(_box((0, 0, 0), (10, 10, 10), divisions=4))
+    query_indices, triangle_indices = query_boxes(
+        bvh, np.array([[-1.0, 4.0, 4.0]]), np.array([[0.5, 6.0, 6.0]])
+    )
+    assert (query_indices == 0).all()
+    found = bvh.corners[triangle_indices]
+    # Only triangles of the x = 0 side near the query box
+    assert len(found) > 0
+    assert (found[:, :, 0] == 0).all()
+    assert found[:, :, 1:].min() >= 2.5 - 1e-9
+    assert found[:, :, 1:].max() <= 7.5 + 1e-9
+
+
+def test_get_inside_box():
+    bvh = build_bvh(_box((0, 0, 0), (10, 10, 10), divisions=3))
+    points = np.array([[5.0, 5.0, 5.0], [1.0, 9.0, 2.0], [11.0, 5.0, 5.0], [-1, 5, 5]])
+    assert get_inside(points, bvh).tolist() == [True, True, False, False]
+
+
+def test_get_min_distance_to_box():
+    bvh = build_bvh(_box((0, 0, 0), (10, 10, 10), divisions=3))
+    points = np.array([[12.0, 5.0, 5.0], [5.0, 5.0, 13.0]])
+    assert get_min_distance(points, bvh, 5.0) == pytest.approx(2.0)
+    assert get_min_distance(points, bvh, 1.0) == np.inf
+
+
+def test_meshes_intersect():
+    box = build_bvh(_box((0, 0, 0), (10, 10, 10), divisions=2))
+    crossing = build_bvh(_box((9, 2, 2), (11, 3, 3)))
+    beside = build_bvh(_box((11, 2, 2), (12, 3, 3)))
+    assert meshes_intersect(box, crossing)
+    assert not meshes_intersect(box, beside)
+
+
+@pytest.mark.parametrize(
+    "segment, other_segment, distance",
+    [
+        (((-1, 0, 0), (1, 0, 0)), ((0, -1, 1), (0, 1, 1)), 1.0),  # Crossing
+        (((0, 0, 0), (1, 0, 0)), ((3, -1, 0), (3, 1, 0)), 2.0),  # End to middle
+        (((0, 0, 0), (2, 0, 0)), ((1, 1, 0), (3, 1, 0)), 1.0),  # Parallel
+        (((0, 0, 0), (1, 0, 0)), ((3, 4, 0), (3, 4, 0)), np.hypot(2.0, 4.0)),  # Point
+    ],
+)
+def test_segment_distances(segment, other_segment, distance):
+    (start, end), (other_start, other_end) = segment, other_segment
+    result = segment_distances(
+        np.array([start], float),
+        np.array([end], float),
+        np.array([other_start], float),
+        np.array([other_end], float),
+    )
+    assert result[0] == pytest.approx(distance)
+
+
+def test_check_pair_measures_edges_passing_each_other():
+    # The ridges cross 1 apart, all vertices are much farther from the other prism
+    part = _MeshObject(_ridge(along_x=True, height=0.0, flipped=False))
+    component = _MeshObject(_ridge(along_x=False, height=1.0, flipped=True))
+    distance, interferes = _check_pair(component, part, max_distance=10.0)
+    assert distance == pytest.approx(1.0)
+    assert not interferes
+
+
+def test_check_clearances_in_hollow_box(cache_folder):
+    hollow_box = cq.Workplane().box(20, 20, 20).cut(cq.Workplane().box(16, 16, 16))
+    components = {
+        "in_cavity": cq.Workplane().box(4, 4, 4),
+        "into_wall": cq.Workplane().box(4, 4, 4).translate((7.5, 0, 0)),
+        "inside_wall": cq.Workplane().box(1, 1, 1).translate((9, 0, 0)),
+        "far_away": cq.Workplane().box(4, 4, 4).translate((30, 0, 0)),
+    }
+    clearances = check_clearances(components, {"box": hollow_box}, max_distance=10.0)
+    results = {
+        clearance.component: (clearance.distance, clearance.interferes)
+        for clearance in clearances
+    }
+    assert set(results) == {"in_cavity", "into_wall", "inside_wall"}
+    assert results["in_cavity"][0] == pytest.approx(6.0)
+    assert not results["in_cavity"][1]
+    assert results["into_wall"] == (0.0, True)
+    assert results["inside_wall"] == (0.0, True)
+    # Interfering pairs come first
+    assert [clearance.component for clearance in clearances][-1] == "in_cavity"
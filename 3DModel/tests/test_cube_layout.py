@@ -0,0 +1,63 @@
+import pytest
+
+from cube_layout import (
+    MODULE,
+    POWER_SUPPLY,
+    CubePlacement,
+    attach,
+    get_chain,
+    get_grid,
+    parse_grid,
+    validate_layout,
+)
+
+
+def test_parse_grid_puts_the_first_row_on_top():
+    layout = parse_grid("MM/PM")
+    assert set(layout) == {
+        CubePlacement(MODULE, (0, 1)),
+        CubePlacement(MODULE, (1, 1)),
+        CubePlacement(POWER_SUPPLY, (0, 0), 0),
+        CubePlacement(MODULE, (1, 0)),
+    }
+
+
+def test_parse_grid_turns_power_supplies_towards_a_module():
+    (power_supply,) = [p for p in parse_grid("M.\nP.") if p.kind == POWER_SUPPLY]
+    assert power_supply.rotation == 90
+    (power_supply,) = [p for p in parse_grid("MP") if p.kind == POWER_SUPPLY]
+    assert power_supply.rotation == 180
+
+
+def test_parse_grid_rejects_unknown_symbols():
+    with pytest.raises(Exception, match="Unknown grid symbol"):
+        parse_grid("MX")
+
+
+def test_validate_layout_rejects_overlapping_cubes():
+    with pytest.raises(Exception, match="More than one cube"):
+        validate_layout([CubePlacement(MODULE, (0, 0)), CubePlacement(MODULE, (0, 0))])
+
+
+def test_get_grid_powers_a_2x2_grid_from_the_left():
+    layout = get_grid(2, 2)
+    assert layout[0] == CubePlacement(POWER_SUPPLY, (-1, 0), 0)
+    assert sorted(p.cell for p in layout[1:]) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert all(p.kind == MODULE and p.rotation == 0 for p in layout[1:])
+
+
+def test_attach_faces_power_supplies_to_the_cube_they_connect_to():
+    layout = attach([CubePlacement(MODULE, (0, 0))], 0, "Top", POWER_SUPPLY)
+    assert layout[1] == CubePlacement(POWER_SUPPLY, (0, 1), 270)
+    with pytest.raises(Exception, match="More than one cube"):
+        attach([*layout, CubePlacement(MODULE, (1, 0))], 2, "Left")
+
+
+def test_get_chain_builds_a_row_of_modules():
+    layout = get_chain(2, "Left")
+    assert layout == [
+        CubePlacement(POWER_SUPPLY, (0, 0), 180),
+        CubePlacement(MODULE, (-1, 0)),
+        CubePlacement(MODULE, (-2, 0)),
+    ]
+    assert layout[1].name == "Module -1,0"
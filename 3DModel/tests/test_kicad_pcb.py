@@ -0,0 +1,94 @@
+import pytest
+
+from kicad_pcb import (
+    get_board_outline,
+    get_board_thickness,
+    get_geometry_fingerprint,
+    parse_sexpr,
+)
+
+BOARD = """(kicad_pcb
+  (version 20240108)
+  (general (thickness 1.6))
+  (setup (aux_axis_origin 100 50))
+  (gr_rect (start 100 50) (end 130 70) (layer "Edge.Cuts") (uuid "a"))
+  (segment (start 110 60) (end 120 60) (width 0.25) (layer "F.Cu") (uuid "b"))
+  (gr_text "Label" (at 115 65) (layer "F.SilkS") (uuid "c"))
+  (footprint "Connector:Pin" (layer "F.Cu") (at 120 60 90) (uuid "d")
+    (property "Reference" "J1" (at 0 0) (layer "F.SilkS") (uuid "e"))
+    (pad "1" thru_hole circle (at 0 0) (size 1.7 1.7) (drill 1) (uuid "f"))
+  )
+)
+"""
+
+
+def _write_board(tmp_path, text: str, name: str = "board.kicad_pcb") -> str:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_parse_sexpr_unquotes_strings():
+    assert parse_sexpr('(a "b c" (d "e\\"f") 1.5)') == ["a", "b c", ["d", 'e"f'], "1.5"]
+
+
+def test_parse_sexpr_rejects_unbalanced_input():
+    with pytest.raises(ValueError):
+        parse_sexpr("(a (b)")
+    with pytest.raises(ValueError):
+        parse_sexpr("(a))")
+
+
+def test_fingerprint_ignores_routing_silkscreen_and_uuids(tmp_path):
+    base = get_geometry_fingerprint(_write_board(tmp_path, BOARD, "base.kicad_pcb"))
+    changed = (
+        BOARD.replace("(end 120 60) (width 0.25)", "(end 125 62) (width 0.5)")
+        .replace('"Label"', '"Other"')
+        .replace('(uuid "a")', '(uuid "z")')
+    )
+    assert get_geometry_fingerprint(_write_board(tmp_path, changed)) == base
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("(end 130 70)", "(end 131 70)"),  # Board outline
+        ("(thickness 1.6)", "(thickness 1.2)"),
+        ("(at 120 60 90)", "(at 121 60 90)"),  # Footprint placement
+        ("(drill 1)", "(drill 1.2)"),
+    ],
+)
+def test_fingerprint_changes_with_geometry(tmp_path, old, new):
+    base = get_geometry_fingerprint(_write_board(tmp_path, BOARD, "base.kicad_pcb"))
+    changed = get_geometry_fingerprint(_write_board(tmp_path, BOARD.replace(old, new)))
+    assert changed != base
+
+
+def test_board_outline_is_relative_to_the_drill_origin():
+    (segment,) = get_board_outline(parse_sexpr(BOARD))
+    assert segment.kind == "rect"
+    assert segment.points == [(0, 0), (30, -20)]
+
+
+def test_board_outline_rotates_footprint_graphics():
+    board = parse_sexpr("""(kicad_pcb
+          (footprint "Cutout" (at 10 20 90)
+            (fp_rect (start -1 -2) (end 1 2) (layer "Edge.Cuts"))
+          )
+        )""")
+    (segment,) = get_board_outline(board)
+    assert segment.kind == "rect"
+    # Rotated by 90 degrees counterclockwise on screen, then y flipped for the STEP
+    assert segment.points[0] == pytest.approx((8, -21))
+    assert segment.points[1] == pytest.approx((12, -19))
+
+
+def test_board_thickness_falls_back_to_the_stackup():
+    assert get_board_thickness(parse_sexpr(BOARD)) == 1.6
+    stackup = parse_sexpr("""(kicad_pcb (setup (stackup
+          (layer "F.Cu" (thickness 0.035))
+          (layer "dielectric 1" (thickness 0.73))
+          (layer "B.Cu" (thickness 0.035))
+        )))""")
+    assert get_board_thickness(stackup) == pytest.approx(0.8)
+    assert get_board_thickness(parse_sexpr("(kicad_pcb)")) == 1.6
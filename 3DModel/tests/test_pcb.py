@@ -0,0 +1,169 @@
+import math
+
+import pytest
+
+cq = pytest.importorskip("cadquery")
+
+import numpy as np
+import shape_cache
+from pcb import (
+    HoleTable,
+    _offset_outline_wire,
+    get_hole_table,
+    make_offset_shapes_from_kicad_pcb,
+)
+
+WIDTH, HEIGHT, RADIUS = 30.0, 20.0, 3.0
+
+# Rounded rectangle with arcs on Edge.Cuts, like the boards in the PCB folder
+BOARD = """(kicad_pcb
+  (version 20240108)
+  (general (thickness 1.6))
+  (gr_line (start 3 0) (end 27 0) (layer "Edge.Cuts"))
+  (gr_arc (start 27 0) (mid 29.12132 0.87868) (end 30 3) (layer "Edge.Cuts"))
+  (gr_line (start 30 3) (end 30 17) (layer "Edge.Cuts"))
+  (gr_arc (start 30 17) (mid 29.12132 19.12132) (end 27 20) (layer "Edge.Cuts"))
+  (gr_line (start 27 20) (end 3 20) (layer "Edge.Cuts"))
+  (gr_arc (start 3 20) (mid 0.87868 19.12132) (end 0 17) (layer "Edge.Cuts"))
+  (gr_line (start 0 17) (end 0 3) (layer "Edge.Cuts"))
+  (gr_arc (start 0 3) (mid 0.87868 0.87868) (end 3 0) (layer "Edge.Cuts"))
+)
+"""
+
+
+def _rounded_rectangle() -> cq.Wire:
+    face = (
+        cq.Workplane()
+        .rect(WIDTH, HEIGHT)
+        .extrude(1)
+        .edges("|Z")
+        .fillet(RADIUS)
+        .faces("<Z")
+        .val()
+    )
+    return face.outerWire()
+
+
+def _get_area(wire: cq.Wire) -> float:
+    return cq.Face.makeFromWires(wire).Area()
+
+
+@pytest.mark.parametrize("x, y", [(0.2, 0.5), (0.5, 0.2), (0.0, 0.3)])
+def test_rounded_rectangle_grows_by_the_tolerance_rectangle(x, y):
+    (wire,) = _offset_outline_wire(_rounded_rectangle(), x, y)
+    bounds = wire.BoundingBox()
+    assert bounds.xlen == pytest.approx(WIDTH + 2 * x)
+    assert bounds.ylen == pytest.approx(HEIGHT + 2 * y)
+    # The corner arcs keep their radius and are moved by the corners of the rectangle
+    assert _get_area(wire) == pytest.approx(
+        (WIDTH + 2 * x) * (HEIGHT + 2 * y) - (4 - math.pi) * RADIUS**2
+    )
+    assert {edge.geomType() for edge in wire.Edges()} == {"LINE", "CIRCLE"}
+    corner = cq.Vector(
+        WIDTH / 2 - RADIUS + RADIUS * math.sqrt(0.5) + x,
+        HEIGHT / 2 - RADIUS + RADIUS * math.sqrt(0.5) + y,
+        0,
+    )
+    assert wire.distance(cq.Vertex.makeVertex(*corner.toTuple())) < 1e-6
+
+
+def test_equal_tolerances_offset_uniformly():
+    (wire,) = _offset_outline_wire(_rounded_rectangle(), 0.5, 0.5)
+    assert _get_area(wire) == pytest.approx(
+        (WIDTH + 1) * (HEIGHT + 1) - (4 - math.pi) * (RADIUS + 0.5) ** 2
+    )
+
+
+def test_negative_different_tolerances_are_rejected():
+    with pytest.raises(Exception, match="positive"):
+        _offset_outline_wire(_rounded_rectangle(), -0.2, 0.5)
+
+
+def test_offset_shapes_from_kicad_pcb_with_arcs(tmp_path):
+    board_file = tmp_path / "board.kicad_pcb"
+    board_file.write_text(BOARD, encoding="utf-8")
+    tight, loose = make_offset_shapes_from_kicad_pcb(
+        str(board_file), [(0.1, 0.4, 0.05), (0.3, 0.2)]
+    )
+    tight_bounds = tight.val().BoundingBox()
+    assert tight_bounds.xlen == pytest.approx(WIDTH + 0.2)
+    assert tight_bounds.ylen == pytest.approx(HEIGHT + 0.8)
+    assert tight_bounds.zlen == pytest.approx(1.6 + 0.1)
+    loose_bounds = loose.val().BoundingBox()
+    assert loose_bounds.xlen == pytest.approx(WIDTH + 0.6)
+    assert loose_bounds.ylen == pytest.approx(HEIGHT + 0.6)
+    assert loose_bounds.zlen == pytest.approx(1.6 + 0.4)
+
+
+def _make_table(centers: np.ndarray) -> HoleTable:
+    count = len(centers)
+    return HoleTable(
+        centers=centers,
+        diameters=np.ones(count),
+        lengths=np.ones(count),
+        angles=np.zeros(count),
+        depths=np.ones(count),
+        layers=np.zeros(count, dtype=np.int8),
+    )
+
+
+def test_hole_table_extracts_holes_and_slots(tmp_path, monkeypatch):
+    monkeypatch.setattr(shape_cache, "_shape_cache_folder", str(tmp_path))
+    top = cq.Workplane().box(40, 30, 1.6, centered=False).faces(">Z").workplane()
+    board = (
+        top.pushPoints([(5, 5), (35, 5)])
+        .hole(3)
+        .faces(">Z")
+        .workplane(origin=(0, 0, 1.6))
+        .center(20, 20)
+        .slot2D(6, 2, 30)
+        .cutThruAll()
+        .faces(">Z")
+        .workplane(origin=(0, 0, 1.6))
+        .center(30, 25)
+        .hole(1, depth=0.8)
+    )
+    table = get_hole_table(board)
+    assert len(table) == 4
+    order = np.lexsort((table.centers[:, 1], table.centers[:, 0]))
+    np.testing.assert_allclose(
+        table.centers[order],
+        [[5, 5, 0.8], [20, 20, 0.8], [30, 25, 1.2], [35, 5, 0.8]],
+        atol=1e-6,
+    )
+    np.testing.assert_allclose(table.diameters[order], [3, 2, 1, 3], atol=1e-6)
+    np.testing.assert_allclose(table.lengths[order], [3, 6, 1, 3], atol=1e-6)
+    np.testing.assert_allclose(table.angles[order], [0, 30, 0, 0], atol=1e-6)
+    np.testing.assert_allclose(table.depths[order], [1.6, 1.6, 0.8, 1.6], atol=1e-6)
+    assert table.layer_names(order) == ["through", "through", "top", "through"]
+
+
+def test_hole_table_queries_match_brute_force():
+    rng = np.random.default_rng(0)
+    centers = np.column_stack((rng.uniform(0, 50, (200, 2)), np.zeros(200)))
+    table = _make_table(centers)
+    for x, y in [(25, 25), (-10, 3), (49, 51), (12.5, 0)]:
+        distances = np.hypot(centers[:, 0] - x, centers[:, 1] - y)
+        np.testing.assert_array_equal(
+            table.nearest(x, y, 5), np.argsort(distances, kind="stable")[:5]
+        )
+        np.testing.assert_array_equal(
+            table.within(x, y, 8), np.flatnonzero(distances <= 8)
+        )
+    inside = (
+        (centers[:, 0] >= 10)
+        & (centers[:, 0] <= 20)
+        & (centers[:, 1] >= 30)
+        & (centers[:, 1] <= 45)
+    )
+    np.testing.assert_array_equal(
+        table.in_region(10, 30, 20, 45), np.flatnonzero(inside)
+    )
+
+
+def test_empty_hole_table():
+    table = _make_table(np.zeros((0, 3)))
+    assert len(table) == 0
+    assert len(table.nearest(0, 0)) == 0
+    assert len(table.in_region(-1, -1, 1, 1)) == 0
+    assert len(table.within(0, 0, 1)) == 0
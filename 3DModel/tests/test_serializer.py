@@ -0,0 +1,71 @@
+import pickle
+import zlib
+
+import pytest
+
+cq = pytest.importorskip("cadquery")
+
+import serializer
+from serializer import dump, load
+
+
+@pytest.fixture(autouse=True)
+def registered():
+    serializer.register()
+    yield
+    serializer.set_encoding()
+
+
+def _dump_boxes(path) -> bytes:
+    box = cq.Workplane().box(1, 2, 3).val()
+    with open(path, "wb") as f:
+        dump({"boxes": [box, box.translate((1, 0, 0))], "count": 2}, f)
+    return path.read_bytes()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "shapes.pkl"
+    _dump_boxes(path)
+    loaded = load(str(path))
+    assert loaded["count"] == 2
+    assert [box.Volume() for box in loaded["boxes"]] == pytest.approx([6, 6])
+    assert loaded["boxes"][1].Center().x == pytest.approx(1)
+
+
+def test_plain_pickle_files_are_loaded(tmp_path):
+    path = tmp_path / "plain.pkl"
+    path.write_bytes(pickle.dumps({"value": 1}))
+    assert load(str(path)) == {"value": 1}
+
+
+def test_truncated_file_raises(tmp_path):
+    path = tmp_path / "shapes.pkl"
+    path.write_bytes(_dump_boxes(path)[:-100])
+    with pytest.raises(ValueError, match="truncated"):
+        load(str(path))
+
+
+def test_corrupt_shape_payload_raises_the_decode_error(tmp_path):
+    path = tmp_path / "shapes.pkl"
+    data = bytearray(_dump_boxes(path))
+    # The shape payloads come last, this garbles the compressed data of the last one
+    data[-100:-50] = b"\x55" * 50
+    path.write_bytes(data)
+    # Not a BufferError from closing the mapping while views into it are alive
+    with pytest.raises(zlib.error) as error:
+        load(str(path))
+    assert error.value.__context__ is None
+    # The file is not kept open or mapped after the error
+    path.unlink()
+
+
+def test_corrupt_pickle_stream_raises_the_unpickling_error(tmp_path):
+    serializer.set_encoding(compression_level=None)
+    path = tmp_path / "shapes.pkl"
+    data = bytearray(_dump_boxes(path))
+    header_length = serializer._FILE_HEADER.size + 8 * 2
+    # The pickle stream follows the header, without its first opcodes it is invalid
+    data[header_length : header_length + 4] = b"\xff" * 4
+    path.write_bytes(data)
+    with pytest.raises(pickle.UnpicklingError):
+        load(str(path))
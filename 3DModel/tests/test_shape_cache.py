@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("cadquery")
+
+import shape_cache
+from shape_cache import geometry_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(shape_cache, "_shape_cache_folder", str(tmp_path))
+
+
+def _make_cached_function(calls: list[int], version: str):
+    @geometry_cache(persist=True, version=version)
+    def scale(value: int) -> int:
+        calls.append(value)
+        return value * 2
+
+    return scale
+
+
+def test_persisted_results_are_loaded_by_a_new_run():
+    calls: list[int] = []
+    assert _make_cached_function(calls, "1")(3) == 6
+    assert _make_cached_function(calls, "1")(3) == 6
+    assert calls == [3]
+
+
+def test_changed_version_misses_the_cache():
+    calls: list[int] = []
+    assert _make_cached_function(calls, "1")(3) == 6
+    assert _make_cached_function(calls, "2")(3) == 6
+    assert calls == [3, 3]
+
+
+def test_changed_code_misses_the_cache(monkeypatch):
+    calls: list[int] = []
+    assert _make_cached_function(calls, "1")(3) == 6
+    monkeypatch.setattr(
+        shape_cache, "_get_module_source_fingerprint", lambda func: "edited"
+    )
+    assert _make_cached_function(calls, "1")(3) == 6
+    assert calls == [3, 3]